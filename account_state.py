@@ -0,0 +1,159 @@
+# account_state.py
+
+import threading
+import time
+
+# Order states in which an order is still resting on the book
+OPEN_ORDER_STATUSES = {"New", "PartiallyFilled", "Untriggered"}
+
+
+class SymbolSnapshot:
+    def __init__(self):
+        self.positions = {}  # positionIdx -> position
+        self.orders = {}  # orderId -> order
+        self.updated_time = None
+        # Set for snapshots reconciled at a warm start; the first refresh uses them instead of fetching
+        self.restored = False
+
+
+class AccountState:
+    """Per-symbol snapshot of positions and open orders shared by everything in one cycle.
+
+    ``refresh`` fetches ``/v5/position/list`` and ``/v5/order/realtime`` once;
+    the query methods below answer from that snapshot with the same results as
+    the data fetcher methods of the same name. When the private stream feeds
+    updates through ``handle_message``, refreshes are skipped while it is connected.
+    """
+
+    def __init__(self, data_fetcher, live_source=None, state_store=None):
+        self.data_fetcher = data_fetcher
+        self.live_source = live_source
+        # Optional StateStore that records every position, order and execution seen
+        self.state_store = state_store
+        self.snapshots = {}
+        self._lock = threading.Lock()
+
+    def _is_live(self):
+        return self.live_source is not None and self.live_source.is_connected()
+
+    def refresh(self, symbol, force=False):
+        """Fetch positions and orders for `symbol`. Returns False if either request failed."""
+        if not force:
+            with self._lock:
+                snapshot = self.snapshots.get(symbol)
+                if snapshot is not None and snapshot.restored:
+                    snapshot.restored = False
+                    return True
+            if self._is_live() and snapshot is not None:
+                return True
+
+        positions = self.data_fetcher.get_positions(symbol)
+        orders = self.data_fetcher.get_open_orders(symbol)
+        if positions is None or orders is None:
+            return False
+        self._store(symbol, positions, orders)
+        if self.state_store is not None:
+            self.state_store.save_positions(symbol, positions)
+            self.state_store.save_orders(orders)
+        return True
+
+    def restore(self, symbol, positions, orders):
+        """Install a snapshot reconciled at a warm start; it stands in for the first refresh."""
+        self._store(symbol, positions, orders, restored=True)
+
+    def _store(self, symbol, positions, orders, restored=False):
+        snapshot = SymbolSnapshot()
+        snapshot.positions = {pos.get('positionIdx', 0): pos for pos in positions}
+        snapshot.orders = {order['orderId']: order for order in orders}
+        snapshot.updated_time = time.time()
+        snapshot.restored = restored
+        with self._lock:
+            self.snapshots[symbol] = snapshot
+
+        # Position entries carry the leverage, so the session can skip redundant set-leverage calls
+        for pos in positions:
+            if pos.get('leverage'):
+                self.data_fetcher.known_leverage[symbol] = float(pos['leverage'])
+                break
+
+    def invalidate(self, symbol):
+        with self._lock:
+            self.snapshots.pop(symbol, None)
+
+    def _snapshot(self, symbol):
+        with self._lock:
+            snapshot = self.snapshots.get(symbol)
+        if snapshot is None:
+            if not self.refresh(symbol, force=True):
+                return None
+            with self._lock:
+                snapshot = self.snapshots.get(symbol)
+        return snapshot
+
+    # --- queries -----------------------------------------------------------------
+
+    def get_open_positions(self, symbol):
+        snapshot = self._snapshot(symbol)
+        if snapshot is None:
+            return None
+        return [pos for pos in snapshot.positions.values() if float(pos['size']) > 0]
+
+    def get_last_closed_position(self, symbol):
+        snapshot = self._snapshot(symbol)
+        if snapshot is None:
+            return None
+        closed_positions = [pos for pos in snapshot.positions.values() if float(pos['size']) == 0]
+        if not closed_positions:
+            return None
+        return max(closed_positions, key=lambda x: int(x['updatedTime']))
+
+    def get_open_orders(self, symbol):
+        snapshot = self._snapshot(symbol)
+        if snapshot is None:
+            return None
+        return list(snapshot.orders.values())
+
+    def get_leverage(self, symbol):
+        return self.data_fetcher.known_leverage.get(symbol)
+
+    # --- private stream updates --------------------------------------------------
+
+    def handle_message(self, message):
+        topic = message.get('topic')
+        if topic == 'order':
+            for order in message['data']:
+                self._apply_order(order)
+        elif topic == 'position':
+            for position in message['data']:
+                self._apply_position(position)
+
+        if self.state_store is not None:
+            if topic == 'order':
+                self.state_store.save_orders(message['data'])
+            elif topic == 'position':
+                for position in message['data']:
+                    self.state_store.save_positions(position['symbol'], [position])
+            elif topic == 'execution':
+                self.state_store.record_fills(message['data'])
+
+    def _apply_order(self, order):
+        with self._lock:
+            snapshot = self.snapshots.get(order['symbol'])
+            if snapshot is None:
+                return
+            if order.get('orderStatus') in OPEN_ORDER_STATUSES:
+                snapshot.orders[order['orderId']] = order
+            else:
+                snapshot.orders.pop(order['orderId'], None)
+            snapshot.updated_time = time.time()
+
+    def _apply_position(self, position):
+        symbol = position['symbol']
+        with self._lock:
+            snapshot = self.snapshots.get(symbol)
+            if snapshot is None:
+                return
+            snapshot.positions[position.get('positionIdx', 0)] = position
+            snapshot.updated_time = time.time()
+        if position.get('leverage'):
+            self.data_fetcher.known_leverage[symbol] = float(position['leverage'])
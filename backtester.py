@@ -0,0 +1,517 @@
+# backtester.py
+
+import argparse
+import collections
+import contextlib
+import itertools
+import os
+from concurrent.futures import Future
+import numpy as np
+import pandas as pd
+from exchange_adapter import ExchangeAdapter
+from candle_archive import CandleArchive
+from candle_store import KLINE_COLUMNS, interval_to_ms
+from order_book import round_to_tick
+
+MAKER_FEE = 0.0002
+TAKER_FEE = 0.00055
+
+
+def load_klines_csv(path):
+    """Load klines from a CSV with the columns timestamp, open, high, low, close, volume[, turnover]."""
+    df = pd.read_csv(path)
+    if 'turnover' not in df.columns:
+        df['turnover'] = df['close'] * df['volume']
+    df = df.sort_values('timestamp')
+    return df['timestamp'].to_numpy(dtype=np.int64), df[KLINE_COLUMNS[1:]].to_numpy(dtype=np.float64)
+
+
+def load_archive(root, symbol, interval, start=None, end=None):
+    """Load klines for [start, end] (ms open times) from a CandleArchive directory."""
+    return CandleArchive(root).read(symbol, interval, start, end)
+
+
+def parse_time(text):
+    """Millisecond timestamp from an ISO date/time (UTC) or a plain millisecond number."""
+    if text is None:
+        return None
+    if text.isdigit():
+        return int(text)
+    return int(pd.Timestamp(text, tz="UTC").timestamp() * 1000)
+
+
+class SimulatedPair:
+    def __init__(self, symbol, long_order, short_order, deadline, on_fill):
+        self.symbol = symbol
+        self.long_order = long_order
+        self.short_order = short_order
+        self.deadline = deadline
+        self.on_fill = on_fill
+        self.future = Future()
+
+    def order_ids(self):
+        return [order['orderId'] for order in (self.long_order, self.short_order) if order]
+
+
+class SimulatedExchange(ExchangeAdapter):
+    """Offline stand-in for the Bybit REST API, replaying stored candles.
+
+    It is an ExchangeAdapter backend that only implements ``send_request``, so the
+    bot's own place_order / set_leverage / position and order queries run
+    unchanged against a simulated matching engine:
+
+    * the bot evaluates after each bar closes and sees only closed bars;
+    * resting limit orders fill on the next bars when the low (buy) or high
+      (sell) reaches the limit price, at the limit or a better opening price;
+    * take-profit and stop-loss trigger from the bar after the entry; when both
+      are inside one bar the stop-loss is assumed to hit first;
+    * maker fees apply to limit fills and taker fees to TP/SL exits.
+
+    It also implements ``track_pair`` so it can stand in for the private-stream
+    OrderFillTracker: the sibling leg is cancelled in the same bar as the fill,
+    and pairs older than the timeout are cancelled (the stale-order rule).
+    """
+
+    def __init__(self, symbol, interval, timestamps, values, maker_fee=MAKER_FEE, taker_fee=TAKER_FEE):
+        super().__init__()
+        self.symbol = symbol
+        self.interval = str(interval)
+        self.interval_ms = interval_to_ms(interval)
+        self.timestamps = timestamps
+        self.opens, self.highs, self.lows, self.closes = (values[:, i] for i in range(4))
+        self.values = values
+        self.maker_fee = maker_fee
+        self.taker_fee = taker_fee
+
+        self.cursor = 0  # index of the last closed bar visible to the bot
+        self.orders = {}
+        # Recently closed orders as (order, status), for /v5/order/history
+        self.closed_orders = collections.deque(maxlen=500)
+        self.position = None
+        self.last_closed_position = None
+        self.pairs = []
+        self.trades = []
+        self.leverage = None
+        self.tick_size = 0.1
+        self._order_ids = itertools.count(1)
+        # Called with (topic, data) for order/execution/position changes, as on Bybit's private stream
+        self.listeners = []
+
+    # --- clock -----------------------------------------------------------------
+
+    def now_ms(self):
+        # The bot runs right after the cursor bar has closed
+        return int(self.timestamps[self.cursor]) + self.interval_ms
+
+    def clock(self):
+        return self.now_ms() / 1000
+
+    # --- REST emulation ----------------------------------------------------------
+
+    def send_request(self, method, endpoint, params=None, timeout=None, priority=None):
+        params = params or {}
+        handler = self.ENDPOINTS.get(endpoint)
+        if handler is None:
+            return {"retCode": 10001, "retMsg": f"Endpoint {endpoint} not simulated", "result": {}}
+        return handler(self, params)
+
+    def _ok(self, result):
+        return {"retCode": 0, "retMsg": "OK", "result": result, "time": self.now_ms()}
+
+    def _server_time(self, params):
+        now_ms = self.now_ms()
+        return self._ok({"timeSecond": str(now_ms // 1000), "timeNano": str(now_ms * 1_000_000)})
+
+    def _kline(self, params):
+        limit = int(params.get('limit', 200))
+        stop = self.cursor + 1
+        if params.get('end') is not None:
+            stop = min(stop, int(np.searchsorted(self.timestamps, int(params['end']), side='right')))
+        start = 0
+        if params.get('start') is not None:
+            start = int(np.searchsorted(self.timestamps, int(params['start']), side='left'))
+        start = max(start, stop - limit)
+        rows = []
+        for index in range(stop - 1, start - 1, -1):
+            rows.append([str(int(self.timestamps[index]))] + [repr(float(v)) for v in self.values[index]])
+        return self._ok({"category": "linear", "symbol": self.symbol, "list": rows})
+
+    def _tickers(self, params):
+        return self._ok({"category": "linear", "list": [
+            {"symbol": self.symbol, "lastPrice": repr(float(self.closes[self.cursor]))}
+        ]})
+
+    def _instruments_info(self, params):
+        return self._ok({"category": "linear", "list": [
+            {"symbol": self.symbol, "priceFilter": {"tickSize": repr(self.tick_size)}}
+        ]})
+
+    def book_levels(self, depth):
+        """Synthetic L2 levels around the current close, one tick apart: (bids, asks) best first."""
+        price = float(self.closes[self.cursor])
+        tick = self.tick_size
+        bids = [[repr(round_to_tick(price - (i + 1) * tick, tick)), str(i + 1)] for i in range(depth)]
+        asks = [[repr(round_to_tick(price + (i + 1) * tick, tick, "up")), str(i + 1)] for i in range(depth)]
+        return bids, asks
+
+    def _orderbook(self, params):
+        bids, asks = self.book_levels(int(params.get('limit', 1)))
+        return self._ok({"s": self.symbol, "b": bids, "a": asks, "ts": self.now_ms(), "u": self.cursor, "seq": self.cursor})
+
+    def _position_list(self, params):
+        if self.position is not None:
+            positions = [self._position_entry(self.position)]
+        elif self.last_closed_position is not None:
+            positions = [self.last_closed_position]
+        else:
+            positions = [{
+                "symbol": self.symbol, "side": "", "size": "0", "avgPrice": "0", "positionIdx": 0,
+                "leverage": str(self.leverage or 10), "updatedTime": "0",
+            }]
+        return self._ok({"category": "linear", "list": positions})
+
+    def _position_entry(self, position):
+        return {
+            "symbol": self.symbol,
+            "side": position['side'],
+            "size": repr(position['qty']),
+            "avgPrice": repr(position['entry_price']),
+            "positionIdx": 0,
+            "leverage": str(self.leverage or 10),
+            "takeProfit": repr(position['take_profit'] or 0),
+            "stopLoss": repr(position['stop_loss'] or 0),
+            "updatedTime": str(position['entry_time']),
+        }
+
+    def _order_entry(self, order, status="New"):
+        filled = status == "Filled"
+        return {
+            "orderId": order['orderId'], "symbol": self.symbol, "side": order['side'],
+            "price": repr(order['price']), "qty": repr(order['qty']), "orderStatus": status,
+            "cumExecQty": repr(order['qty']) if filled else "0", "positionIdx": 0,
+            "createdTime": str(order['created_time']), "updatedTime": str(self.now_ms()),
+            "orderLinkId": order['order_link_id'],
+        }
+
+    def _order_realtime(self, params):
+        return self._ok({"category": "linear", "list": [self._order_entry(order) for order in self.orders.values()]})
+
+    def _order_history(self, params):
+        entries = [self._order_entry(order, status) for order, status in reversed(self.closed_orders)
+                   if params.get('orderId') in (None, order['orderId'])]
+        return self._ok({"category": "linear", "list": entries})
+
+    def _close_order(self, order_id, status):
+        order = self.orders.pop(order_id, None)
+        if order is not None:
+            self.closed_orders.append((order, status))
+        return order
+
+    def _order_create(self, params):
+        order_id = f"bt-{next(self._order_ids)}"
+        self.orders[order_id] = {
+            "orderId": order_id,
+            "side": params['side'],
+            "price": float(params['price']),
+            "qty": float(params['qty']),
+            "take_profit": float(params['takeProfit']) if params.get('takeProfit') else None,
+            "stop_loss": float(params['stopLoss']) if params.get('stopLoss') else None,
+            "created_time": self.now_ms(),
+            "order_link_id": params.get('orderLinkId', ""),
+        }
+        if self.listeners:
+            self._emit("order", [self._order_entry(self.orders[order_id])])
+        return self._ok({"orderId": order_id, "orderLinkId": self.orders[order_id]['order_link_id']})
+
+    def _order_create_batch(self, params):
+        placed, statuses = [], []
+        for leg in params.get('request', []):
+            response = self._order_create(leg)
+            if response['retCode'] == 0:
+                placed.append({"category": "linear", "symbol": self.symbol, "orderId": response['result']['orderId'],
+                               "orderLinkId": response['result']['orderLinkId'], "createAt": str(self.now_ms())})
+            else:
+                placed.append({"category": "linear", "symbol": self.symbol, "orderId": "",
+                               "orderLinkId": leg.get('orderLinkId', "")})
+            statuses.append({"code": response['retCode'], "msg": response['retMsg']})
+        result = self._ok({"list": placed})
+        result["retExtInfo"] = {"list": statuses}
+        return result
+
+    def _order_cancel(self, params):
+        order_id = params.get('orderId')
+        if order_id is None:
+            order_id = next((o['orderId'] for o in self.orders.values()
+                             if params.get('orderLinkId') and o['order_link_id'] == params['orderLinkId']), None)
+        order = self._close_order(order_id, "Cancelled")
+        if order is None:
+            return {"retCode": 110001, "retMsg": "order not exists or too late to cancel", "result": {}}
+        if self.listeners:
+            self._emit("order", [self._order_entry(order, "Cancelled")])
+        return self._ok({"orderId": order_id, "orderLinkId": order['order_link_id']})
+
+    def _set_leverage(self, params):
+        if self.leverage == float(params['buyLeverage']):
+            return {"retCode": 110043, "retMsg": "leverage not modified", "result": {}}
+        self.leverage = float(params['buyLeverage'])
+        return self._ok({})
+
+    ENDPOINTS = {
+        "/v5/market/time": _server_time,
+        "/v5/market/kline": _kline,
+        "/v5/market/tickers": _tickers,
+        "/v5/market/orderbook": _orderbook,
+        "/v5/market/instruments-info": _instruments_info,
+        "/v5/position/list": _position_list,
+        "/v5/order/realtime": _order_realtime,
+        "/v5/order/history": _order_history,
+        "/v5/order/create": _order_create,
+        "/v5/order/create-batch": _order_create_batch,
+        "/v5/order/cancel": _order_cancel,
+        "/v5/position/set-leverage": _set_leverage,
+    }
+
+    def _emit(self, topic, data):
+        for listener in self.listeners:
+            listener(topic, data)
+
+    # --- fill tracking (OrderFillTracker stand-in) -----------------------------
+
+    def track_pair(self, symbol, long_order, short_order, timeout=None, on_fill=None):
+        deadline = self.now_ms() + int(timeout * 1000) if timeout else None
+        pair = SimulatedPair(symbol, long_order, short_order, deadline, on_fill)
+        self.pairs.append(pair)
+        return pair.future
+
+    def _resolve_pair(self, order_id, filled_order):
+        for pair in self.pairs:
+            if order_id in pair.order_ids():
+                self.pairs.remove(pair)
+                for other_id in pair.order_ids():
+                    self._close_order(other_id, "Cancelled")
+                pair.future.set_result(filled_order)
+                if pair.on_fill is not None:
+                    pair.on_fill(filled_order)
+                return
+
+    # --- matching ---------------------------------------------------------------
+
+    def _open_position(self, order, price, index):
+        fee = price * order['qty'] * self.maker_fee
+        self.position = {
+            "side": order['side'],
+            "qty": order['qty'],
+            "entry_price": price,
+            "entry_index": index,
+            "entry_time": int(self.timestamps[index]),
+            "take_profit": order['take_profit'],
+            "stop_loss": order['stop_loss'],
+            "fees": fee,
+        }
+
+    def _close_position(self, price, index, reason):
+        position = self.position
+        direction = 1 if position['side'] == 'Buy' else -1
+        fee = price * position['qty'] * self.taker_fee
+        gross = (price - position['entry_price']) * position['qty'] * direction
+        fees = position['fees'] + fee
+        close_time = int(self.timestamps[index]) + self.interval_ms
+        self.trades.append({
+            "side": position['side'],
+            "entry_time": position['entry_time'],
+            "exit_time": close_time,
+            "entry_price": position['entry_price'],
+            "exit_price": price,
+            "qty": position['qty'],
+            "gross_pnl": gross,
+            "fees": fees,
+            "pnl": gross - fees,
+            "reason": reason,
+        })
+        self.last_closed_position = {
+            "symbol": self.symbol, "side": "", "size": "0", "avgPrice": "0", "positionIdx": 0,
+            "leverage": str(self.leverage or 10), "updatedTime": str(close_time),
+        }
+        self.position = None
+        if self.listeners:
+            self._emit("position", [self.last_closed_position])
+
+    def _exit_price(self, index):
+        """TP/SL exit price within bar `index`, or None if neither triggers."""
+        position = self.position
+        open_price, high, low = self.opens[index], self.highs[index], self.lows[index]
+        tp, sl = position['take_profit'], position['stop_loss']
+        if position['side'] == 'Buy':
+            if sl and low <= sl:
+                return min(sl, open_price), 'stop_loss'
+            if tp and high >= tp:
+                return max(tp, open_price), 'take_profit'
+        else:
+            if sl and high >= sl:
+                return max(sl, open_price), 'stop_loss'
+            if tp and low <= tp:
+                return min(tp, open_price), 'take_profit'
+        return None
+
+    def match_bar(self, index):
+        """Advance the exchange through bar `index`."""
+        bar_open_time = int(self.timestamps[index])
+
+        # Stale pairs are cancelled before the bar trades
+        for pair in [pair for pair in self.pairs if pair.deadline is not None and pair.deadline <= bar_open_time]:
+            self.pairs.remove(pair)
+            for order_id in pair.order_ids():
+                self._close_order(order_id, "Cancelled")
+            pair.future.set_result(None)
+            if pair.on_fill is not None:
+                pair.on_fill(None)
+
+        if self.position is not None and self.position['entry_index'] < index:
+            exit_ = self._exit_price(index)
+            if exit_ is not None:
+                self._close_position(float(exit_[0]), index, exit_[1])
+
+        if self.orders and self.position is None:
+            open_price, high, low = self.opens[index], self.highs[index], self.lows[index]
+            fillable = []
+            for order in self.orders.values():
+                if order['side'] == 'Buy' and low <= order['price']:
+                    fillable.append((abs(open_price - order['price']), order, min(order['price'], open_price)))
+                elif order['side'] == 'Sell' and high >= order['price']:
+                    fillable.append((abs(open_price - order['price']), order, max(order['price'], open_price)))
+            if fillable:
+                # The level closest to the open is reached first
+                _, order, price = min(fillable, key=lambda item: item[0])
+                self._close_order(order['orderId'], "Filled")
+                self._open_position(order, float(price), index)
+                if self.listeners:
+                    self._emit("order", [self._order_entry(order, "Filled")])
+                    self._emit("execution", [{
+                        "orderId": order['orderId'], "symbol": self.symbol, "side": order['side'],
+                        "execPrice": repr(float(price)), "execQty": repr(order['qty']),
+                        "execTime": str(self.position['entry_time']), "isMaker": True,
+                    }])
+                    self._emit("position", [self._position_entry(self.position)])
+                self._resolve_pair(order['orderId'], {"orderId": order['orderId'], "orderLinkId": order['order_link_id']})
+
+    def next_exit_index(self, start):
+        """First bar at or after `start` where the open position's TP or SL triggers (vectorized)."""
+        position = self.position
+        tp, sl = position['take_profit'], position['stop_loss']
+        if position['side'] == 'Buy':
+            hit = np.zeros(len(self.timestamps) - start, dtype=bool)
+            if sl:
+                hit |= self.lows[start:] <= sl
+            if tp:
+                hit |= self.highs[start:] >= tp
+        else:
+            hit = np.zeros(len(self.timestamps) - start, dtype=bool)
+            if sl:
+                hit |= self.highs[start:] >= sl
+            if tp:
+                hit |= self.lows[start:] <= tp
+        if not hit.any():
+            return None
+        return start + int(np.argmax(hit))
+
+
+class Backtester:
+    """Replays stored candles through TradingBot.job against a SimulatedExchange."""
+
+    def __init__(self, timestamps, values, symbol="BTCUSDT", interval="1", bot_settings=None, quiet=True):
+        # Imported here so the module can be used without the live trading dependencies loaded
+        from trading_bot import TradingBot
+
+        self.exchange = SimulatedExchange(symbol, interval, timestamps, values)
+        self.bot = TradingBot(data_fetcher=self.exchange, clock=self.exchange.clock)
+        self.bot.symbol = symbol
+        self.bot.symbols = [symbol]
+        self.bot.interval = str(interval)
+        self.bot.order_tracker = self.exchange
+        # The archive holds bars from the "future" of the replay; the bot must only see the exchange's
+        self.bot.candle_store.archive = None
+        for name, value in (bot_settings or {}).items():
+            setattr(self.bot, name, value)
+        self.quiet = quiet
+
+    @contextlib.contextmanager
+    def _output(self):
+        if not self.quiet:
+            yield
+            return
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            yield
+
+    def run(self, start=None, end=None):
+        exchange = self.exchange
+        bars = len(exchange.timestamps)
+        index = start if start is not None else min(self.bot.limit, bars - 1)
+        end = bars if end is None else end
+
+        with self._output():
+            while index < end - 1:
+                index = self._step(index, end)
+                if index is None:
+                    break
+        return self.summary()
+
+    def _step(self, index, end):
+        """Let the bot act after bar `index`, then trade the next relevant bar; returns its index."""
+        exchange = self.exchange
+        exchange.cursor = index
+        self.bot.job(self.bot.symbol)
+
+        next_index = index + 1
+        if exchange.position is not None and not exchange.orders:
+            # While a position is open the bot only waits; jump straight to the exit bar
+            exit_index = exchange.next_exit_index(max(next_index, exchange.position['entry_index'] + 1))
+            if exit_index is None or exit_index >= end:
+                return None
+            next_index = exit_index
+        exchange.match_bar(next_index)
+        return next_index
+
+    def summary(self):
+        trades = pd.DataFrame(self.exchange.trades)
+        open_position = self.exchange.position is not None
+        if trades.empty:
+            return {"trades": 0, "net_pnl": 0.0, "win_rate": 0.0, "fees": 0.0, "max_drawdown": 0.0,
+                    "open_position": open_position}
+        equity = trades['pnl'].cumsum()
+        drawdown = (equity.cummax().clip(lower=0) - equity).max()
+        return {
+            "trades": len(trades),
+            "net_pnl": float(trades['pnl'].sum()),
+            "gross_pnl": float(trades['gross_pnl'].sum()),
+            "fees": float(trades['fees'].sum()),
+            "win_rate": float((trades['pnl'] > 0).mean()),
+            "avg_pnl": float(trades['pnl'].mean()),
+            "max_drawdown": float(drawdown),
+            "take_profits": int((trades['reason'] == 'take_profit').sum()),
+            "stop_losses": int((trades['reason'] == 'stop_loss').sum()),
+            # A position still open at the end of the data is not counted in the PnL
+            "open_position": open_position,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest the support/resistance strategy on stored klines.")
+    parser.add_argument("data", nargs="?", help="CSV file with timestamp,open,high,low,close,volume[,turnover] columns")
+    parser.add_argument("--archive", help="Read candles from this CandleArchive directory instead of a CSV")
+    parser.add_argument("--start", help="First candle (ISO date or ms), archive only")
+    parser.add_argument("--end", help="Last candle (ISO date or ms), archive only")
+    parser.add_argument("--symbol", default="BTCUSDT")
+    parser.add_argument("--interval", default="1")
+    parser.add_argument("--verbose", action="store_true", help="Show the bot's output for every bar")
+    args = parser.parse_args()
+
+    if args.archive:
+        timestamps, values = load_archive(args.archive, args.symbol, args.interval,
+                                          parse_time(args.start), parse_time(args.end))
+    elif args.data:
+        timestamps, values = load_klines_csv(args.data)
+    else:
+        parser.error("either a CSV file or --archive is required")
+    backtester = Backtester(timestamps, values, symbol=args.symbol, interval=args.interval, quiet=not args.verbose)
+    for key, value in backtester.run().items():
+        print(f"{key}: {value}")
@@ -0,0 +1,326 @@
+# benchmarks.py
+"""Offline benchmarks for the data, indicator and strategy hot paths.
+
+    python benchmarks.py                   # run and compare with benchmarks_baseline.json
+    python benchmarks.py --save-baseline   # record the current timings as the baseline
+    python benchmarks.py -k indicators     # only benchmarks whose name contains "indicators"
+
+A benchmark fails when its median time is more than --tolerance times its
+baseline; the script then exits with status 1. Baselines are machine specific,
+so re-record them when the benchmark machine changes.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import time
+import numpy as np
+from mock_bybit_server import MockBybitServer, generate_candles
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks_baseline.json")
+
+BAR_COUNTS = (100, 1000)
+SYMBOL_COUNTS = (1, 10)
+
+BENCHMARKS = []
+
+
+def benchmark(name, **params):
+    """Register `setup(**combination) -> callable` for every combination of the parameter lists."""
+    def register(setup):
+        keys = list(params)
+        combinations = [{}]
+        for key in keys:
+            combinations = [dict(c, **{key: value}) for c in combinations for value in params[key]]
+        for combination in combinations:
+            label = ",".join(f"{key}={combination[key]}" for key in keys)
+            BENCHMARKS.append((f"{name}[{label}]" if label else name, setup, combination))
+        return setup
+    return register
+
+
+def kline_rows(bars, seed=0):
+    """Bybit-style kline list (newest first, string fields)."""
+    timestamps, values = generate_candles(bars, seed=seed, end=1_700_000_000_000)
+    return [[str(t)] + [repr(float(v)) for v in row] for t, row in zip(timestamps[::-1], values[::-1])]
+
+
+def kline_frame(bars):
+    from strategy import Strategy
+    return Strategy().prepare_dataframe(kline_rows(bars))
+
+
+# --- benchmarks ----------------------------------------------------------------------
+
+@benchmark("prepare_dataframe", bars=BAR_COUNTS)
+def bench_prepare_dataframe(bars):
+    from strategy import Strategy
+    strategy = Strategy()
+    rows = kline_rows(bars)
+    return lambda: strategy.prepare_dataframe(rows)
+
+
+@benchmark("identify_support_resistance", bars=BAR_COUNTS)
+def bench_support_resistance(bars):
+    from strategy import Strategy
+    strategy = Strategy()
+    df = kline_frame(bars)
+    return lambda: strategy.identify_support_resistance(df)
+
+
+@benchmark("indicators.ema", bars=BAR_COUNTS)
+def bench_ema(bars):
+    from indicators import Indicators
+    df = kline_frame(bars)
+    return lambda: Indicators.calculate_ema(df, 20)
+
+
+@benchmark("indicators.rsi", bars=BAR_COUNTS)
+def bench_rsi(bars):
+    from indicators import Indicators
+    df = kline_frame(bars)
+    return lambda: Indicators.calculate_rsi(df)
+
+
+@benchmark("indicators.macd", bars=BAR_COUNTS)
+def bench_macd(bars):
+    from indicators import Indicators
+    df = kline_frame(bars)
+    return lambda: Indicators.calculate_macd(df)
+
+
+@benchmark("indicators.stochastic", bars=BAR_COUNTS)
+def bench_stochastic(bars):
+    from indicators import Indicators
+    df = kline_frame(bars)
+    return lambda: Indicators.calculate_stochastic(df)
+
+
+@benchmark("indicators.bollinger_bands", bars=BAR_COUNTS)
+def bench_bollinger(bars):
+    from indicators import Indicators
+    df = kline_frame(bars)
+    return lambda: Indicators.calculate_bollinger_bands(df)
+
+
+@benchmark("indicator_engine.compute", bars=BAR_COUNTS, symbols=SYMBOL_COUNTS)
+def bench_indicator_engine(bars, symbols):
+    from indicator_engine import IndicatorEngine
+    engine = IndicatorEngine()
+    block = np.stack([generate_candles(bars, seed=i)[1][:, :5] for i in range(symbols)])
+    return lambda: engine.compute(block)
+
+
+@benchmark("screener.update_and_rank", symbols=(300,))
+def bench_screener(symbols):
+    """One scan's work after the bulk ticker response arrives: bar update, levels, ATR and ranking."""
+    from screener import Screener, HIGH, LOW, CLOSE
+    screener = Screener(None, bars=100)
+    screener.symbols = [f"SYM{i}USDT" for i in range(symbols)]
+    screener.index = {symbol: row for row, symbol in enumerate(screener.symbols)}
+    screener.data = np.empty((symbols, 100, 3))
+    for row in range(symbols):
+        timestamps, values = generate_candles(100, seed=row, end=1_700_000_000_000)
+        screener.data[row, :, HIGH], screener.data[row, :, LOW], screener.data[row, :, CLOSE] = values[:, 1:4].T
+    screener.bar_open = np.full(symbols, timestamps[-1])
+    tickers = [{"symbol": symbol, "lastPrice": repr(float(screener.data[row, -1, CLOSE]))}
+               for row, symbol in enumerate(screener.symbols)]
+    now_ms = int(timestamps[-1]) + 30_000
+    return lambda: screener.rank(screener.update_prices(tickers, now_ms=now_ms))
+
+
+@benchmark("order_book.apply_delta", levels=(50, 200))
+def bench_order_book(levels):
+    """One stream delta (a few changed levels on each side) plus an entry price lookup."""
+    from order_book import OrderBook
+    book = OrderBook("BTCUSDT")
+    book.apply({"type": "snapshot", "data": {
+        "b": [[repr(30000.0 - i * 0.1), "1.5"] for i in range(levels)],
+        "a": [[repr(30000.1 + i * 0.1), "1.5"] for i in range(levels)],
+        "u": 1,
+    }})
+    deltas = [{"type": "delta", "data": {
+        "b": [["29999.9", str(1 + i % 3)], ["29999.5", "0" if i % 2 else "2"]],
+        "a": [["30000.2", str(2 + i % 3)], ["30000.6", "0" if i % 2 else "2"]],
+    }} for i in range(2)]
+    state = {"i": 0}
+
+    def run():
+        i = state["i"] = state["i"] + 1
+        # Deltas without an update id skip the continuity check, so the two can alternate forever
+        book.apply(deltas[i % 2])
+        return book.entry_price("Buy", 29999.97, 0.1, queue_limit=2)
+    return run
+
+
+@benchmark("market_bus.publish_tail", bars=BAR_COUNTS)
+def bench_market_bus(bars):
+    """Publish the forming candle and copy a worker's window out of shared memory."""
+    import atexit
+    from market_bus import MarketBus
+    timestamps, values = generate_candles(bars, end=1_700_000_000_000)
+    bus = MarketBus.create(["BTCUSDT"], bars, "1")
+    atexit.register(bus.close)
+    bus.publish("BTCUSDT", timestamps, values)
+
+    def run():
+        bus.publish("BTCUSDT", timestamps[-1:], values[-1:])
+        return bus.tail("BTCUSDT", bars)
+    return run
+
+
+@benchmark("risk_management.calculate_atr", bars=BAR_COUNTS)
+def bench_atr(bars):
+    from risk_management import RiskManagement
+    risk = RiskManagement()
+    df = kline_frame(bars)
+    return lambda: risk.calculate_atr(df)
+
+
+ORDER_PARAMS = {
+    "category": "linear", "symbol": "BTCUSDT", "side": "Buy", "orderType": "Limit",
+    "qty": "0.03", "price": "30000.5", "positionIdx": 0, "takeProfit": "30045.5",
+}
+
+
+@benchmark("request_signer.prepare")
+def bench_prepare():
+    from request_signer import RequestSigner
+    signer = RequestSigner("benchmark-key", "benchmark-secret")
+    return lambda: signer.prepare("POST", "/v5/order/create", ORDER_PARAMS)
+
+
+@benchmark("request_signer.sign")
+def bench_sign():
+    from request_signer import RequestSigner
+    signer = RequestSigner("benchmark-key", "benchmark-secret")
+    prepared = signer.prepare("POST", "/v5/order/create", ORDER_PARAMS)
+    return lambda: signer.sign(prepared)
+
+
+class _RecordingTracker:
+    """Stands in for OrderFillTracker so job() returns right after submitting orders."""
+
+    def track_pair(self, symbol, long_order, short_order, timeout=None, on_fill=None):
+        return None
+
+
+@benchmark("trading_bot.job", bars=BAR_COUNTS, symbols=SYMBOL_COUNTS)
+def bench_job(bars, symbols):
+    """One full cycle per symbol against the local mock server: account, klines, levels, two orders."""
+    from bybit_demo_session import BybitDemoSession
+    from trading_bot import TradingBot
+    from rate_limiter import RateLimiter, RATE_LIMITS
+
+    names = [f"SYM{i}USDT" for i in range(symbols)]
+    server = MockBybitServer(names, bars=max(bars, 1000)).start()
+    # Rate limits would measure the pacing, not the code
+    unlimited = RateLimiter({group: (1e9, 1e9) for group in RATE_LIMITS})
+    session = BybitDemoSession("benchmark-key", "benchmark-secret", rate_limiter=unlimited, base_url=server.url)
+    bot = TradingBot(data_fetcher=session)
+    bot.symbols = names
+    bot.limit = bars
+    bot.candle_store.max_bars = bars
+    bot.candle_store.archive = None
+    bot.order_tracker = _RecordingTracker()
+
+    def run():
+        # Fresh exchange state and candle buffers, so every run does the same work
+        server.reset()
+        bot.candle_store.buffers = {}
+        for symbol in names:
+            bot.account_state.invalidate(symbol)
+            bot.job(symbol)
+
+    run.cleanup = server.stop
+    return run
+
+
+# --- runner --------------------------------------------------------------------------
+
+def measure(func, repeat=5, min_time=0.2):
+    """Median and minimum seconds per call, calling `func` enough times per round to last `min_time`."""
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+    rounds = [elapsed / number]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        rounds.append((time.perf_counter() - started) / number)
+    return statistics.median(rounds), min(rounds)
+
+
+def run_benchmarks(selected, repeat):
+    results = {}
+    for name, setup, params in selected:
+        func = setup(**params)
+        try:
+            # The bot prints on every cycle; keep the table readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                median, best = measure(func, repeat=repeat)
+        finally:
+            cleanup = getattr(func, "cleanup", None)
+            if cleanup is not None:
+                cleanup()
+        results[name] = {"median": median, "min": best}
+        print(f"{name:<60} {median * 1e6:12.1f} us  (min {best * 1e6:.1f} us)", flush=True)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        ratio = result["median"] / reference["median"]
+        if ratio > tolerance:
+            regressions.append((name, ratio))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the trading hot paths.")
+    parser.add_argument("-k", dest="pattern", help="Only run benchmarks whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=1.5, help="Allowed slowdown factor against the baseline")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    selected = [entry for entry in BENCHMARKS if not args.pattern or args.pattern in entry[0]]
+    results = run_benchmarks(selected, args.repeat)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(dict(sorted(baseline.items())), f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        sys.exit(0)
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found, run with --save-baseline first.")
+        sys.exit(0)
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    if regressions:
+        for name, ratio in regressions:
+            print(f"REGRESSION {name}: {ratio:.2f}x slower than the baseline")
+        sys.exit(1)
+    print("No regressions against the baseline.")
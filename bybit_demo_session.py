@@ -1,234 +1,85 @@
-import requests
-import time
-import hashlib
-import hmac
-import json
-import os
-
-class BybitDemoSession:
-    def __init__(self, api_key, api_secret):
+from exchange_adapter import ExchangeAdapter
+from http_client import PooledHTTPClient, AsyncPooledHTTPClient
+from rate_limiter import RateLimiter, RATE_LIMIT_RET_CODE, request_symbol
+from kline_decoder import loads
+from instrumentation import metrics
+from request_signer import RequestSigner
+
+class BybitDemoSession(ExchangeAdapter):
+    """Raw pooled-HTTP backend (sync and async) for the Bybit demo API, or any host via `base_url`."""
+
+    def __init__(self, api_key, api_secret, pool_size=10, timeout=10, rate_limiter=None, rate_limit_retries=2,
+                 base_url="https://api-demo.bybit.com", recv_window=5000, **options):
+        super().__init__(**options)
         self.api_key = api_key
         self.api_secret = api_secret
-        self.base_url = "https://api-demo.bybit.com"
-
-    def _generate_signature(self, params):
-        param_str = '&'.join([f'{k}={params[k]}' for k in sorted(params)])
-        return hmac.new(self.api_secret.encode('utf-8'), param_str.encode('utf-8'), hashlib.sha256).hexdigest()
-
-    def _get_timestamp(self):
-        return str(int(time.time() * 1000))
-
-    def send_request(self, method, endpoint, params=None):
-        if params is None:
-            params = {}
-
-        params['api_key'] = self.api_key
-        params['timestamp'] = self._get_timestamp()
-        params['sign'] = self._generate_signature(params)
-
-        if method == "GET":
-            response = requests.get(f"{self.base_url}{endpoint}", params=params)
-        elif method == "POST":
-            response = requests.post(f"{self.base_url}{endpoint}", json=params)
-        else:
+        # v5 header signing; requests are serialized once and re-signed per attempt
+        self.signer = RequestSigner(api_key, api_secret, recv_window=recv_window)
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.timeout = timeout
+
+        # One keep-alive connection pool for the lifetime of the session
+        self.http = PooledHTTPClient(self.base_url, pool_size=pool_size, timeout=timeout)
+        self.async_http = None
+
+        # Requests are paced per endpoint group before they reach the exchange
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.rate_limit_retries = rate_limit_retries
+
+    def send_request(self, method, endpoint, params=None, timeout=None, priority=None):
+        if method not in ("GET", "POST"):
             raise ValueError("Unsupported HTTP method")
-
-        return response.json()
-
-    def get_historical_data(self, symbol, interval, limit):
-        try:
-            endpoint = "/v5/market/kline"
-            params = {
-                "category": "linear",
-                "symbol": symbol,
-                "interval": interval,
-                "limit": limit
-            }
-            response = self.send_request("GET", endpoint, params)
-            if response['retCode'] != 0:
-                raise Exception(f"API Error: {response['retMsg']}")
-            return response['result']['list']
-        except Exception as e:
-            print(f"Ошибка при получении исторических данных: {e}")
-            return None
-        
-    def set_leverage(self, symbol, leverage):
-        try:
-            endpoint = "/v5/position/set-leverage"
-            params = {
-                "category": "linear",
-                "symbol": symbol,
-                "buyLeverage": str(leverage),
-                "sellLeverage": str(leverage)
-            }
-            response = self.send_request("POST", endpoint, params)
-            if response['retCode'] != 0:
-                raise Exception(f"API Error: {response['retMsg']}")
-            print(f"Leverage set to {leverage}x for {symbol}.")
-        except Exception as e:
-            print(f"Ошибка при установке плеча: {e}")
-
-    def place_order(self, symbol, side, qty, current_price, leverage, stop_loss=None, take_profit=None):
-        try:
-            # Set leverage before placing an order
-            self.set_leverage(symbol, leverage=leverage)
-            
-            endpoint = "/v5/order/create"
-            # Manually set positionIdx based on known position mode:
-            # For Hedge Mode: 1 for long (buy), 2 for short (sell)
-            # For One-way Mode: 0
-            position_mode = "one_way"  # Set this to "hedge" if you are in hedge mode
-            
-            if position_mode == "hedge":
-                position_idx = 1 if side.lower() == 'buy' else 2
-            else:  # one_way
-                position_idx = 0
-
-            # Adjust price based on the side of the orderare you st
-            if side.lower() == 'buy':
-                price = current_price * 0.9999  # 0.01% below the current market price
-                if stop_loss and stop_loss >= price:
-                    print("Stop-loss is higher than or equal to the limit price for a Buy order. Adjusting stop-loss...")
-                    stop_loss = price * 0.995  # Ensure stop-loss is slightly below the limit price
-            else:
-                price = current_price * 1.0001  # 0.01% above the current market price
-                if stop_loss and stop_loss <= price:
-                    print("Stop-loss is lower than or equal to the limit price for a Sell order. Adjusting stop-loss...")
-                    stop_loss = price * 1.005  # Ensure stop-loss is slightly above the limit price
-
-            order_params = {
-                "category": "linear",
-                "symbol": symbol,
-                "side": side,
-                "orderType": "Limit",
-                "qty": str(qty),  # Convert quantity to string
-                "price": str(price),  # Ensure price is sent as a string
-                "positionIdx": position_idx,  # Use the positionIdx determined above
-            }
-
-            # if stop_loss:
-            #     order_params["stopLoss"] = str(stop_loss)
-            if take_profit:
-                order_params["takeProfit"] = str(take_profit)
-
-            response = self.send_request("POST", endpoint, order_params)
-            if response['retCode'] != 0:
-                raise Exception(f"API Error: {response['retMsg']}")
-
-            return response['result']
-        except Exception as e:
-            print(f"Ошибка при размещении ордера: {e}")
-            return None
-
-
-
-    def get_open_positions(self, symbol):
-        try:
-            endpoint = "/v5/position/list"
-            params = {
-                "category": "linear",
-                "symbol": symbol
-            }
-            response = self.send_request("GET", endpoint, params)
-            if response['retCode'] != 0:
-                raise Exception(f"API Error: {response['retMsg']}")
-
-            positions = response['result']['list']
-            active_positions = [pos for pos in positions if float(pos['size']) > 0]
-
-            if active_positions:
-                print("Active Open Positions:")
-                print(json.dumps(active_positions, indent=4))
-            else:
-                print("No opened positions.")
-
-            return active_positions
-        except Exception as e:
-            print(f"Ошибка при получении позиций: {e}")
-            return None
-
-    def get_open_orders(self, symbol):
-        try:
-            endpoint = "/v5/order/realtime"
-            params = {
-                "category": "linear",
-                "symbol": symbol
-            }
-            response = self.send_request("GET", endpoint, params)
-            if response['retCode'] != 0:
-                raise Exception(f"API Error: {response['retMsg']}")
-
-            open_orders = response['result']['list']
-            # current_time = time.time()
-            # orders_to_cancel = []
-
-            # for order in open_orders:
-            #     created_time = int(order['createdTime']) / 1000
-            #     if current_time - created_time > 180:  # 180 seconds = 3 minutes
-            #         orders_to_cancel.append(order)
-
-            # if orders_to_cancel:
-            #     for order in orders_to_cancel:
-            #         self.cancel_order(order['orderId'], symbol)
-            #         print(f"Order {order['orderId']} cancelled as it was older than 3 minutes.")
-            # else:
-            #     print("No orders older than 3 minutes.")
-
-            return open_orders
-        except Exception as e:
-            print(f"Ошибка при получении лимитных ордеров: {e}")
-            return None
-
-    def cancel_order(self, order_id, symbol):
-        try:
-            endpoint = "/v5/order/cancel"
-            params = {
-                "category": "linear",
-                "symbol": symbol,
-                "orderId": order_id
-            }
-            response = self.send_request("POST", endpoint, params)
-            if response['retCode'] != 0:
-                raise Exception(f"API Error: {response['retMsg']}")
-            print(f"Order {order_id} successfully cancelled.")
-        except Exception as e:
-            print(f"Ошибка при отмене ордера {order_id}: {e}")
-
-    def get_last_closed_position(self, symbol):
-        try:
-            endpoint = "/v5/position/list"
-            params = {
-                "category": "linear",
-                "symbol": symbol
-            }
-            response = self.send_request("GET", endpoint, params)
-            if response['retCode'] != 0:
-                raise Exception(f"API Error: {response['retMsg']}")
-
-            positions = response['result']['list']
-            closed_positions = [pos for pos in positions if float(pos['size']) == 0]
-
-            if closed_positions:
-                last_closed_position = max(closed_positions, key=lambda x: int(x['updatedTime']))
-                return last_closed_position
-            else:
-                print("No closed positions found.")
-                return None
-        except Exception as e:
-            print(f"Error fetching last closed position: {e}")
-            return None
-        
-    def get_real_time_price(self, symbol):
-        try:
-            endpoint = "/v5/market/tickers"
-            params = {
-                "category": "linear",
-                "symbol": symbol
-            }
-            response = self.send_request("GET", endpoint, params)
-            if response['retCode'] != 0:
-                raise Exception(f"API Error: {response['retMsg']}")
-            return float(response['result']['list'][0]['lastPrice'])
-        except Exception as e:
-            print(f"Ошибка при получении текущей цены: {e}")
-            return None
\ No newline at end of file
+        symbol = request_symbol(params)
+        prepared = self.signer.prepare(method, endpoint, params)
+
+        for attempt in range(self.rate_limit_retries + 1):
+            waited = self.rate_limiter.acquire(endpoint, symbol=symbol, priority=priority)
+            metrics.observe("rate_limit_wait", waited, endpoint=endpoint)
+            # Re-signed on every attempt so the timestamp stays inside recv_window
+            headers = self.signer.sign(prepared)
+            with metrics.timer("rest", endpoint=endpoint):
+                response = self.http.request(method, prepared.path, content=prepared.body, headers=headers,
+                                             timeout=timeout)
+                result = loads(response.content)
+            if result.get('retCode') != RATE_LIMIT_RET_CODE:
+                self.rate_limiter.update_from_headers(endpoint, response.headers, symbol=symbol)
+                return result
+            # Rejected for exceeding the limit: the request had no effect, so it is safe to resend
+            self.rate_limiter.record_rejection(endpoint, response.headers, symbol=symbol)
+            if attempt < self.rate_limit_retries:
+                print(f"Rate limit hit on {endpoint}, retrying ({attempt + 1}/{self.rate_limit_retries})...")
+        print(f"Rate limit hit on {endpoint}, giving up after {self.rate_limit_retries} retries.")
+        return result
+
+    async def send_request_async(self, method, endpoint, params=None, timeout=None, priority=None):
+        if method not in ("GET", "POST"):
+            raise ValueError("Unsupported HTTP method")
+        # The async client is created lazily so it binds to the running event loop
+        if self.async_http is None:
+            self.async_http = AsyncPooledHTTPClient(self.base_url, pool_size=self.pool_size, timeout=self.timeout)
+        symbol = request_symbol(params)
+        prepared = self.signer.prepare(method, endpoint, params)
+
+        for attempt in range(self.rate_limit_retries + 1):
+            waited = await self.rate_limiter.acquire_async(endpoint, symbol=symbol, priority=priority)
+            metrics.observe("rate_limit_wait", waited, endpoint=endpoint)
+            headers = self.signer.sign(prepared)
+            with metrics.timer("rest", endpoint=endpoint):
+                response = await self.async_http.request(method, prepared.path, content=prepared.body,
+                                                         headers=headers, timeout=timeout)
+                result = loads(response.content)
+            if result.get('retCode') != RATE_LIMIT_RET_CODE:
+                self.rate_limiter.update_from_headers(endpoint, response.headers, symbol=symbol)
+                return result
+            self.rate_limiter.record_rejection(endpoint, response.headers, symbol=symbol)
+            if attempt < self.rate_limit_retries:
+                print(f"Rate limit hit on {endpoint}, retrying ({attempt + 1}/{self.rate_limit_retries})...")
+        print(f"Rate limit hit on {endpoint}, giving up after {self.rate_limit_retries} retries.")
+        return result
+
+    def connection_stats(self):
+        stats = {"sync": self.http.connection_stats()}
+        if self.async_http is not None:
+            stats["async"] = self.async_http.connection_stats()
+        return stats
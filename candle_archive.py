@@ -0,0 +1,178 @@
+# candle_archive.py
+
+import argparse
+import os
+import threading
+import time
+import numpy as np
+from candle_store import KLINE_COLUMNS, MAX_KLINE_LIMIT, interval_to_ms, parse_klines
+
+VALUE_COLUMNS = KLINE_COLUMNS[1:]
+COLUMN_DTYPES = dict({"timestamp": np.dtype("<i8")}, **{name: np.dtype("<f8") for name in VALUE_COLUMNS})
+
+
+class CandleArchive:
+    """Columnar on-disk kline archive, one directory per symbol/interval.
+
+    Every column is a raw little-endian file (``timestamp.i8``, ``open.f8``, ...)
+    that only ever grows at the end. The timestamp column is written last, so its
+    length is the number of committed rows; anything past it in the other files
+    is a torn append and is cut off before the next write. Reads memory-map the
+    files and slice them by time with a binary search on the timestamp column,
+    so no data is copied until the caller asks for it.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.lock = threading.Lock()
+        self._maps = {}
+
+    def _dir(self, symbol, interval):
+        return os.path.join(self.root, symbol, str(interval))
+
+    def _path(self, symbol, interval, column):
+        suffix = "i8" if column == "timestamp" else "f8"
+        return os.path.join(self._dir(symbol, interval), f"{column}.{suffix}")
+
+    def size(self, symbol, interval):
+        path = self._path(symbol, interval, "timestamp")
+        if not os.path.exists(path):
+            return 0
+        return os.path.getsize(path) // COLUMN_DTYPES["timestamp"].itemsize
+
+    def _columns(self, symbol, interval):
+        """Memory-mapped views of all columns, limited to the committed rows."""
+        rows = self.size(symbol, interval)
+        key = (symbol, str(interval))
+        cached = self._maps.get(key)
+        if cached is not None and cached[0] == rows:
+            return cached[1]
+        if rows == 0:
+            columns = {name: np.empty(0, dtype=dtype) for name, dtype in COLUMN_DTYPES.items()}
+        else:
+            columns = {
+                name: np.memmap(self._path(symbol, interval, name), dtype=dtype, mode="r", shape=(rows,))
+                for name, dtype in COLUMN_DTYPES.items()
+            }
+        self._maps[key] = (rows, columns)
+        return columns
+
+    def first_timestamp(self, symbol, interval):
+        timestamps = self._columns(symbol, interval)["timestamp"]
+        return int(timestamps[0]) if len(timestamps) else None
+
+    def last_timestamp(self, symbol, interval):
+        timestamps = self._columns(symbol, interval)["timestamp"]
+        return int(timestamps[-1]) if len(timestamps) else None
+
+    def read_columns(self, symbol, interval, start=None, end=None):
+        """Zero-copy {column: array} views of candles with start <= open time <= end (ms)."""
+        columns = self._columns(symbol, interval)
+        timestamps = columns["timestamp"]
+        lo = 0 if start is None else int(np.searchsorted(timestamps, start, side="left"))
+        hi = len(timestamps) if end is None else int(np.searchsorted(timestamps, end, side="right"))
+        return {name: column[lo:hi] for name, column in columns.items()}
+
+    def read(self, symbol, interval, start=None, end=None):
+        """(timestamps, values) arrays in the layout used by CandleStore and the backtester."""
+        columns = self.read_columns(symbol, interval, start, end)
+        timestamps = np.array(columns["timestamp"], dtype=np.int64)
+        values = np.empty((len(timestamps), len(VALUE_COLUMNS)), dtype=np.float64)
+        for i, name in enumerate(VALUE_COLUMNS):
+            values[:, i] = columns[name]
+        return timestamps, values
+
+    def tail(self, symbol, interval, bars):
+        rows = self.size(symbol, interval)
+        if rows == 0:
+            return self.read(symbol, interval)
+        timestamps = self._columns(symbol, interval)["timestamp"]
+        return self.read(symbol, interval, start=int(timestamps[max(0, rows - bars)]))
+
+    def append(self, symbol, interval, timestamps, values):
+        """Append closed candles newer than the last archived one; returns the number written."""
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        with self.lock:
+            last = self.last_timestamp(symbol, interval)
+            if last is not None:
+                mask = timestamps > last
+                timestamps = timestamps[mask]
+                values = values[mask]
+            if len(timestamps) == 0:
+                return 0
+            if np.any(np.diff(timestamps) <= 0):
+                raise ValueError("Candles must be in strictly ascending open-time order")
+
+            os.makedirs(self._dir(symbol, interval), exist_ok=True)
+            rows = self.size(symbol, interval)
+            for i, name in enumerate(VALUE_COLUMNS):
+                self._append_column(symbol, interval, name, rows, values[:, i])
+            # Written last: this is what makes the new rows visible
+            self._append_column(symbol, interval, "timestamp", rows, timestamps)
+            return len(timestamps)
+
+    def _append_column(self, symbol, interval, name, rows, data):
+        dtype = COLUMN_DTYPES[name]
+        with open(self._path(symbol, interval, name), "ab") as f:
+            # Drop rows left over from an interrupted append
+            f.truncate(rows * dtype.itemsize)
+            f.write(np.ascontiguousarray(data, dtype=dtype).tobytes())
+            f.flush()
+
+    def backfill(self, data_fetcher, symbol, interval, start=None, end=None, clock=time.time):
+        """Download closed candles through the REST kline endpoint and append them.
+
+        Resumes after the last archived candle; `start` is only needed for a new
+        archive. Pages forward with explicit start/end bounds of at most 1000 bars.
+        Returns the number of candles written, or None if a request failed.
+        """
+        step = interval_to_ms(interval)
+        now = int(clock() * 1000)
+        # Open time of the newest candle that has already closed
+        last_open = (now // step) * step - step
+        if end is not None:
+            last_open = min(last_open, int(end))
+
+        last = self.last_timestamp(symbol, interval)
+        if last is not None:
+            cursor = last + step
+        elif start is not None:
+            cursor = int(start)
+        else:
+            raise ValueError(f"No archived candles for {symbol} ({interval}), a start time is required")
+
+        written = 0
+        while cursor <= last_open:
+            page_end = min(cursor + (MAX_KLINE_LIMIT - 1) * step, last_open)
+            historical_data = data_fetcher.get_historical_data(
+                symbol, interval, MAX_KLINE_LIMIT, start=cursor, end=page_end
+            )
+            if historical_data is None:
+                return None
+            timestamps, values = parse_klines(historical_data)
+            mask = timestamps <= last_open
+            written += self.append(symbol, interval, timestamps[mask], values[mask])
+            # An empty page is a gap (e.g. before the listing); move past it
+            cursor = page_end + step
+        print(f"Archived {written} candles for {symbol} ({interval}).")
+        return written
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from bybit_demo_session import BybitDemoSession
+
+    parser = argparse.ArgumentParser(description="Back-fill the local kline archive from Bybit.")
+    parser.add_argument("symbols", help="Comma-separated symbols")
+    parser.add_argument("--interval", default="1")
+    parser.add_argument("--days", type=float, default=30, help="History to fetch for symbols not archived yet")
+    parser.add_argument("--root", default=os.getenv("CANDLE_ARCHIVE_DIR", "candle_archive"))
+    args = parser.parse_args()
+
+    load_dotenv()
+    session = BybitDemoSession(os.getenv("BYBIT_API_KEY", ""), os.getenv("BYBIT_API_SECRET", ""))
+    archive = CandleArchive(args.root)
+    start = int((time.time() - args.days * 86400) * 1000)
+    for symbol in args.symbols.split(","):
+        archive.backfill(session, symbol.strip(), args.interval, start=start)
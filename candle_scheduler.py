@@ -0,0 +1,215 @@
+# candle_scheduler.py
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from candle_store import interval_to_ms
+
+# Weekly candles open on Monday 00:00 UTC; the epoch was a Thursday
+WEEK_ORIGIN_MS = 4 * 24 * 60 * 60_000
+
+
+def next_candle_close(now, interval):
+    """Server time (seconds) at which the candle open at `now` closes."""
+    interval_ms = interval_to_ms(interval)
+    origin = WEEK_ORIGIN_MS if str(interval) == "W" else 0
+    now_ms = int(now * 1000)
+    return ((now_ms - origin) // interval_ms + 1) * interval_ms / 1000 + origin / 1000
+
+
+class ServerClock:
+    """Exchange time estimated from request round trips.
+
+    Every response carries the server time. For a request sent at `sent` and
+    answered at `received` (local clock), the server stamped it around the
+    midpoint, so ``server - (sent + received) / 2`` is the clock offset, give
+    or take half the round trip. The sample with the shortest round trip among
+    the last `window` is used, as in NTP.
+    """
+
+    def __init__(self, clock=time.time, window=32):
+        self.clock = clock
+        self.offset = 0.0
+        self.rtt = None
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, sent, received, server_ms):
+        if not server_ms:
+            return
+        rtt = received - sent
+        offset = int(server_ms) / 1000 - (sent + received) / 2
+        with self._lock:
+            self._samples.append((rtt, offset))
+            self.rtt, self.offset = min(self._samples)
+
+    def sync(self, data_fetcher, samples=5):
+        """Take `samples` readings of /v5/market/time; returns False if none succeeded."""
+        synced = False
+        for _ in range(samples):
+            sent = self.clock()
+            try:
+                response = data_fetcher.send_request("GET", "/v5/market/time", {})
+            except Exception as e:
+                print(f"Ошибка при получении времени сервера: {e}")
+                continue
+            if response.get('retCode') == 0:
+                self.observe(sent, self.clock(), response.get('time'))
+                synced = True
+        return synced
+
+    def now(self):
+        return self.clock() + self.offset
+
+
+class Timer:
+    def __init__(self, name, callback, args, next_time, interval=None, period=None, delay=0.0):
+        self.name = name
+        self.callback = callback
+        self.args = args
+        self.interval = interval  # candle interval for close-aligned timers
+        self.period = period  # seconds for fixed-period timers
+        self.delay = delay
+        self.deadline = next_time
+        self.cancelled = False
+        self.running = False
+        self.runs = 0
+        self.skipped = 0
+        self.last_lateness = None
+
+    def following(self, now):
+        """Next deadline strictly after `now`, so a late timer never fires twice to catch up."""
+        if self.interval is not None:
+            return next_candle_close(now - self.delay, self.interval) + self.delay
+        return (int((now - self.delay) // self.period) + 1) * self.period + self.delay
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class CandleScheduler:
+    """Runs callbacks at candle closes in exchange time, on one hashed timer wheel.
+
+    Timers are close-aligned (``every_candle``, e.g. one per symbol and
+    interval) or fixed-period (``every``, aligned to multiples of the period).
+    The wheel has `slots` buckets of `tick` seconds; adding or cancelling a
+    timer is O(1) and each wake-up only looks at one bucket. The loop sleeps
+    until the next tick or the earliest deadline in the current bucket, so a
+    timer fires within OS scheduling jitter of its deadline.
+
+    Callbacks run on a thread pool and never block the wheel or each other.
+    If a timer's previous run is still going when it comes due, that run is
+    skipped rather than queued; if the loop itself wakes up late, each timer
+    fires once and moves to its next future deadline.
+    """
+
+    def __init__(self, server_clock=None, tick=0.05, slots=512, workers=8):
+        self.server_clock = server_clock or ServerClock()
+        self.tick = tick
+        self.slots = [[] for _ in range(slots)]
+        self.timers = []
+        self.running = False
+        self._tick_index = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scheduled")
+
+    # --- timers --------------------------------------------------------------------
+
+    def every_candle(self, interval, callback, *args, delay=0.0, name=None):
+        """Call `callback(*args)` `delay` seconds after every close of an `interval` candle."""
+        now = self.server_clock.now()
+        timer = Timer(name or f"{callback.__name__}{args}", callback, args,
+                      next_candle_close(now - delay, interval) + delay, interval=interval, delay=delay)
+        return self._add(timer)
+
+    def every(self, period, callback, *args, delay=0.0, name=None):
+        """Call `callback(*args)` every `period` seconds, at multiples of `period` plus `delay`."""
+        now = self.server_clock.now()
+        timer = Timer(name or f"{callback.__name__}{args}", callback, args, None, period=period, delay=delay)
+        timer.deadline = timer.following(now)
+        return self._add(timer)
+
+    def _add(self, timer):
+        with self._lock:
+            self.timers.append(timer)
+            self._insert(timer)
+        self._wakeup.set()
+        return timer
+
+    def _insert(self, timer):
+        self.slots[int(timer.deadline // self.tick) % len(self.slots)].append(timer)
+
+    # --- loop ----------------------------------------------------------------------
+
+    def run_pending(self, now=None):
+        """Fire every timer due at `now` (server time); returns how long to sleep until the next check."""
+        now = self.server_clock.now() if now is None else now
+        current = int(now // self.tick)
+        with self._lock:
+            first = current if self._tick_index is None else self._tick_index
+            # After a long stall one pass over the whole wheel covers every bucket
+            indices = range(first, current + 1) if current - first < len(self.slots) else range(len(self.slots))
+            due = []
+            for index in indices:
+                bucket = self.slots[index % len(self.slots)]
+                if not bucket:
+                    continue
+                keep = []
+                for timer in bucket:
+                    if timer.cancelled:
+                        continue
+                    if timer.deadline <= now:
+                        due.append(timer)
+                    else:
+                        keep.append(timer)
+                bucket[:] = keep
+            for timer in due:
+                self._fire(timer, now)
+                timer.deadline = timer.following(now)
+                self._insert(timer)
+            self._tick_index = current
+
+            # Sleep to the next tick, or less if something in this bucket is due sooner
+            wait = (current + 1) * self.tick - now
+            for timer in self.slots[current % len(self.slots)]:
+                if not timer.cancelled and timer.deadline > now:
+                    wait = min(wait, timer.deadline - now)
+        return max(wait, 0.0)
+
+    def _fire(self, timer, now):
+        timer.last_lateness = now - timer.deadline
+        if timer.running:
+            timer.skipped += 1
+            print(f"Skipping {timer.name}: the previous run is still in progress.")
+            return
+        timer.running = True
+        timer.runs += 1
+        self._executor.submit(self._run_timer, timer)
+
+    def _run_timer(self, timer):
+        try:
+            timer.callback(*timer.args)
+        except Exception as e:
+            print(f"Error in scheduled task {timer.name}: {e}")
+        finally:
+            timer.running = False
+
+    def run(self):
+        """Run the loop on the calling thread until ``stop``."""
+        self.running = True
+        while self.running:
+            # Cleared first, so a timer added while the wheel is being checked still wakes it
+            self._wakeup.clear()
+            self._wakeup.wait(self.run_pending())
+
+    def start(self):
+        thread = threading.Thread(target=self.run, name="candle-scheduler", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.running = False
+        self._wakeup.set()
+        self._executor.shutdown(wait=False)
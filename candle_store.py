@@ -0,0 +1,262 @@
+# candle_store.py
+
+import threading
+import time
+import numpy as np
+import pandas as pd
+from kline_decoder import decode_klines
+from instrumentation import metrics
+
+KLINE_COLUMNS = ["timestamp", "open", "high", "low", "close", "volume", "turnover"]
+
+# Bybit kline intervals expressed in milliseconds
+INTERVAL_MS = {
+    "1": 60_000,
+    "3": 3 * 60_000,
+    "5": 5 * 60_000,
+    "15": 15 * 60_000,
+    "30": 30 * 60_000,
+    "60": 60 * 60_000,
+    "120": 120 * 60_000,
+    "240": 240 * 60_000,
+    "360": 360 * 60_000,
+    "720": 720 * 60_000,
+    "D": 24 * 60 * 60_000,
+    "W": 7 * 24 * 60 * 60_000,
+}
+
+MAX_KLINE_LIMIT = 1000  # Bybit returns at most 1000 candles per request
+
+
+def interval_to_ms(interval):
+    try:
+        return INTERVAL_MS[str(interval)]
+    except KeyError:
+        raise ValueError(f"Unsupported kline interval: {interval}")
+
+
+class CandleBuffer:
+    """Append-only candle storage for a single symbol/interval.
+
+    Rows live in preallocated NumPy arrays sorted by open time. When the
+    arrays fill up, the newest ``max_bars`` rows are moved to the front, so
+    appends are amortized O(1) and ``tail`` is always a contiguous slice.
+    ``lock`` guards the rows; callers hold it around reads and writes.
+    """
+
+    def __init__(self, max_bars):
+        # One lock per symbol/interval, so symbols never wait on each other
+        self.lock = threading.Lock()
+        self.max_bars = max_bars
+        self.capacity = max_bars * 2
+        self.timestamps = np.zeros(self.capacity, dtype=np.int64)
+        self.values = np.zeros((self.capacity, len(KLINE_COLUMNS) - 1), dtype=np.float64)
+        self.size = 0
+
+    @property
+    def last_timestamp(self):
+        if self.size == 0:
+            return None
+        return int(self.timestamps[self.size - 1])
+
+    @property
+    def first_timestamp(self):
+        if self.size == 0:
+            return None
+        return int(self.timestamps[0])
+
+    def _compact(self, keep):
+        keep = min(self.size, keep)
+        start = self.size - keep
+        self.timestamps[:keep] = self.timestamps[start:self.size]
+        self.values[:keep] = self.values[start:self.size]
+        self.size = keep
+
+    def merge(self, timestamps, values):
+        """Merge candles sorted by ascending open time.
+
+        Candles older than the last stored one are ignored, a candle with the
+        same open time replaces the still-forming last bar in place, and newer
+        candles are appended.
+        """
+        if len(timestamps) == 0:
+            return 0
+
+        last = self.last_timestamp
+        if last is not None:
+            mask = timestamps >= last
+            timestamps = timestamps[mask]
+            values = values[mask]
+            if len(timestamps) and timestamps[0] == last:
+                self.values[self.size - 1] = values[0]
+                timestamps = timestamps[1:]
+                values = values[1:]
+
+        count = len(timestamps)
+        if count == 0:
+            return 0
+        if count > self.capacity:
+            timestamps = timestamps[-self.capacity:]
+            values = values[-self.capacity:]
+            count = self.capacity
+        if self.size + count > self.capacity:
+            self._compact(min(self.max_bars, self.capacity - count))
+
+        self.timestamps[self.size:self.size + count] = timestamps
+        self.values[self.size:self.size + count] = values
+        self.size += count
+        return count
+
+    def prepend(self, timestamps, values):
+        """Insert older candles in front of the stored ones (used for back-filling)."""
+        first = self.first_timestamp
+        if first is not None:
+            mask = timestamps < first
+            timestamps = timestamps[mask]
+            values = values[mask]
+        count = min(len(timestamps), self.capacity - self.size)
+        if count == 0:
+            return 0
+        timestamps = timestamps[-count:]
+        values = values[-count:]
+        self.timestamps[count:count + self.size] = self.timestamps[:self.size].copy()
+        self.values[count:count + self.size] = self.values[:self.size].copy()
+        self.timestamps[:count] = timestamps
+        self.values[:count] = values
+        self.size += count
+        return count
+
+    def tail(self, n):
+        start = max(0, self.size - n)
+        return self.timestamps[start:self.size], self.values[start:self.size]
+
+
+def parse_klines(historical_data):
+    """Convert a Bybit kline list (newest first, string fields) to ascending NumPy arrays."""
+    return decode_klines(historical_data)
+
+
+class CandleStore:
+    """Keeps a persistent candle buffer per symbol/interval and refreshes it incrementally."""
+
+    def __init__(self, data_fetcher, max_bars=MAX_KLINE_LIMIT, clock=time.time, archive=None, state_store=None):
+        self.data_fetcher = data_fetcher
+        self.max_bars = max_bars
+        self.clock = clock
+        # Optional CandleArchive used to warm up empty buffers without the network
+        self.archive = archive
+        # Optional StateStore that keeps a copy of every fetched or streamed candle for warm starts
+        self.state_store = state_store
+        self.buffers = {}
+        # Guards the buffer map only; every buffer has its own lock for its rows,
+        # and REST fetches run without holding either
+        self.lock = threading.Lock()
+
+    def get_buffer(self, symbol, interval):
+        key = (symbol, str(interval))
+        with self.lock:
+            buffer = self.buffers.get(key)
+            if buffer is None:
+                buffer = CandleBuffer(self.max_bars)
+                self.buffers[key] = buffer
+            return buffer
+
+    def merge_candle(self, symbol, interval, timestamp, values):
+        """Merge a single candle (open time in ms, OHLCV + turnover floats)."""
+        buffer = self.get_buffer(symbol, interval)
+        timestamps, values = np.array([timestamp], dtype=np.int64), np.array([values], dtype=np.float64)
+        self._save(symbol, interval, timestamps, values)
+        with buffer.lock:
+            return buffer.merge(timestamps, values)
+
+    def restore(self, symbol, interval, timestamps, values):
+        """Load candles saved by a previous run into the buffer."""
+        buffer = self.get_buffer(symbol, interval)
+        with buffer.lock:
+            return buffer.merge(timestamps, values)
+
+    def _save(self, symbol, interval, timestamps, values):
+        if self.state_store is not None:
+            self.state_store.save_candles(symbol, interval, timestamps, values)
+
+    def _fetch(self, symbol, interval, limit, start=None, end=None):
+        historical_data = self.data_fetcher.get_historical_data(symbol, interval, limit, start=start, end=end)
+        if historical_data is None:
+            return None
+        with metrics.timer("parse"):
+            return parse_klines(historical_data)
+
+    def _backfill(self, buffer, symbol, interval, bars):
+        # Page backwards from the newest candle until `bars` candles are stored
+        with buffer.lock:
+            end = buffer.first_timestamp - 1 if buffer.size else None
+            size = buffer.size
+        while size < bars:
+            limit = min(MAX_KLINE_LIMIT, bars - size)
+            parsed = self._fetch(symbol, interval, limit, end=end)
+            if parsed is None:
+                return False
+            timestamps, values = parsed
+            if len(timestamps) == 0:
+                break
+            self._save(symbol, interval, timestamps, values)
+            with buffer.lock:
+                if end is None:
+                    buffer.merge(timestamps, values)
+                elif buffer.prepend(timestamps, values) == 0:
+                    break
+                end = buffer.first_timestamp - 1
+                size = buffer.size
+        return True
+
+    def update(self, symbol, interval, bars):
+        """Bring the buffer up to date and make sure it holds at least `bars` candles.
+
+        Only candles starting at or after the last stored open time are requested,
+        so a normal tick downloads one or two rows instead of the whole window.
+        The buffer's lock is only held to merge, so symbols refresh in parallel.
+        """
+        return self._update(symbol, interval, bars)
+
+    def _update(self, symbol, interval, bars):
+        bars = min(bars, self.max_bars)
+        buffer = self.get_buffer(symbol, interval)
+
+        with buffer.lock:
+            last = buffer.last_timestamp
+            if last is None and self.archive is not None:
+                # Warm start from the local archive; REST only fills the gap after its last candle
+                buffer.merge(*self.archive.tail(symbol, interval, bars))
+                last = buffer.last_timestamp
+            if last is not None:
+                missing = (int(self.clock() * 1000) - last) // interval_to_ms(interval) + 1
+                if missing >= MAX_KLINE_LIMIT:
+                    # Too far behind to catch up in one request, start over
+                    buffer.size = 0
+                    last = None
+
+        if last is None:
+            return self._backfill(buffer, symbol, interval, bars)
+
+        parsed = self._fetch(symbol, interval, MAX_KLINE_LIMIT, start=last)
+        if parsed is None:
+            return False
+        self._save(symbol, interval, *parsed)
+        with buffer.lock:
+            buffer.merge(*parsed)
+            size = buffer.size
+
+        if size < bars:
+            return self._backfill(buffer, symbol, interval, bars)
+        return True
+
+    def get_dataframe(self, symbol, interval, bars):
+        """Return the last `bars` candles as a DataFrame in ascending time order."""
+        buffer = self.get_buffer(symbol, interval)
+        with buffer.lock:
+            timestamps, values = buffer.tail(bars)
+            timestamps = timestamps.copy()
+            values = values.copy()
+        df = pd.DataFrame(values, columns=KLINE_COLUMNS[1:])
+        df.insert(0, "timestamp", timestamps)
+        return df
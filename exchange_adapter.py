@@ -0,0 +1,457 @@
+# exchange_adapter.py
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from order_book import round_to_tick
+
+# Transport backends by name; the classes are imported lazily since they subclass ExchangeAdapter
+BACKENDS = {
+    "http": ("bybit_demo_session", "BybitDemoSession"),
+    "pybit": ("data_fetcher", "DataFetcher"),
+}
+
+
+class ExchangeAdapter(ABC):
+    """Bybit v5 linear-contract operations with the same semantics on every transport.
+
+    Subclasses are transport backends and only implement ``send_request``
+    (method, endpoint, params) -> parsed response dict: BybitDemoSession
+    (pooled HTTP, plus a native async client), DataFetcher (pybit) and the
+    backtester's SimulatedExchange. Order pricing, position mode, leverage
+    caching, response validation and stale-order handling live here.
+    """
+
+    def __init__(self, price_offset=0.0001, position_mode="one_way", stale_order_timeout=None):
+        # Limit orders are placed this fraction away from the requested price (0.0001 = 0.01%)
+        self.price_offset = price_offset
+        # "one_way" (positionIdx 0) or "hedge" (1 for long, 2 for short); must match the account setting
+        self.position_mode = position_mode
+        # When set, get_open_orders cancels orders older than this many seconds
+        self.stale_order_timeout = stale_order_timeout
+
+        # Last leverage confirmed by the exchange per symbol, to avoid re-sending it
+        self.known_leverage = {}
+
+        # Optional candle_scheduler.ServerClock fed with the server time of every response
+        self.server_clock = None
+
+        # Tick-aware pricing against the local order books (symbol -> order_book.OrderBook), when enabled
+        self.book_pricing = False
+        self.order_books = {}
+        # Join-queue limit for OrderBook.entry_price; None never steps ahead of a queue
+        self.queue_limit = None
+        self.tick_sizes = {}
+
+        # Both legs of a pair go out in one create-batch request; otherwise as two parallel requests
+        self.batch_orders = True
+        self._order_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="order-submit")
+
+    # --- transport -----------------------------------------------------------------
+
+    @abstractmethod
+    def send_request(self, method, endpoint, params=None, timeout=None, priority=None):
+        pass
+
+    async def send_request_async(self, method, endpoint, params=None, timeout=None, priority=None):
+        # Backends without a native async client run the blocking call in the default executor
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, lambda: self.send_request(method, endpoint, params, timeout=timeout, priority=priority))
+
+    def _result(self, method, endpoint, params):
+        if self.server_clock is None:
+            response = self.send_request(method, endpoint, params)
+        else:
+            sent = self.server_clock.clock()
+            response = self.send_request(method, endpoint, params)
+            self.server_clock.observe(sent, self.server_clock.clock(), response.get('time'))
+        if response['retCode'] != 0:
+            raise Exception(f"API Error: {response['retMsg']}")
+        return response['result']
+
+    # --- market data ---------------------------------------------------------------
+
+    def get_historical_data(self, symbol, interval, limit, start=None, end=None):
+        try:
+            params = {
+                "category": "linear",
+                "symbol": symbol,
+                "interval": interval,
+                "limit": limit
+            }
+            # Optional open-time bounds in milliseconds, used for incremental updates
+            if start is not None:
+                params["start"] = start
+            if end is not None:
+                params["end"] = end
+            return self._result("GET", "/v5/market/kline", params)['list']
+        except Exception as e:
+            print(f"Ошибка при получении исторических данных: {e}")
+            return None
+
+    def get_real_time_price(self, symbol):
+        try:
+            result = self._result("GET", "/v5/market/tickers", {"category": "linear", "symbol": symbol})
+            return float(result['list'][0]['lastPrice'])
+        except Exception as e:
+            print(f"Ошибка при получении текущей цены: {e}")
+            return None
+
+    def get_tickers(self, symbol=None):
+        """Ticker entries for one symbol, or for every linear contract in one request when `symbol` is None."""
+        try:
+            params = {"category": "linear"}
+            if symbol is not None:
+                params["symbol"] = symbol
+            return self._result("GET", "/v5/market/tickers", params)['list']
+        except Exception as e:
+            print(f"Ошибка при получении тикеров: {e}")
+            return None
+
+    def get_order_book(self, symbol, limit=50):
+        """REST order book snapshot (``result`` with b/a/u/seq), e.g. to check a local OrderBook."""
+        try:
+            return self._result("GET", "/v5/market/orderbook", {"category": "linear", "symbol": symbol, "limit": limit})
+        except Exception as e:
+            print(f"Ошибка при получении стакана: {e}")
+            return None
+
+    def get_tick_size(self, symbol):
+        """Price tick of `symbol` from instruments-info, cached once known."""
+        tick_size = self.tick_sizes.get(symbol)
+        if tick_size is not None:
+            return tick_size
+        try:
+            result = self._result("GET", "/v5/market/instruments-info", {"category": "linear", "symbol": symbol})
+            tick_size = float(result['list'][0]['priceFilter']['tickSize'])
+        except Exception as e:
+            print(f"Ошибка при получении шага цены: {e}")
+            return None
+        self.tick_sizes[symbol] = tick_size
+        return tick_size
+
+    # --- leverage ------------------------------------------------------------------
+
+    def get_current_leverage(self, symbol):
+        positions = self.get_positions(symbol)
+        if not positions:
+            return None
+        return float(positions[0]['leverage'])
+
+    def set_leverage(self, symbol, leverage):
+        if self.known_leverage.get(symbol) == float(leverage):
+            return
+        try:
+            params = {
+                "category": "linear",
+                "symbol": symbol,
+                "buyLeverage": str(leverage),
+                "sellLeverage": str(leverage)
+            }
+            response = self.send_request("POST", "/v5/position/set-leverage", params)
+            # 110043: leverage not modified, i.e. it is already set to this value
+            if response['retCode'] not in (0, 110043):
+                raise Exception(f"API Error: {response['retMsg']}")
+            self.known_leverage[symbol] = float(leverage)
+            print(f"Leverage set to {leverage}x for {symbol}.")
+        except Exception as e:
+            print(f"Ошибка при установке плеча: {e}")
+
+    # --- orders --------------------------------------------------------------------
+
+    def _order_params(self, symbol, side, qty, current_price, stop_loss=None, take_profit=None):
+        if self.position_mode == "hedge":
+            position_idx = 1 if side.lower() == 'buy' else 2
+        else:  # one_way
+            position_idx = 0
+
+        # Adjust price based on the side of the order
+        if side.lower() == 'buy':
+            price = current_price * (1 - self.price_offset)  # 0.01% below the current market price by default
+        else:
+            price = current_price * (1 + self.price_offset)  # 0.01% above the current market price by default
+        if self.book_pricing:
+            price = self._book_price(symbol, side, price)
+
+        if side.lower() == 'buy':
+            if stop_loss and stop_loss >= price:
+                print("Stop-loss is higher than or equal to the limit price for a Buy order. Adjusting stop-loss...")
+                stop_loss = price * 0.995  # Ensure stop-loss is slightly below the limit price
+        else:
+            if stop_loss and stop_loss <= price:
+                print("Stop-loss is lower than or equal to the limit price for a Sell order. Adjusting stop-loss...")
+                stop_loss = price * 1.005  # Ensure stop-loss is slightly above the limit price
+
+        order_params = {
+            "category": "linear",
+            "symbol": symbol,
+            "side": side,
+            "orderType": "Limit",
+            "qty": str(qty),
+            "price": str(price),
+            "positionIdx": position_idx,
+        }
+
+        if stop_loss:
+            order_params["stopLoss"] = str(stop_loss)
+        if take_profit:
+            order_params["takeProfit"] = str(take_profit)
+        return order_params
+
+    def _book_price(self, symbol, side, price):
+        tick_size = self.get_tick_size(symbol)
+        if tick_size is None:
+            return price
+        book = self.order_books.get(symbol)
+        if book is not None and book.valid:
+            return book.entry_price(side, price, tick_size, self.queue_limit)
+        return round_to_tick(price, tick_size, "down" if side.lower() == 'buy' else "up")
+
+    def _submit_order(self, order_params):
+        try:
+            return self._result("POST", "/v5/order/create", order_params)
+        except Exception as e:
+            print(f"Ошибка при размещении ордера: {e}")
+            return None
+
+    def place_order(self, symbol, side, qty, current_price, leverage, stop_loss=None, take_profit=None):
+        try:
+            # Set leverage before placing an order
+            self.set_leverage(symbol, leverage=leverage)
+            order_params = self._order_params(symbol, side, qty, current_price, stop_loss, take_profit)
+        except Exception as e:
+            print(f"Ошибка при размещении ордера: {e}")
+            return None
+        return self._submit_order(order_params)
+
+    def place_order_pair(self, symbol, qty, leverage, long_price, short_price,
+                         long_stop_loss=None, long_take_profit=None, short_stop_loss=None, short_take_profit=None):
+        """Place the long and short limit legs together; returns (long_result, short_result).
+
+        Leverage is set once for both legs. With ``batch_orders`` both legs go
+        out in one /v5/order/create-batch request, otherwise as two concurrent
+        requests. A failed leg is reported and returned as None.
+        """
+        try:
+            self.set_leverage(symbol, leverage=leverage)
+            legs = [
+                self._order_params(symbol, 'Buy', qty, long_price, long_stop_loss, long_take_profit),
+                self._order_params(symbol, 'Sell', qty, short_price, short_stop_loss, short_take_profit),
+            ]
+        except Exception as e:
+            print(f"Ошибка при размещении ордеров: {e}")
+            return None, None
+
+        if self.batch_orders:
+            results = self._submit_batch(symbol, legs)
+            if results is not None:
+                return results
+            # The batch was rejected as a whole, so nothing was placed and the legs can go out on their own
+
+        futures = [self._order_executor.submit(self._submit_order, leg) for leg in legs]
+        return futures[0].result(), futures[1].result()
+
+    def _submit_batch(self, symbol, legs):
+        """Per-leg results of one create-batch request, or None when the request was rejected outright."""
+        # Client order ids let the legs be found again when the response is lost
+        batch_id = uuid.uuid4().hex
+        request = [dict({k: v for k, v in leg.items() if k != "category"}, orderLinkId=f"{batch_id}-{i}")
+                   for i, leg in enumerate(legs)]
+        try:
+            response = self.send_request("POST", "/v5/order/create-batch", {"category": "linear", "request": request})
+        except Exception as e:
+            # The request may still have reached the exchange; resending could duplicate the orders
+            print(f"Ошибка при пакетном размещении ордеров: {e}")
+            return self._recover_batch(symbol, request)
+        if response['retCode'] != 0:
+            print(f"Batch order rejected for {symbol}: {response['retMsg']}")
+            return None
+
+        placed = response['result'].get('list', [])
+        statuses = response.get('retExtInfo', {}).get('list', [])
+        results = []
+        for i, leg in enumerate(legs):
+            status = statuses[i] if i < len(statuses) else {"code": 0}
+            if status.get('code', 0) != 0 or i >= len(placed) or not placed[i].get('orderId'):
+                print(f"{leg['side']} order for {symbol} failed: {status.get('msg', 'no result')}")
+                results.append(None)
+            else:
+                results.append(placed[i])
+        return tuple(results)
+
+    def _recover_batch(self, symbol, request):
+        """Adopt the legs of a batch whose outcome is unknown from the open orders; cancel them if that fails.
+
+        Nothing is resent. A leg that is not open either never reached the
+        exchange or has already filled, and is reported as failed.
+        """
+        open_orders = self.get_open_orders(symbol)
+        if open_orders is None:
+            for leg in request:
+                try:
+                    self._result("POST", "/v5/order/cancel",
+                                 {"category": "linear", "symbol": symbol, "orderLinkId": leg['orderLinkId']})
+                    print(f"{leg['side']} order {leg['orderLinkId']} of the failed batch cancelled.")
+                except Exception:
+                    # Most likely never placed
+                    pass
+            return None, None
+
+        by_link_id = {order.get('orderLinkId'): order for order in open_orders}
+        results = []
+        for leg in request:
+            order = by_link_id.get(leg['orderLinkId'])
+            if order is None:
+                print(f"{leg['side']} order for {symbol} was not placed.")
+                results.append(None)
+            else:
+                print(f"{leg['side']} order {order['orderId']} for {symbol} was placed despite the error; adopting it.")
+                results.append({"orderId": order['orderId'], "orderLinkId": leg['orderLinkId']})
+        return tuple(results)
+
+    def get_open_orders(self, symbol):
+        try:
+            open_orders = self._result("GET", "/v5/order/realtime", {"category": "linear", "symbol": symbol})['list']
+        except Exception as e:
+            print(f"Ошибка при получении лимитных ордеров: {e}")
+            return None
+
+        if self.stale_order_timeout is not None:
+            current_time = time.time()
+            for order in open_orders:
+                if current_time - int(order['createdTime']) / 1000 > self.stale_order_timeout:
+                    self.cancel_order(order['orderId'], symbol)
+                    print(f"Order {order['orderId']} cancelled as it was older than {self.stale_order_timeout:g} seconds.")
+        return open_orders
+
+    async def get_open_orders_async(self, symbol):
+        """Open orders over ``send_request_async``, for fill polling; stale orders are left to get_open_orders."""
+        try:
+            response = await self.send_request_async("GET", "/v5/order/realtime", {"category": "linear", "symbol": symbol})
+            if response['retCode'] != 0:
+                raise Exception(f"API Error: {response['retMsg']}")
+            return response['result']['list']
+        except Exception as e:
+            print(f"Ошибка при получении лимитных ордеров: {e}")
+            return None
+
+    def get_order(self, symbol, order_id):
+        """The order as listed in the order history (``orderStatus``, ``cumExecQty``, ...), or None if not found."""
+        try:
+            orders = self._result("GET", "/v5/order/history", {"category": "linear", "symbol": symbol, "orderId": order_id})['list']
+        except Exception as e:
+            print(f"Ошибка при получении истории ордеров: {e}")
+            return None
+        return orders[0] if orders else None
+
+    def _all_pages(self, endpoint, params):
+        items, cursor = [], None
+        while True:
+            page = self._result("GET", endpoint, dict(params, cursor=cursor) if cursor else params)
+            items.extend(page['list'])
+            cursor = page.get('nextPageCursor')
+            if not cursor or not page['list']:
+                return items
+
+    def get_all_open_orders(self, settle_coin="USDT"):
+        """Open orders of every symbol settled in `settle_coin` (one request per 50 orders)."""
+        try:
+            return self._all_pages("/v5/order/realtime", {"category": "linear", "settleCoin": settle_coin, "limit": 50})
+        except Exception as e:
+            print(f"Ошибка при получении лимитных ордеров: {e}")
+            return None
+
+    def cancel_order(self, order_id, symbol):
+        try:
+            self._result("POST", "/v5/order/cancel", {"category": "linear", "symbol": symbol, "orderId": order_id})
+            print(f"Order {order_id} successfully cancelled.")
+        except Exception as e:
+            print(f"Ошибка при отмене ордера {order_id}: {e}")
+
+    # --- positions -----------------------------------------------------------------
+
+    def get_positions(self, symbol):
+        try:
+            return self._result("GET", "/v5/position/list", {"category": "linear", "symbol": symbol})['list']
+        except Exception as e:
+            print(f"Ошибка при получении позиций: {e}")
+            return None
+
+    def get_all_positions(self, settle_coin="USDT"):
+        """Open positions of every symbol settled in `settle_coin`; Bybit omits flat ones without a symbol."""
+        try:
+            return self._all_pages("/v5/position/list", {"category": "linear", "settleCoin": settle_coin, "limit": 200})
+        except Exception as e:
+            print(f"Ошибка при получении позиций: {e}")
+            return None
+
+    def get_open_positions(self, symbol):
+        positions = self.get_positions(symbol)
+        if positions is None:
+            return None
+
+        active_positions = [pos for pos in positions if float(pos['size']) > 0]
+
+        if active_positions:
+            print("Active Open Positions:")
+            print(json.dumps(active_positions, indent=4))
+        else:
+            print("No opened positions.")
+
+        return active_positions
+
+    def get_last_closed_position(self, symbol):
+        positions = self.get_positions(symbol)
+        if positions is None:
+            return None
+
+        closed_positions = [pos for pos in positions if float(pos['size']) == 0]
+
+        if closed_positions:
+            return max(closed_positions, key=lambda x: int(x['updatedTime']))
+        print("No closed positions found.")
+        return None
+
+
+def create_exchange(backend, api_key, api_secret, **options):
+    """Build the named transport backend ("http" or "pybit") with the shared adapter options."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown exchange backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+    module_name, class_name = BACKENDS[backend]
+    module = __import__(module_name)
+    return getattr(module, class_name)(api_key, api_secret, **options)
+
+
+def adapter_options_from_env():
+    """Adapter options from PRICE_OFFSET / POSITION_MODE / STALE_ORDER_TIMEOUT."""
+    stale = os.getenv("STALE_ORDER_TIMEOUT")
+    return {
+        "price_offset": float(os.getenv("PRICE_OFFSET", 0.0001)),
+        "position_mode": os.getenv("POSITION_MODE", "one_way").lower(),
+        "stale_order_timeout": float(stale) if stale else None,
+    }
+
+
+def exchange_from_env(api_key, api_secret, pool_size=10):
+    """The backend named by EXCHANGE_BACKEND with its settings and the adapter options from the environment."""
+    # EXCHANGE_BACKEND=http (pooled HTTP, demo by default) or pybit (testnet by default)
+    backend = os.getenv("EXCHANGE_BACKEND", "http").lower()
+    options = adapter_options_from_env()
+    if backend == "http":
+        options.update(
+            pool_size=int(os.getenv("HTTP_POOL_SIZE", pool_size)),
+            timeout=float(os.getenv("HTTP_TIMEOUT", 10)),
+            # Point at a local mock exchange (mock_bybit_server.py) for load and latency testing
+            base_url=os.getenv("BYBIT_BASE_URL", "https://api-demo.bybit.com")
+        )
+    elif backend == "pybit":
+        options.update(
+            testnet=os.getenv("BYBIT_TESTNET", "True").lower() == "true",
+            demo=os.getenv("BYBIT_DEMO", "False").lower() == "true"
+        )
+    return create_exchange(backend, api_key, api_secret, **options)
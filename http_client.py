@@ -0,0 +1,136 @@
+# http_client.py
+
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:  # The async client is optional
+    httpx = None
+
+try:
+    import h2  # noqa: F401  (httpx only negotiates HTTP/2 when h2 is installed)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class ConnectionStats:
+    """Counts requests and newly opened connections to show how often connections are reused."""
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_connection(self):
+        with self._lock:
+            self.new_connections += 1
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def as_dict(self):
+        reused = max(0, self.requests - self.new_connections)
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reused_connections": reused,
+            "reuse_ratio": reused / self.requests if self.requests else 0.0,
+            "errors": self.errors,
+        }
+
+
+class PooledHTTPClient:
+    """Keep-alive HTTP client backed by a requests.Session with a bounded connection pool."""
+
+    def __init__(self, base_url, pool_size=10, timeout=10):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.stats = ConnectionStats()
+
+        self.session = requests.Session()
+        # Retries are left to the caller; a silent retry could duplicate an order
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0, pool_block=False)
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+
+    def connection_stats(self):
+        # urllib3 keeps a per-host pool that counts every connection it had to create
+        pools = self.adapter.poolmanager.pools
+        self.stats.new_connections = sum(pools[key].num_connections for key in pools.keys())
+        return self.stats.as_dict()
+
+    def request(self, method, endpoint, params=None, json=None, headers=None, timeout=None, content=None):
+        try:
+            response = self.session.request(
+                method,
+                f"{self.base_url}{endpoint}",
+                params=params,
+                json=json,
+                data=content,
+                headers=headers,
+                timeout=timeout or self.timeout
+            )
+        except Exception:
+            self.stats.record_error()
+            raise
+        finally:
+            self.stats.record_request()
+        return response
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncPooledHTTPClient:
+    """Async keep-alive HTTP client using httpx, with HTTP/2 when the h2 package is available."""
+
+    def __init__(self, base_url, pool_size=10, timeout=10, http2=True):
+        if httpx is None:
+            raise ImportError("httpx is required for the async HTTP client. Install it with 'pip install httpx[http2]'.")
+        self.base_url = base_url
+        self.timeout = timeout
+        self.stats = ConnectionStats()
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            http2=http2 and HTTP2_AVAILABLE,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    async def _trace(self, event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            self.stats.record_connection()
+
+    async def request(self, method, endpoint, params=None, json=None, headers=None, timeout=None, content=None):
+        try:
+            response = await self.client.request(
+                method,
+                endpoint,
+                params=params,
+                json=json,
+                content=content,
+                headers=headers,
+                timeout=timeout or self.timeout,
+                extensions={"trace": self._trace}
+            )
+        except Exception:
+            self.stats.record_error()
+            raise
+        finally:
+            self.stats.record_request()
+        return response
+
+    def connection_stats(self):
+        return self.stats.as_dict()
+
+    async def close(self):
+        await self.client.aclose()
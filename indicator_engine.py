@@ -0,0 +1,279 @@
+# indicator_engine.py
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Column order of the OHLCV arrays accepted by the engine
+OPEN, HIGH, LOW, CLOSE, VOLUME = range(5)
+
+ALL_INDICATORS = (
+    "ema", "rsi", "macd", "macd_signal", "stoch_k", "stoch_d",
+    "bb_upper", "bb_middle", "bb_lower", "atr",
+)
+
+
+# Running sums of rolling means restart after this many bars (or one window, if longer)
+SMA_REBASE_BARS = 1024
+
+
+def ema_weights(span):
+    """(alpha, old_wt, norm) of the ``adjust=False`` recurrence, computed as pandas does."""
+    alpha = 1.0 / (1.0 + (span - 1) / 2.0)
+    old_wt = 1.0 - alpha
+    return alpha, old_wt, old_wt + alpha
+
+
+def ema_step(previous, value, alpha, old_wt, norm):
+    """One bar of the EMA, as ``StreamingEMA`` applies it; ``ema`` runs the same expressions inline."""
+    if previous is None:
+        return value
+    if previous == value:
+        return previous
+    return (old_wt * previous + alpha * value) / norm
+
+
+def ema(values, span, out=None):
+    """Exponential moving average along the last axis, with the recurrence of ``Series.ewm(span, adjust=False)``.
+
+    Each series is stepped through bar by bar on plain floats with the
+    arithmetic of ``ema_step``. The recurrence is kept exact rather than
+    vectorised, so the streaming state reproduces it bit for bit.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if out is None:
+        out = np.empty_like(values)
+    if values.shape[-1] == 0:
+        return out
+
+    alpha, old_wt, norm = ema_weights(span)
+    for index in np.ndindex(values.shape[:-1]):
+        row = values[index].tolist()
+        previous = row[0]
+        # ema_step inlined; a call per bar would double the cost
+        for i, value in enumerate(row):
+            if previous != value:
+                previous = (old_wt * previous + alpha * value) / norm
+            row[i] = previous
+        out[index] = row
+    return out
+
+
+def sma_rebase_bars(window):
+    return max(SMA_REBASE_BARS, window)
+
+
+def rolling_mean(values, window, out=None):
+    """Rolling mean as a running sum: each window total is the difference of two prefix sums.
+
+    The prefix sums restart every ``sma_rebase_bars(window)`` bars, from the
+    first bar of that bar's window, so their rounding error stays bounded.
+    Non-finite values are summed as zero and make the windows holding them
+    NaN. ``StreamingSMA`` does the same arithmetic one bar at a time.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if out is None:
+        out = np.empty_like(values)
+    n = values.shape[-1]
+    out[..., :window - 1] = np.nan
+    if n < window:
+        return out
+
+    finite = np.isfinite(values)
+    clean = np.where(finite, values, 0.0)
+    bad = np.zeros(values.shape[:-1] + (n + 1,), dtype=np.int64)
+    np.cumsum(~finite, axis=-1, out=bad[..., 1:])
+    block = sma_rebase_bars(window)
+    for rebase in range(0, n, block):
+        first = max(0, rebase - window + 1)
+        stop = min(n, rebase + block)
+        prefix = np.zeros(values.shape[:-1] + (stop - first + 1,))
+        np.cumsum(clean[..., first:stop], axis=-1, out=prefix[..., 1:])
+        # Windows ending at bars start..stop-1
+        start = max(rebase, window - 1)
+        target = out[..., start:stop]
+        np.subtract(prefix[..., start - first + 1:], prefix[..., start - first + 1 - window:stop - first + 1 - window],
+                    out=target)
+        target /= window
+    out[..., window - 1:][bad[..., window:] - bad[..., :n - window + 1] > 0] = np.nan
+    return out
+
+
+def rolling_std(values, window, out=None):
+    """Sample (ddof=1) rolling standard deviation, computed in two passes for accuracy."""
+    values = np.asarray(values, dtype=np.float64)
+    if out is None:
+        out = np.empty_like(values)
+    out[..., :window - 1] = np.nan
+    if values.shape[-1] >= window:
+        windows = sliding_window_view(values, window, axis=-1)
+        mean = windows.mean(axis=-1, keepdims=True)
+        np.sum((windows - mean) ** 2, axis=-1, out=out[..., window - 1:])
+        out[..., window - 1:] /= window - 1
+        np.sqrt(out[..., window - 1:], out=out[..., window - 1:])
+    return out
+
+
+def rolling_max(values, window, out=None):
+    values = np.asarray(values, dtype=np.float64)
+    if out is None:
+        out = np.empty_like(values)
+    out[..., :window - 1] = np.nan
+    if values.shape[-1] >= window:
+        np.max(sliding_window_view(values, window, axis=-1), axis=-1, out=out[..., window - 1:])
+    return out
+
+
+def rolling_min(values, window, out=None):
+    values = np.asarray(values, dtype=np.float64)
+    if out is None:
+        out = np.empty_like(values)
+    out[..., :window - 1] = np.nan
+    if values.shape[-1] >= window:
+        np.min(sliding_window_view(values, window, axis=-1), axis=-1, out=out[..., window - 1:])
+    return out
+
+
+def true_range(high, low, close, out=None):
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    if out is None:
+        out = np.empty_like(high)
+    np.subtract(high, low, out=out)
+    if high.shape[-1] > 1:
+        previous_close = close[..., :-1]
+        tail = out[..., 1:]
+        np.maximum(tail, np.abs(high[..., 1:] - previous_close), out=tail)
+        np.maximum(tail, np.abs(low[..., 1:] - previous_close), out=tail)
+    return out
+
+
+def atr(high, low, close, period=14, out=None):
+    """Average true range as a simple rolling mean of the true range (as in RiskManagement)."""
+    return rolling_mean(true_range(high, low, close), period, out=out)
+
+
+def rsi(close, period=14, out=None):
+    """RSI with simple rolling means of gains and losses, matching ``Indicators.calculate_rsi``."""
+    close = np.asarray(close, dtype=np.float64)
+    delta = np.zeros_like(close)
+    np.subtract(close[..., 1:], close[..., :-1], out=delta[..., 1:])
+    gain = rolling_mean(np.where(delta > 0, delta, 0.0), period)
+    loss = rolling_mean(np.where(delta < 0, -delta, 0.0), period)
+    if out is None:
+        out = np.empty_like(close)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(gain, loss, out=out)
+        out += 1
+        np.divide(100.0, out, out=out)
+        np.subtract(100.0, out, out=out)
+    return out
+
+
+def stochastic(high, low, close, period=14, smooth=3, out_k=None, out_d=None):
+    high_n = rolling_max(high, period)
+    low_n = rolling_min(low, period)
+    close = np.asarray(close, dtype=np.float64)
+    if out_k is None:
+        out_k = np.empty_like(close)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.subtract(close, low_n, out=out_k)
+        out_k /= high_n - low_n
+        out_k *= 100
+    out_d = rolling_mean(out_k, smooth, out=out_d)
+    return out_k, out_d
+
+
+class IndicatorEngine:
+    """Computes many indicators over an OHLCV block in one call.
+
+    ``ohlcv`` is a ``(bars, 5)`` array or a ``(symbols, bars, 5)`` block with the
+    columns open, high, low, close, volume. Results are arrays of shape
+    ``(bars,)`` or ``(symbols, bars)``; output buffers are kept between calls of
+    the same shape so a steady scan loop does not allocate them again (copy a
+    result if it must outlive the next call). The input is never modified.
+    """
+
+    def __init__(self, ema_span=20, rsi_period=14, macd_fast=12, macd_slow=26, macd_signal=9,
+                 stoch_period=14, stoch_smooth=3, bb_window=20, bb_std=2.0, atr_period=14):
+        self.ema_span = ema_span
+        self.rsi_period = rsi_period
+        self.macd_fast = macd_fast
+        self.macd_slow = macd_slow
+        self.macd_signal = macd_signal
+        self.stoch_period = stoch_period
+        self.stoch_smooth = stoch_smooth
+        self.bb_window = bb_window
+        self.bb_std = bb_std
+        self.atr_period = atr_period
+        self._buffers = {}
+
+    def _buffer(self, name, shape):
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.shape != shape:
+            buffer = np.empty(shape, dtype=np.float64)
+            self._buffers[name] = buffer
+        return buffer
+
+    def compute(self, ohlcv, indicators=ALL_INDICATORS):
+        ohlcv = np.asarray(ohlcv, dtype=np.float64)
+        if ohlcv.ndim not in (2, 3) or ohlcv.shape[-1] < 4:
+            raise ValueError("ohlcv must have shape (bars, 5) or (symbols, bars, 5)")
+        indicators = set(indicators)
+        unknown = indicators - set(ALL_INDICATORS)
+        if unknown:
+            raise ValueError(f"Unknown indicators: {', '.join(sorted(unknown))}")
+
+        # Bars along the last axis so every helper works on (bars,) and (symbols, bars) alike
+        columns = np.moveaxis(ohlcv, -1, 0)
+        high = np.ascontiguousarray(columns[HIGH])
+        low = np.ascontiguousarray(columns[LOW])
+        close = np.ascontiguousarray(columns[CLOSE])
+        shape = close.shape
+        results = {}
+
+        if "ema" in indicators:
+            results["ema"] = ema(close, self.ema_span, out=self._buffer("ema", shape))
+
+        if "rsi" in indicators:
+            results["rsi"] = rsi(close, self.rsi_period, out=self._buffer("rsi", shape))
+
+        if indicators & {"macd", "macd_signal"}:
+            macd = ema(close, self.macd_fast, out=self._buffer("macd", shape))
+            macd -= ema(close, self.macd_slow, out=self._buffer("macd_slow", shape))
+            results["macd"] = macd
+            if "macd_signal" in indicators:
+                results["macd_signal"] = ema(macd, self.macd_signal, out=self._buffer("macd_signal", shape))
+
+        if indicators & {"stoch_k", "stoch_d"}:
+            k, d = stochastic(
+                high, low, close, self.stoch_period, self.stoch_smooth,
+                out_k=self._buffer("stoch_k", shape), out_d=self._buffer("stoch_d", shape)
+            )
+            results["stoch_k"] = k
+            if "stoch_d" in indicators:
+                results["stoch_d"] = d
+
+        if indicators & {"bb_upper", "bb_middle", "bb_lower"}:
+            middle = rolling_mean(close, self.bb_window, out=self._buffer("bb_middle", shape))
+            band = rolling_std(close, self.bb_window, out=self._buffer("bb_std", shape))
+            band *= self.bb_std
+            results["bb_middle"] = middle
+            results["bb_upper"] = np.add(middle, band, out=self._buffer("bb_upper", shape))
+            results["bb_lower"] = np.subtract(middle, band, out=self._buffer("bb_lower", shape))
+
+        if "atr" in indicators:
+            results["atr"] = atr(high, low, close, self.atr_period, out=self._buffer("atr", shape))
+
+        return {name: value for name, value in results.items() if name in indicators}
+
+
+def dataframe_to_ohlcv(df):
+    """Stack a kline DataFrame's columns into a float64 (bars, 5) array without touching the frame."""
+    return np.column_stack([
+        df['open'].to_numpy(dtype=np.float64),
+        df['high'].to_numpy(dtype=np.float64),
+        df['low'].to_numpy(dtype=np.float64),
+        df['close'].to_numpy(dtype=np.float64),
+        df['volume'].to_numpy(dtype=np.float64),
+    ])
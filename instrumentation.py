@@ -0,0 +1,230 @@
+# instrumentation.py
+
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds, from 0.5 ms to 60 s
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+METRIC_NAME = "trading_stage_latency_seconds"
+
+
+class Histogram:
+    """Latency histogram with cumulative Prometheus buckets and a window of recent samples for percentiles."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, window=2048):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+        self.recent.append(seconds)
+
+    def percentile(self, q):
+        if not self.recent:
+            return None
+        samples = sorted(self.recent)
+        return samples[min(len(samples) - 1, int(q / 100 * len(samples)))]
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": max(self.recent) if self.recent else None,
+        }
+
+
+class _NullTimer:
+    """Returned by ``Metrics.timer`` while disabled, so timing costs one attribute check."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    def __init__(self, metrics, stage, labels):
+        self.metrics = metrics
+        self.stage = stage
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.stage, time.perf_counter() - self.started, error=exc_type is not None, **self.labels)
+        return False
+
+
+class Metrics:
+    """Per-stage latency histograms for the trading loop.
+
+    Usage::
+
+        with metrics.timer("rest", endpoint="/v5/market/kline"):
+            ...
+
+    Every (stage, labels) combination gets its own histogram. Observations can
+    also be written as JSON lines to ``log_path``.
+    """
+
+    def __init__(self, enabled=False, buckets=DEFAULT_BUCKETS, log_path=None):
+        self.enabled = enabled
+        self.buckets = buckets
+        self.histograms = {}
+        self._lock = threading.Lock()
+        self.logger = None
+        if log_path:
+            self.set_log_path(log_path)
+
+    def set_log_path(self, log_path):
+        logger = logging.getLogger("trading_metrics")
+        logger.setLevel(logging.INFO)
+        # Kept out of the bot's trading_bot.log
+        logger.propagate = False
+        handler = logging.FileHandler(log_path)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        self.logger = logger
+
+    def timer(self, stage, **labels):
+        if not self.enabled:
+            return NULL_TIMER
+        return _Timer(self, stage, labels)
+
+    def observe(self, stage, seconds, error=False, **labels):
+        if not self.enabled:
+            return
+        key = (stage, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = Histogram(self.buckets)
+                self.histograms[key] = histogram
+            histogram.observe(seconds)
+        if self.logger is not None:
+            record = {"ts": time.time(), "stage": stage, "seconds": round(seconds, 6)}
+            record.update(labels)
+            if error:
+                record["error"] = True
+            self.logger.info(json.dumps(record))
+
+    def summary(self):
+        """{"stage{label=value}": {count, mean, p50, p90, p99, max}} for every histogram."""
+        with self._lock:
+            return {self._series_name(stage, labels): histogram.summary()
+                    for (stage, labels), histogram in self.histograms.items()}
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+
+    @staticmethod
+    def _series_name(stage, labels):
+        if not labels:
+            return stage
+        return stage + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+    def render_prometheus(self):
+        """Histograms in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {METRIC_NAME} Latency of trading loop stages.",
+            f"# TYPE {METRIC_NAME} histogram",
+        ]
+        with self._lock:
+            items = [(stage, labels, list(h.counts), h.sum, h.count) for (stage, labels), h in self.histograms.items()]
+        for stage, labels, counts, total, count in items:
+            label_text = ",".join([f'stage="{stage}"'] + [f'{k}="{v}"' for k, v in labels])
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{METRIC_NAME}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{METRIC_NAME}_bucket{{{label_text},le="+Inf"}} {count}')
+            lines.append(f"{METRIC_NAME}_sum{{{label_text}}} {total}")
+            lines.append(f"{METRIC_NAME}_count{{{label_text}}} {count}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves ``/metrics`` (Prometheus text) and ``/summary`` (JSON percentiles) on a background thread."""
+
+    def __init__(self, metrics, port=9100, host="127.0.0.1"):
+        self.metrics = metrics
+        self.port = port
+        self.host = host
+        self._server = None
+
+    def start(self):
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = metrics.render_prometheus().encode()
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path == "/summary":
+                    body = json.dumps(metrics.summary(), indent=2).encode()
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"Metrics available at http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+# Shared by all modules; disabled (and nearly free) until configured
+metrics = Metrics()
+
+
+def configure_from_env():
+    """Enable metrics from METRICS_ENABLED / METRICS_LOG / METRICS_PORT; returns the server if one was started."""
+    if os.getenv("METRICS_ENABLED", "False").lower() != "true":
+        return None
+    metrics.enabled = True
+    log_path = os.getenv("METRICS_LOG")
+    if log_path and metrics.logger is None:
+        metrics.set_log_path(log_path)
+    port = os.getenv("METRICS_PORT")
+    if not port:
+        return None
+    server = MetricsServer(metrics, port=int(port))
+    server.start()
+    return server
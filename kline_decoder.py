@@ -0,0 +1,65 @@
+# kline_decoder.py
+
+import json
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Bybit kline row layout: start time, open, high, low, close, volume, turnover
+KLINE_FIELDS = 7
+
+
+def loads(raw):
+    """Parse a JSON response body (bytes or str), with orjson when it is installed."""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def dumps(obj):
+    """Compact JSON text for a request body, with orjson when it is installed."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, separators=(",", ":"))
+
+
+def decode_klines(rows):
+    """Convert Bybit kline rows (newest first, string fields) to ascending typed arrays.
+
+    Returns ``(timestamps, values)``: int64 open times in ms and a float64
+    ``(bars, 6)`` array of open, high, low, close, volume, turnover. All fields
+    are converted in one pass and the newest-first order is reversed by
+    slicing, without a sort.
+    """
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty((0, KLINE_FIELDS - 1), dtype=np.float64)
+
+    # NumPy parses the strings in C; no intermediate object array or DataFrame
+    table = np.array(rows, dtype=np.float64)
+    if table.ndim != 2 or table.shape[1] != KLINE_FIELDS:
+        raise ValueError(f"Kline rows must have {KLINE_FIELDS} fields")
+    table = table[::-1]
+    # Millisecond timestamps are far below 2**53, so the float round-trip is exact
+    timestamps = table[:, 0].astype(np.int64)
+    values = np.ascontiguousarray(table[:, 1:])
+    return timestamps, values
+
+
+def decode_kline_response(raw):
+    """Decode a raw ``/v5/market/kline`` response body straight into typed arrays."""
+    response = loads(raw)
+    if response.get('retCode') != 0:
+        raise ValueError(f"API Error: {response.get('retMsg')}")
+    return decode_klines(response['result']['list'])
+
+
+def klines_to_dataframe(timestamps, values):
+    """DataFrame with a typed column per kline field, in ascending time order."""
+    df = pd.DataFrame(values, columns=["open", "high", "low", "close", "volume", "turnover"])
+    df.insert(0, "timestamp", timestamps)
+    return df
@@ -0,0 +1,198 @@
+# levels.py
+
+from collections import deque
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from candle_store import interval_to_ms
+
+NAN = float('nan')
+
+
+class RollingExtreme:
+    """Rolling min or max over the last `window` bars in O(1) amortized per bar.
+
+    Closed bars live in a monotonic deque; the still-forming bar is kept apart so
+    it can be revised with ``replace_last=True`` without losing deque entries.
+    The value matches ``Series.rolling(window).min()/max().iloc[-1]`` (NaN until
+    `window` bars have been seen).
+    """
+
+    def __init__(self, window, mode='min'):
+        if mode not in ('min', 'max'):
+            raise ValueError("mode must be 'min' or 'max'")
+        self.window = window
+        self.mode = mode
+        self.closed = deque()  # (index, value), monotonic
+        self.forming = None
+        self.count = 0  # bars seen including the forming one
+
+    def _dominates(self, a, b):
+        return a <= b if self.mode == 'min' else a >= b
+
+    def _commit_forming(self):
+        index = self.count - 1
+        value = self.forming
+        while self.closed and self._dominates(value, self.closed[-1][1]):
+            self.closed.pop()
+        self.closed.append((index, value))
+        # Only the last window-1 closed bars can still be combined with a new forming bar
+        while self.closed[0][0] <= index - self.window + 1:
+            self.closed.popleft()
+
+    def update(self, value, replace_last=False):
+        if replace_last and self.forming is not None:
+            self.forming = value
+        else:
+            if self.forming is not None:
+                self._commit_forming()
+            self.forming = value
+            self.count += 1
+        return self.value()
+
+    def value(self):
+        if self.count < self.window or self.forming is None:
+            return NAN
+        result = self.forming
+        if self.closed:
+            candidate = self.closed[0][1]
+            if self._dominates(candidate, result):
+                result = candidate
+        return result
+
+
+class TimeframeLevels:
+    """Support/resistance for one timeframe, resampled on the fly from base-interval bars."""
+
+    def __init__(self, timeframe, windows):
+        self.timeframe = str(timeframe)
+        self.timeframe_ms = interval_to_ms(timeframe)
+        self.windows = list(windows)
+        self.supports = {window: RollingExtreme(window, 'min') for window in self.windows}
+        self.resistances = {window: RollingExtreme(window, 'max') for window in self.windows}
+        self.bucket_start = None
+        # Base bars of the current bucket, so a revised base bar can be re-aggregated
+        self.bucket_highs = []
+        self.bucket_lows = []
+
+    def update(self, timestamp, high, low, replace_last=False):
+        bucket_start = timestamp - timestamp % self.timeframe_ms
+        new_bucket = bucket_start != self.bucket_start
+        if new_bucket:
+            self.bucket_start = bucket_start
+            self.bucket_highs = [high]
+            self.bucket_lows = [low]
+        elif replace_last and self.bucket_highs:
+            self.bucket_highs[-1] = high
+            self.bucket_lows[-1] = low
+        else:
+            self.bucket_highs.append(high)
+            self.bucket_lows.append(low)
+
+        bucket_high = max(self.bucket_highs)
+        bucket_low = min(self.bucket_lows)
+        for window in self.windows:
+            self.supports[window].update(bucket_low, replace_last=not new_bucket)
+            self.resistances[window].update(bucket_high, replace_last=not new_bucket)
+
+    def levels(self):
+        return {window: (self.supports[window].value(), self.resistances[window].value()) for window in self.windows}
+
+
+class LevelDetector:
+    """Support/resistance levels for several windows and timeframes from one base-interval stream.
+
+    Feed base-interval candles (e.g. 1m) with ``update``; higher timeframes such as
+    5m and 15m are resampled incrementally from the same bars.
+    """
+
+    def __init__(self, base_interval='1', timeframes=('1',), windows=(12,)):
+        self.base_interval = str(base_interval)
+        self.windows = tuple(windows)
+        base_ms = interval_to_ms(base_interval)
+        for timeframe in timeframes:
+            if interval_to_ms(timeframe) % base_ms:
+                raise ValueError(f"Timeframe {timeframe} is not a multiple of the base interval {base_interval}")
+        self.timeframe_names = [str(tf) for tf in timeframes]
+        self.reset()
+
+    def reset(self):
+        self.timeframes = {tf: TimeframeLevels(tf, self.windows) for tf in self.timeframe_names}
+        self.last_timestamp = None
+
+    def update(self, timestamp, high, low, replace_last=None):
+        """Add a base bar; a bar with the same open time as the last one revises it."""
+        timestamp = int(timestamp)
+        if replace_last is None:
+            replace_last = timestamp == self.last_timestamp
+        self.last_timestamp = timestamp
+        for levels in self.timeframes.values():
+            levels.update(timestamp, float(high), float(low), replace_last)
+
+    def seed(self, timestamps, highs, lows):
+        """Reset and replay history (ascending time order)."""
+        self.reset()
+        for timestamp, high, low in zip(timestamps, highs, lows):
+            self.update(timestamp, high, low)
+
+    def levels(self):
+        """{(timeframe, window): (support, resistance)} for every configured combination."""
+        result = {}
+        for timeframe, levels in self.timeframes.items():
+            for window, pair in levels.levels().items():
+                result[(timeframe, window)] = pair
+        return result
+
+    def get_levels(self, timeframe, window):
+        return self.timeframes[str(timeframe)].levels()[window]
+
+
+def pivot_levels(high, low, left=3, right=3):
+    """Swing highs and lows: bars whose high/low is the extreme of `left` bars before and `right` after.
+
+    Returns (pivot_high_prices, pivot_low_prices) in time order.
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    span = left + right + 1
+    if len(high) < span:
+        return np.empty(0), np.empty(0)
+    centre_high = high[left:len(high) - right]
+    centre_low = low[left:len(low) - right]
+    is_pivot_high = centre_high == sliding_window_view(high, span).max(axis=1)
+    is_pivot_low = centre_low == sliding_window_view(low, span).min(axis=1)
+    return centre_high[is_pivot_high], centre_low[is_pivot_low]
+
+
+def cluster_levels(prices, tolerance_pct=0.1, min_touches=1):
+    """Group nearby prices into levels.
+
+    Prices within `tolerance_pct` percent of the running cluster mean are merged.
+    Returns a list of (level_price, touches) sorted by touches, strongest first.
+    """
+    prices = np.sort(np.asarray(prices, dtype=np.float64))
+    clusters = []
+    total = 0.0
+    members = 0
+    for price in prices:
+        if members and abs(price - total / members) <= (total / members) * tolerance_pct / 100:
+            total += price
+            members += 1
+            continue
+        if members:
+            clusters.append((total / members, members))
+        total = price
+        members = 1
+    if members:
+        clusters.append((total / members, members))
+    clusters = [cluster for cluster in clusters if cluster[1] >= min_touches]
+    clusters.sort(key=lambda cluster: cluster[1], reverse=True)
+    return clusters
+
+
+def nearest_levels(price, levels):
+    """Closest level below (support) and above (resistance) `price`; None where there is none."""
+    below = [level for level in levels if level <= price]
+    above = [level for level in levels if level >= price]
+    support = max(below) if below else None
+    resistance = min(above) if above else None
+    return support, resistance
@@ -0,0 +1,245 @@
+# market_bus.py
+
+import threading
+import time
+from multiprocessing import shared_memory
+import numpy as np
+from candle_scheduler import next_candle_close
+from candle_store import CandleStore, KLINE_COLUMNS, interval_to_ms
+
+VALUE_COLUMNS = len(KLINE_COLUMNS) - 1
+# Per-symbol header: seqlock counter, candles written, open time of the newest candle, time of the last write (ms)
+SEQ, COUNT, LAST, UPDATED = range(4)
+HEADER_FIELDS = 4
+
+
+class MarketBus:
+    """Candles and last prices of a fixed symbol list in one shared-memory block.
+
+    One process (the ingestion process) writes; any number of processes map
+    the same block and read it as NumPy arrays without copying it through a
+    pipe. Each symbol has a ring of `bars` candles that is stored twice in a
+    row, so the newest n candles are always one contiguous slice. Writers
+    bump the symbol's sequence number to odd before a write and back to even
+    after it (a seqlock); readers retry a copy that overlapped a write.
+    """
+
+    def __init__(self, shm, symbols, bars, interval, owner):
+        self.shm = shm
+        self.symbols = list(symbols)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.bars = bars
+        self.interval = str(interval)
+        self.owner = owner
+        # The seqlock assumes one writer per symbol; threads of the writing process take turns
+        self._write_lock = threading.Lock()
+
+        n = len(self.symbols)
+        offset = 0
+        self.header = np.ndarray((n, HEADER_FIELDS), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += self.header.nbytes
+        self.prices = np.ndarray((n, 2), dtype=np.float64, buffer=shm.buf, offset=offset)  # last price, update time
+        offset += self.prices.nbytes
+        self.timestamps = np.ndarray((n, 2 * bars), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += self.timestamps.nbytes
+        self.values = np.ndarray((n, 2 * bars, VALUE_COLUMNS), dtype=np.float64, buffer=shm.buf, offset=offset)
+
+    @staticmethod
+    def size(symbols, bars):
+        n = len(symbols)
+        return 8 * n * (HEADER_FIELDS + 2 + 2 * bars * (1 + VALUE_COLUMNS))
+
+    @classmethod
+    def create(cls, symbols, bars, interval, name=None):
+        shm = shared_memory.SharedMemory(name=name, create=True, size=cls.size(symbols, bars))
+        bus = cls(shm, symbols, bars, interval, owner=True)
+        bus.header[:] = 0
+        bus.prices[:] = np.nan
+        return bus
+
+    @classmethod
+    def attach(cls, name, symbols, bars, interval):
+        # Processes started by the supervisor share its resource tracker, so attaching does not
+        # hand the block to anyone else; only the creator unlinks it
+        shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, symbols, bars, interval, owner=False)
+
+    def recover(self):
+        """Even out sequence numbers left odd by a writer that died mid-write; call before writing again."""
+        self.header[:, SEQ] += self.header[:, SEQ] % 2
+
+    def spec(self):
+        """Arguments for ``MarketBus.attach`` in another process."""
+        return {"name": self.shm.name, "symbols": self.symbols, "bars": self.bars, "interval": self.interval}
+
+    def close(self):
+        # Views into the block must go before it can be closed
+        del self.header, self.prices, self.timestamps, self.values
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    # --- writer --------------------------------------------------------------------
+
+    def publish(self, symbol, timestamps, values, replace=False, updated=None):
+        """Merge ascending candles into the ring (same rules as CandleBuffer.merge); `replace` starts over.
+
+        `updated` is the (server) time of the data in seconds, current time by default.
+        """
+        i = self.index.get(symbol)
+        if i is None or len(timestamps) == 0:
+            return 0
+        if len(timestamps) > self.bars:
+            timestamps, values = timestamps[-self.bars:], values[-self.bars:]
+        updated = time.time() if updated is None else updated
+        with self._write_lock:
+            return self._publish(i, timestamps, values, replace, int(updated * 1000))
+
+    def _publish(self, i, timestamps, values, replace, updated):
+        header = self.header[i]
+        header[SEQ] += 1
+        try:
+            if replace:
+                header[COUNT] = 0
+            count, last = int(header[COUNT]), int(header[LAST])
+            written = 0
+            for timestamp, row in zip(timestamps, values):
+                if count and timestamp < last:
+                    continue
+                if count and timestamp == last:
+                    slot = (count - 1) % self.bars  # the forming candle is updated in place
+                else:
+                    slot = count % self.bars
+                    count += 1
+                    last = int(timestamp)
+                for position in (slot, slot + self.bars):
+                    self.timestamps[i, position] = timestamp
+                    self.values[i, position] = row
+                written += 1
+            header[COUNT], header[LAST], header[UPDATED] = count, last, updated
+        finally:
+            header[SEQ] += 1
+        return written
+
+    def publish_price(self, symbol, price):
+        i = self.index.get(symbol)
+        if i is None:
+            return
+        header = self.header[i]
+        with self._write_lock:
+            header[SEQ] += 1
+            self.prices[i] = (price, time.time())
+            header[SEQ] += 1
+
+    # --- readers -------------------------------------------------------------------
+
+    def tail(self, symbol, n):
+        """Copy of the newest `n` candles as (timestamps, values), ascending."""
+        i = self.index[symbol]
+        header = self.header[i]
+        while True:
+            seq = int(header[SEQ])
+            if seq % 2:
+                time.sleep(0)
+                continue
+            count = int(header[COUNT])
+            n = min(n, count, self.bars)
+            end = (count - 1) % self.bars + self.bars + 1 if count else 0
+            timestamps = self.timestamps[i, end - n:end].copy()
+            values = self.values[i, end - n:end].copy()
+            if int(header[SEQ]) == seq:
+                return timestamps, values
+
+    def last_timestamp(self, symbol):
+        header = self.header[self.index[symbol]]
+        return int(header[LAST]) if header[COUNT] else None
+
+    def last_write(self, symbol):
+        """(open time of the newest candle or None, time of the last write in ms), read consistently."""
+        header = self.header[self.index[symbol]]
+        while True:
+            seq = int(header[SEQ])
+            count, last, updated = int(header[COUNT]), int(header[LAST]), int(header[UPDATED])
+            if seq % 2 == 0 and int(header[SEQ]) == seq:
+                return (last if count else None), updated
+
+    def get_price(self, symbol, max_age=None):
+        """Last published price, or None if there is none or it is older than `max_age` seconds."""
+        i = self.index.get(symbol)
+        if i is None:
+            return None
+        header = self.header[i]
+        while True:
+            seq = int(header[SEQ])
+            price, updated = self.prices[i]
+            if seq % 2 == 0 and int(header[SEQ]) == seq:
+                break
+        if np.isnan(price) or (max_age is not None and time.time() - updated > max_age):
+            return None
+        return float(price)
+
+
+class PublishingCandleStore(CandleStore):
+    """CandleStore of the ingestion process: every candle it fetches or merges is also published on the bus."""
+
+    def __init__(self, bus, data_fetcher, max_bars, clock=time.time):
+        super().__init__(data_fetcher, max_bars=max_bars, clock=clock)
+        self.bus = bus
+
+    def _save(self, symbol, interval, timestamps, values):
+        super()._save(symbol, interval, timestamps, values)
+        if str(interval) == self.bus.interval:
+            self.bus.publish(symbol, timestamps, values, updated=self.clock())
+
+    def seed(self, symbol):
+        """Fill the buffer from REST and publish all of it, older pages included."""
+        if not self.update(symbol, self.bus.interval, self.bus.bars):
+            return False
+        buffer = self.get_buffer(symbol, self.bus.interval)
+        with buffer.lock:
+            timestamps, values = buffer.tail(self.bus.bars)
+            self.bus.publish(symbol, timestamps, values, replace=True, updated=self.clock())
+        return True
+
+
+class BusCandleStore(CandleStore):
+    """CandleStore of a worker process: ``update`` reads the bus instead of the exchange.
+
+    The bus must hold the candle that closed last, written after that close,
+    so a worker never trades on the previous bar or on the closed candle's
+    last update while it was still forming. ``update`` waits up to `wait`
+    seconds for the ingestion process to get there and otherwise fails.
+    """
+
+    def __init__(self, bus, max_bars, clock=time.time, wait=2.0):
+        super().__init__(None, max_bars=max_bars, clock=clock)
+        self.bus = bus
+        self.wait = wait
+
+    def _update(self, symbol, interval, bars):
+        if str(interval) != self.bus.interval or symbol not in self.bus.index:
+            print(f"{symbol} ({interval}) is not published on the market bus.")
+            return False
+        if not self._wait_for_close(symbol, interval):
+            print(f"The market bus has not been updated for {symbol} since the last close.")
+            return False
+        timestamps, values = self.bus.tail(symbol, min(bars, self.max_bars))
+        if len(timestamps) < min(bars, self.max_bars):
+            print(f"The market bus has only {len(timestamps)} candles for {symbol}.")
+            return False
+        buffer = self.get_buffer(symbol, interval)
+        with buffer.lock:
+            buffer.merge(timestamps, values)
+        return True
+
+    def _wait_for_close(self, symbol, interval):
+        deadline = time.monotonic() + self.wait
+        interval_ms = interval_to_ms(interval)
+        while True:
+            closed = int(round(next_candle_close(self.clock(), interval) * 1000)) - interval_ms
+            last, updated = self.bus.last_write(symbol)
+            if last is not None and last >= closed - interval_ms and updated >= closed:
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
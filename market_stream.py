@@ -0,0 +1,318 @@
+# market_stream.py
+
+import threading
+import time
+from candle_store import interval_to_ms
+from kline_decoder import loads
+from order_book import OrderBook
+from ws_client import ReconnectingWebSocket
+
+PUBLIC_LINEAR_WS_URL = "wss://stream.bybit.com/v5/public/linear"
+
+
+class MarketDataStream(ReconnectingWebSocket):
+    """Keeps kline, ticker and L2 order book state current from Bybit's public WebSocket.
+
+    Closed candles are merged into the shared CandleStore, so the REST kline
+    call is only needed to back-fill gaps after (re)connecting.
+    """
+
+    name = "Market stream"
+
+    def __init__(self, candle_store, symbols, interval, bars, url=PUBLIC_LINEAR_WS_URL,
+                 ping_interval=20, reconnect_delay=1, max_reconnect_delay=30, order_book_depth=1,
+                 snapshot_source=None, book_check_interval=60):
+        super().__init__(url, ping_interval, reconnect_delay, max_reconnect_delay)
+        self.candle_store = candle_store
+        self.symbols = list(symbols)
+        self.interval = str(interval)
+        self.bars = bars
+
+        self.order_book_depth = order_book_depth
+
+        self.tickers = {}
+        # symbol -> order_book.OrderBook, maintained from snapshot and delta messages
+        self.order_books = {}
+        # Callable(symbol, limit) returning a REST order book ``result``; every `book_check_interval`
+        # seconds each local book is compared with one and resynced if they disagree
+        self.snapshot_source = snapshot_source
+        self.book_check_interval = book_check_interval
+        # symbol -> REST snapshot taken ahead of the local book, compared once the book reaches its seq
+        self.pending_book_checks = {}
+        self._book_check_thread = None
+        self._book_check_stop = threading.Event()
+        self.last_message_time = None
+
+        self.candle_close_callbacks = []
+        self.price_callbacks = []
+        self.level_watches = {}
+        self.indicators = {}
+        self.level_detectors = {}
+        self._lock = threading.Lock()
+
+    def topics(self):
+        topics = []
+        for symbol in self.symbols:
+            topics.append(f"kline.{self.interval}.{symbol}")
+            topics.append(f"tickers.{symbol}")
+            topics.append(f"orderbook.{self.order_book_depth}.{symbol}")
+        return topics
+
+    # --- callbacks -------------------------------------------------------
+
+    def on_candle_close(self, callback):
+        """Register callback(symbol, interval) fired when a candle is confirmed closed."""
+        self.candle_close_callbacks.append(callback)
+
+    def on_price(self, callback):
+        """Register callback(symbol, price) fired on every last-price update."""
+        self.price_callbacks.append(callback)
+
+    def watch_levels(self, symbol, support, resistance, callback):
+        """Fire callback(symbol, level_name, price) once when price crosses support or resistance."""
+        with self._lock:
+            self.level_watches[symbol] = (support, resistance, callback)
+
+    def track_indicators(self, symbol, indicators):
+        """Keep a StreamingIndicators object for `symbol` updated on every kline message."""
+        self.indicators[symbol] = indicators
+        self._seed_indicators(symbol)
+
+    def track_levels(self, symbol, detector):
+        """Keep a levels.LevelDetector for `symbol` updated on every kline message."""
+        self.level_detectors[symbol] = detector
+        self._seed_indicators(symbol)
+
+    def _seed_indicators(self, symbol):
+        indicators = self.indicators.get(symbol)
+        detector = self.level_detectors.get(symbol)
+        if indicators is None and detector is None:
+            return
+        df = self.candle_store.get_dataframe(symbol, self.interval, self.bars)
+        if indicators is not None:
+            indicators.seed(df['high'].to_numpy(), df['low'].to_numpy(), df['close'].to_numpy())
+        if detector is not None:
+            detector.seed(df['timestamp'].to_numpy(), df['high'].to_numpy(), df['low'].to_numpy())
+
+    def clear_levels(self, symbol):
+        with self._lock:
+            self.level_watches.pop(symbol, None)
+
+    # --- state queries -----------------------------------------------------
+
+    def get_last_price(self, symbol, max_age=None):
+        """Latest streamed price, or None if unknown or older than `max_age` seconds."""
+        ticker = self.tickers.get(symbol)
+        if not ticker or 'lastPrice' not in ticker:
+            return None
+        if max_age is not None and time.time() - ticker['_received'] > max_age:
+            return None
+        return float(ticker['lastPrice'])
+
+    # --- connection ----------------------------------------------------------
+
+    def start(self):
+        super().start()
+        if self.snapshot_source is not None and self.book_check_interval:
+            self._book_check_stop.clear()
+            self._book_check_thread = threading.Thread(target=self._check_order_books_forever,
+                                                       name=f"{self.name} book check", daemon=True)
+            self._book_check_thread.start()
+
+    def stop(self):
+        self._book_check_stop.set()
+        super().stop()
+        if self._book_check_thread is not None:
+            self._book_check_thread.join(timeout=5)
+
+    def _on_open(self, ws):
+        print(f"Market stream connected to {self.url}")
+        self.send({"op": "subscribe", "args": self.topics()})
+        self.backfill()
+
+    def backfill(self):
+        """Fill any candles missed while disconnected using the REST kline call."""
+        for symbol in self.symbols:
+            if not self.candle_store.update(symbol, self.interval, self.bars):
+                print(f"Failed to back-fill candles for {symbol}.")
+            self._seed_indicators(symbol)
+
+    # --- message handling ------------------------------------------------------
+
+    def handle_message(self, message):
+        topic = message.get('topic')
+        if not topic:
+            # Subscription acks and pong replies
+            if message.get('success') is False:
+                print(f"Market stream request failed: {message.get('ret_msg')}")
+            return
+
+        self.last_message_time = time.time()
+        if topic.startswith('kline.'):
+            self._handle_kline(topic, message['data'])
+        elif topic.startswith('tickers.'):
+            self._handle_ticker(topic, message['data'])
+        elif topic.startswith('orderbook.'):
+            self._handle_order_book(topic, message)
+
+    def _handle_kline(self, topic, candles):
+        _, interval, symbol = topic.split('.', 2)
+        buffer = self.candle_store.get_buffer(symbol, interval)
+        for candle in candles:
+            start = int(candle['start'])
+            last = buffer.last_timestamp
+            if last is not None and start - last > interval_to_ms(interval):
+                # Missed at least one candle, fetch the gap from REST before merging
+                self.candle_store.update(symbol, interval, self.bars)
+                if interval == self.interval:
+                    self._seed_indicators(symbol)
+                last = buffer.last_timestamp
+
+            values = [
+                float(candle['open']),
+                float(candle['high']),
+                float(candle['low']),
+                float(candle['close']),
+                float(candle['volume']),
+                float(candle['turnover']),
+            ]
+            self.candle_store.merge_candle(symbol, interval, start, values)
+
+            if interval == self.interval and (last is None or start >= last):
+                indicators = self.indicators.get(symbol)
+                if indicators is not None:
+                    indicators.update(values[1], values[2], values[3], replace_last=start == last)
+                detector = self.level_detectors.get(symbol)
+                if detector is not None:
+                    detector.update(start, values[1], values[2])
+
+            if candle.get('confirm'):
+                for callback in self.candle_close_callbacks:
+                    callback(symbol, interval)
+
+    def _handle_ticker(self, topic, data):
+        symbol = data.get('symbol') or topic.split('.', 1)[1]
+        # Linear tickers arrive as one snapshot followed by partial deltas
+        ticker = self.tickers.setdefault(symbol, {})
+        ticker.update(data)
+        ticker['_received'] = time.time()
+
+        if 'lastPrice' in data:
+            price = float(data['lastPrice'])
+            for callback in self.price_callbacks:
+                callback(symbol, price)
+            self._check_levels(symbol, price)
+
+    def _handle_order_book(self, topic, message):
+        symbol = message['data'].get('s') or topic.rsplit('.', 1)[1]
+        book = self.order_books.get(symbol)
+        if book is None:
+            book = self.order_books[symbol] = OrderBook(symbol)
+        if not book.apply(message):
+            self._resubscribe(topic)
+            return
+        pending = self.pending_book_checks.get(symbol)
+        if pending is not None and book.seq is not None and book.seq >= pending['seq']:
+            self.pending_book_checks.pop(symbol, None)
+            self._check_order_book(book, pending)
+
+    def _check_order_books_forever(self):
+        while not self._book_check_stop.wait(self.book_check_interval):
+            self.check_order_books()
+
+    def check_order_books(self):
+        """Compare every valid local book with a fresh REST snapshot, resyncing any that disagree."""
+        for symbol, book in list(self.order_books.items()):
+            if not book.valid:
+                continue
+            snapshot = self.snapshot_source(symbol, self.order_book_depth)
+            if not snapshot or snapshot.get('seq') is None:
+                continue
+            if book.seq is not None and book.seq < snapshot['seq']:
+                # The stream has not caught up with the snapshot yet; compare when it does
+                self.pending_book_checks[symbol] = snapshot
+            else:
+                self._check_order_book(book, snapshot)
+
+    def _check_order_book(self, book, snapshot):
+        # None: the book has moved on from the snapshot's seq, so there is nothing to compare
+        if book.matches(snapshot, self.order_book_depth) is False:
+            print(f"Order book for {book.symbol} disagrees with the REST snapshot at seq {snapshot['seq']}, resyncing.")
+            self.pending_book_checks.pop(book.symbol, None)
+            book.invalidate()
+            self._resubscribe(f"orderbook.{self.order_book_depth}.{book.symbol}")
+
+    def _resubscribe(self, topic):
+        # A fresh subscription starts with a snapshot, which makes the book valid again
+        if self._ws is None:
+            return
+        try:
+            self.send({"op": "unsubscribe", "args": [topic]})
+            self.send({"op": "subscribe", "args": [topic]})
+        except Exception as e:
+            print(f"Failed to resubscribe to {topic}: {e}")
+
+    def get_order_book(self, symbol):
+        """The local order book for `symbol`, or None while it has no valid snapshot."""
+        book = self.order_books.get(symbol)
+        if book is None or not book.valid:
+            return None
+        return book
+
+    def _check_levels(self, symbol, price):
+        with self._lock:
+            watch = self.level_watches.get(symbol)
+            if watch is None:
+                return
+            support, resistance, callback = watch
+            if price <= support:
+                level = 'support'
+            elif price >= resistance:
+                level = 'resistance'
+            else:
+                return
+            # One-shot: the bot re-arms the watch after recomputing levels
+            del self.level_watches[symbol]
+        callback(symbol, level, price)
+
+
+class ReplayMarketStream(MarketDataStream):
+    """Offline stand-in that feeds recorded stream messages through the same handlers.
+
+    Messages are read from a JSON-lines file (or any iterable of dicts), which
+    makes the stream logic reproducible in tests without a network connection.
+    """
+
+    def __init__(self, candle_store, symbols, interval, bars, messages, speed=None):
+        super().__init__(candle_store, symbols, interval, bars, url=None)
+        self.messages = messages
+        self.speed = speed
+
+    def _iter_messages(self):
+        if isinstance(self.messages, str):
+            with open(self.messages) as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        yield loads(line)
+        else:
+            yield from self.messages
+
+    def is_connected(self):
+        return self._running
+
+    def replay(self):
+        """Feed all recorded messages synchronously, honouring `speed` if given."""
+        previous_ts = None
+        for message in self._iter_messages():
+            if not self._running and self._thread is not None:
+                break
+            ts = message.get('ts')
+            if self.speed and previous_ts is not None and ts is not None:
+                time.sleep(max(0, (ts - previous_ts) / 1000 / self.speed))
+            previous_ts = ts
+            self.handle_message(message)
+
+    def _run_forever(self):
+        self.replay()
+        self._running = False
@@ -0,0 +1,350 @@
+# mock_bybit_server.py
+
+import argparse
+import json
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+import numpy as np
+from backtester import SimulatedExchange
+from candle_store import interval_to_ms
+from kline_decoder import loads
+from mock_ws_server import MockWebSocketServer
+from rate_limiter import (PER_SYMBOL_GROUPS, RATE_LIMIT_RET_CODE, RATE_LIMITS, TokenBucket, endpoint_group,
+                          request_symbol)
+
+# orderbook.{depth} topics the mock publishes; Bybit linear offers 1, 50, 200 and 500
+BOOK_DEPTHS = (1, 50)
+
+
+def generate_candles(bars, seed=0, interval="1", end=None, start_price=30000.0):
+    """Reproducible random-walk klines ending with the last closed bar before `end` (ms)."""
+    rng = np.random.default_rng(seed)
+    step = interval_to_ms(interval)
+    end = int(time.time() * 1000) if end is None else int(end)
+    last_open = (end // step) * step - step
+    timestamps = last_open - np.arange(bars - 1, -1, -1, dtype=np.int64) * step
+    close = start_price * np.exp(np.cumsum(rng.normal(0, 0.0008, bars)))
+    open_ = np.concatenate(([close[0]], close[:-1]))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.0006, bars))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.0006, bars))
+    volume = rng.uniform(1, 10, bars)
+    values = np.column_stack([open_, high, low, close, volume, close * volume])
+    return timestamps, values
+
+
+class FaultInjector:
+    """Latency, errors and rate-limit rejections added to mock REST responses.
+
+    `latency` (+ up to `jitter`) seconds are slept before every response.
+    `error_rate` and `rate_limit_rate` are probabilities of answering with a
+    server error or a 10006 rejection. With `enforce_limits` the per-group
+    budgets from rate_limiter.RATE_LIMITS are applied like the exchange does.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit_rate=0.0,
+                 enforce_limits=False, limits=None, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.enforce_limits = enforce_limits
+        self.limits = dict(RATE_LIMITS, **(limits or {}))
+        self.random = random.Random(seed)
+        self.buckets = {}
+        self._lock = threading.Lock()
+
+    def delay(self):
+        if self.latency or self.jitter:
+            with self._lock:
+                extra = self.random.uniform(0, self.jitter) if self.jitter else 0.0
+            time.sleep(self.latency + extra)
+
+    def check(self, endpoint, symbol):
+        """Returns (status, payload, headers) for an injected failure, or (None, None, headers)."""
+        group, _ = endpoint_group(endpoint)
+        key = (group, symbol) if group in PER_SYMBOL_GROUPS else (group, None)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                rate, burst = self.limits.get(group, self.limits["default"])
+                bucket = TokenBucket(rate, burst)
+                self.buckets[key] = bucket
+            bucket.refill(now)
+            roll_error = self.random.random() < self.error_rate
+            roll_limit = self.random.random() < self.rate_limit_rate
+
+            limited = roll_limit or (self.enforce_limits and bucket.tokens < 1)
+            if not limited:
+                bucket.tokens = max(0.0, bucket.tokens - 1)
+            reset_ms = int((time.time() + bucket.wait_time(now)) * 1000)
+            headers = {
+                "X-Bapi-Limit": str(bucket.burst),
+                "X-Bapi-Limit-Status": str(int(bucket.tokens)),
+                "X-Bapi-Limit-Reset-Timestamp": str(reset_ms),
+            }
+
+        if not (self.enforce_limits or limited):
+            # Advertising a budget that is not enforced would only make clients pace themselves
+            headers = {}
+        if roll_error:
+            return 503, {"retCode": 10016, "retMsg": "Service unavailable (injected)", "result": {}}, headers
+        if limited:
+            headers["X-Bapi-Limit-Status"] = "0"
+            return 200, {"retCode": RATE_LIMIT_RET_CODE, "retMsg": "Too many visits!", "result": {}}, headers
+        return None, None, headers
+
+
+class MockBybitServer:
+    """Local stand-in for the Bybit v5 REST API and WebSocket streams.
+
+    Each symbol is backed by a SimulatedExchange from the backtester, so
+    klines, tickers, positions and orders behave as in a replay: resting limit
+    orders fill against the candles, and TP/SL exits trigger from later bars.
+    ``start_replay`` advances every symbol by one candle per `bar_seconds` and
+    publishes kline, tickers and orderbook.1/50 messages plus the private order,
+    execution and position topics. Signatures are not checked.
+
+    Replayed candles keep their data timestamps, so with `bar_seconds` shorter
+    than the interval the exchange clock runs ahead of the wall clock.
+    """
+
+    def __init__(self, symbols=("BTCUSDT",), bars=1000, interval="1", seed=0, host="127.0.0.1", port=0,
+                 ws_port=None, history=None, faults=None):
+        self.interval = str(interval)
+        self.symbols = list(symbols)
+        self.host = host
+        self.port = port
+        self.faults = faults or FaultInjector()
+        self._server = None
+        self._replay_thread = None
+        self._replay_stop = threading.Event()
+
+        # WebSocket streams are only started when a port is given (0 picks a free one)
+        self.ws = MockWebSocketServer(host, ws_port) if ws_port is not None else None
+
+        self.exchanges = {}
+        self.locks = {}
+        # Held-back candles lie in the future, so a real-time replay stays aligned with the wall clock
+        end = int(time.time() * 1000) + (history or 0) * interval_to_ms(interval)
+        for i, symbol in enumerate(self.symbols):
+            timestamps, values = generate_candles(bars + (history or 0), seed=seed + i, interval=interval, end=end)
+            exchange = SimulatedExchange(symbol, interval, timestamps, values)
+            # With `history` the last candles are held back and revealed by the replay
+            exchange.cursor = len(timestamps) - 1 - (history or 0)
+            if self.ws is not None:
+                exchange.listeners.append(self._publish_private)
+            self.exchanges[symbol] = exchange
+            self.locks[symbol] = threading.Lock()
+
+    def reset(self):
+        """Drop all orders and positions; the candles are kept."""
+        for symbol, exchange in self.exchanges.items():
+            with self.locks[symbol]:
+                exchange.orders = {}
+                exchange.closed_orders.clear()
+                exchange.pairs = []
+                exchange.position = None
+                exchange.last_closed_position = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    # --- REST ---------------------------------------------------------------------
+
+    def handle(self, method, endpoint, params):
+        """Returns (status, payload, headers) for one REST request."""
+        symbol = request_symbol(params)
+        self.faults.delay()
+        status, payload, headers = self.faults.check(endpoint, symbol)
+        if status is not None:
+            return status, payload, headers
+
+        if symbol is None and endpoint == "/v5/market/time":
+            # Every symbol replays in step, so any of them tells the exchange time
+            symbol = self.symbols[0]
+        if symbol is None and endpoint == "/v5/market/tickers":
+            return 200, self._all_tickers(), headers
+        if symbol is None and params.get('settleCoin') and endpoint in ("/v5/order/realtime", "/v5/position/list"):
+            return 200, self._all_symbols(method, endpoint), headers
+        exchange = self.exchanges.get(symbol)
+        if exchange is None:
+            return 200, {"retCode": 10001, "retMsg": f"Unknown symbol {symbol}", "result": {}}, headers
+        with self.locks[symbol]:
+            return 200, exchange.send_request(method, endpoint, params), headers
+
+    def _all_tickers(self):
+        # Without a symbol Bybit returns every contract of the category in one response
+        tickers = []
+        for symbol, exchange in self.exchanges.items():
+            with self.locks[symbol]:
+                tickers.extend(exchange.send_request("GET", "/v5/market/tickers", {})["result"]["list"])
+        return {"retCode": 0, "retMsg": "OK", "result": {"category": "linear", "list": tickers}}
+
+    def _all_symbols(self, method, endpoint):
+        # Queried by settleCoin instead of symbol; positions then only include non-empty ones, as on Bybit
+        items = []
+        for symbol, exchange in self.exchanges.items():
+            with self.locks[symbol]:
+                items.extend(exchange.send_request(method, endpoint, {"category": "linear", "symbol": symbol})["result"]["list"])
+        if endpoint == "/v5/position/list":
+            items = [item for item in items if float(item['size']) > 0]
+        return {"retCode": 0, "retMsg": "OK", "result": {"category": "linear", "list": items, "nextPageCursor": ""}}
+
+    # --- replay -------------------------------------------------------------------
+
+    def advance(self):
+        """Move every symbol one candle forward, matching resting orders against it."""
+        advanced = 0
+        for symbol, exchange in self.exchanges.items():
+            with self.locks[symbol]:
+                index = exchange.cursor + 1
+                if index >= len(exchange.timestamps):
+                    continue
+                exchange.match_bar(index)
+                exchange.cursor = index
+                advanced += 1
+            if self.ws is not None:
+                self._publish_market(exchange, index)
+        return advanced
+
+    def start_replay(self, bar_seconds=None):
+        """Advance one candle every `bar_seconds` (default: the real interval length)."""
+        bar_seconds = bar_seconds or interval_to_ms(self.interval) / 1000
+        self._replay_stop.clear()
+
+        def run():
+            while not self._replay_stop.wait(bar_seconds):
+                if self.advance() == 0:
+                    return
+
+        self._replay_thread = threading.Thread(target=run, daemon=True)
+        self._replay_thread.start()
+
+    def _publish_market(self, exchange, index):
+        symbol = exchange.symbol
+        timestamp = int(exchange.timestamps[index])
+        open_, high, low, close, volume, turnover = (repr(float(v)) for v in exchange.values[index])
+        now = int(time.time() * 1000)
+        self.ws.publish(f"kline.{self.interval}.{symbol}", {
+            "topic": f"kline.{self.interval}.{symbol}", "type": "snapshot", "ts": now,
+            "data": [{
+                "start": timestamp, "end": timestamp + exchange.interval_ms - 1, "interval": self.interval,
+                "open": open_, "close": close, "high": high, "low": low,
+                "volume": volume, "turnover": turnover, "confirm": True, "timestamp": now,
+            }],
+        })
+        self.ws.publish(f"tickers.{symbol}", {
+            "topic": f"tickers.{symbol}", "type": "snapshot", "ts": now,
+            "data": {"symbol": symbol, "lastPrice": close},
+        })
+        # Synthetic book around the close for every depth clients may subscribe to
+        for depth in BOOK_DEPTHS:
+            topic = f"orderbook.{depth}.{symbol}"
+            bids, asks = exchange.book_levels(depth)
+            self.ws.publish(topic, {
+                "topic": topic, "type": "snapshot", "ts": now,
+                "data": {"s": symbol, "b": bids, "a": asks, "u": index, "seq": index},
+            })
+
+    def _publish_private(self, topic, data):
+        self.ws.publish(topic, {"topic": topic, "creationTime": int(time.time() * 1000), "data": data}, private=True)
+
+    # --- lifecycle ----------------------------------------------------------------
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                # Headers and body go out in separate writes; without this, delayed ACKs add ~40 ms per request
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def _reply(self, status, payload, headers):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                self._reply(*server.handle("GET", url.path, dict(parse_qsl(url.query))))
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                params = loads(self.rfile.read(length)) if length else {}
+                self._reply(*server.handle("POST", urlsplit(self.path).path, params))
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        if self.ws is not None:
+            self.ws.start()
+        return self
+
+    def stop(self):
+        self._replay_stop.set()
+        if self.ws is not None:
+            self.ws.stop()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local mock of the Bybit v5 REST API and streams.")
+    parser.add_argument("--symbols", default="BTCUSDT", help="Comma-separated symbols, or a number to generate")
+    parser.add_argument("--bars", type=int, default=1000, help="Candles visible at start")
+    parser.add_argument("--replay-bars", type=int, default=0, help="Candles revealed one by one by the replay")
+    parser.add_argument("--bar-seconds", type=float, default=None, help="Replay speed (default: real time)")
+    parser.add_argument("--interval", default="1")
+    parser.add_argument("--port", type=int, default=8088)
+    parser.add_argument("--ws-port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every REST response")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--enforce-limits", action="store_true", help="Apply Bybit's per-endpoint rate limits")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    symbols = ([f"SYM{i}USDT" for i in range(int(args.symbols))] if args.symbols.isdigit()
+               else args.symbols.split(","))
+    faults = FaultInjector(args.latency, args.jitter, args.error_rate, args.rate_limit_rate,
+                           enforce_limits=args.enforce_limits, seed=args.seed)
+    mock = MockBybitServer(symbols, bars=args.bars, interval=args.interval, seed=args.seed, port=args.port,
+                           ws_port=args.ws_port, history=args.replay_bars, faults=faults).start()
+    if args.replay_bars:
+        mock.start_replay(args.bar_seconds)
+    print(f"Mock Bybit API listening on {mock.url}, streams on {mock.ws.url}/v5/public/linear and /v5/private")
+    print(f"Run the bot with BYBIT_BASE_URL={mock.url} MARKET_STREAM_URL={mock.ws.url}/v5/public/linear "
+          f"ORDER_STREAM_URL={mock.ws.url}/v5/private")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        mock.stop()
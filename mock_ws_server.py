@@ -0,0 +1,209 @@
+# mock_ws_server.py
+
+import base64
+import hashlib
+import json
+import socket
+import socketserver
+import struct
+import threading
+from kline_decoder import loads
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OPCODE_TEXT = 0x1
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+PRIVATE_PATH = "/v5/private"
+
+
+def _unmask(payload, mask):
+    length = len(payload)
+    key = (mask * (length // 4 + 1))[:length]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")).to_bytes(length, "big")
+
+
+class WebSocketConnection:
+    """One client connection: RFC 6455 framing over a plain socket, text frames only."""
+
+    def __init__(self, sock, path):
+        self.sock = sock
+        self.path = path
+        self.private = path.startswith(PRIVATE_PATH)
+        self.authenticated = False
+        self.topics = set()
+        self.closed = False
+        self._send_lock = threading.Lock()
+
+    def _read_exact(self, count):
+        data = b""
+        while len(data) < count:
+            chunk = self.sock.recv(count - len(data))
+            if not chunk:
+                raise ConnectionError("Connection closed")
+            data += chunk
+        return data
+
+    def read_frame(self):
+        first, second = self._read_exact(2)
+        opcode = first & 0x0F
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack(">H", self._read_exact(2))[0]
+        elif length == 127:
+            length = struct.unpack(">Q", self._read_exact(8))[0]
+        mask = self._read_exact(4) if second & 0x80 else None
+        payload = self._read_exact(length) if length else b""
+        if mask:
+            payload = _unmask(payload, mask)
+        return opcode, payload
+
+    def send_frame(self, opcode, payload):
+        length = len(payload)
+        if length < 126:
+            header = struct.pack(">BB", 0x80 | opcode, length)
+        elif length < 1 << 16:
+            header = struct.pack(">BBH", 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack(">BBQ", 0x80 | opcode, 127, length)
+        with self._send_lock:
+            if self.closed:
+                return False
+            try:
+                self.sock.sendall(header + payload)
+            except OSError:
+                self.closed = True
+                return False
+        return True
+
+    def send_json(self, message):
+        return self.send_frame(OPCODE_TEXT, json.dumps(message).encode())
+
+
+class MockWebSocketServer:
+    """Bybit-style public and private WebSocket streams for the mock exchange.
+
+    Clients connect to ``/v5/public/linear`` or ``/v5/private``; the usual
+    ``subscribe``, ``auth`` and ``ping`` ops are answered (any signature is
+    accepted). ``publish`` sends a message to every client subscribed to its
+    topic; private topics only reach authenticated private connections.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self.connections = set()
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"ws://{host}:{port}"
+
+    def start(self):
+        mock = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                connection = mock._handshake(self.request)
+                if connection is None:
+                    return
+                with mock._lock:
+                    mock.connections.add(connection)
+                try:
+                    mock._serve(connection)
+                except (ConnectionError, OSError):
+                    pass
+                finally:
+                    connection.closed = True
+                    with mock._lock:
+                        mock.connections.discard(connection)
+
+        self._server = socketserver.ThreadingTCPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            with self._lock:
+                connections = list(self.connections)
+            for connection in connections:
+                connection.send_frame(OPCODE_CLOSE, b"")
+                try:
+                    connection.sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def _handshake(self, sock):
+        request = b""
+        while b"\r\n\r\n" not in request:
+            chunk = sock.recv(4096)
+            if not chunk:
+                return None
+            request += chunk
+        lines = request.split(b"\r\n\r\n", 1)[0].decode("latin-1").split("\r\n")
+        path = lines[0].split(" ")[1]
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        key = headers.get("sec-websocket-key")
+        if not key:
+            sock.sendall(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+            return None
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        sock.sendall(
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode()
+        )
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return WebSocketConnection(sock, path)
+
+    def _serve(self, connection):
+        while not connection.closed:
+            opcode, payload = connection.read_frame()
+            if opcode == OPCODE_CLOSE:
+                connection.send_frame(OPCODE_CLOSE, b"")
+                return
+            if opcode == OPCODE_PING:
+                connection.send_frame(OPCODE_PONG, payload)
+            elif opcode == OPCODE_TEXT:
+                self._handle_op(connection, loads(payload))
+
+    def _handle_op(self, connection, message):
+        op = message.get("op")
+        if op == "ping":
+            connection.send_json({"op": "pong", "success": True, "ret_msg": "pong"})
+        elif op == "auth":
+            connection.authenticated = connection.private
+            connection.send_json({"op": "auth", "success": connection.private, "ret_msg": ""})
+        elif op == "subscribe":
+            if connection.private and not connection.authenticated:
+                connection.send_json({"op": "subscribe", "success": False, "ret_msg": "Request not authorized"})
+                return
+            connection.topics.update(message.get("args", []))
+            connection.send_json({"op": "subscribe", "success": True, "ret_msg": ""})
+        elif op == "unsubscribe":
+            connection.topics.difference_update(message.get("args", []))
+            connection.send_json({"op": "unsubscribe", "success": True, "ret_msg": ""})
+
+    def publish(self, topic, message, private=False):
+        """Send `message` (already including its topic) to every subscriber of `topic`."""
+        with self._lock:
+            targets = [c for c in self.connections
+                       if topic in c.topics and c.private == private and (c.authenticated or not private)]
+        if not targets:
+            return 0
+        payload = json.dumps(message).encode()
+        for connection in targets:
+            connection.send_frame(OPCODE_TEXT, payload)
+        return len(targets)
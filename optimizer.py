@@ -0,0 +1,356 @@
+# optimizer.py
+
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+import indicator_engine
+from backtester import Backtester, load_archive, load_klines_csv, parse_time
+from risk_management import RiskManagement
+from strategy import Strategy
+
+try:
+    from skopt import Optimizer as BayesianOptimizer
+    from skopt.space import Categorical, Integer, Real
+    SKOPT_AVAILABLE = True
+except ImportError:
+    SKOPT_AVAILABLE = False
+
+
+# How each sweepable parameter is applied to a freshly built Backtester
+PARAMETER_SETTERS = {
+    "take_profit_percentage": lambda bt, v: setattr(bt.bot, "take_profit_percentage", float(v)),
+    "stop_loss_percentage": lambda bt, v: setattr(bt.bot, "stop_loss_percentage", float(v)),
+    "use_stop_loss": lambda bt, v: setattr(bt.bot, "use_stop_loss", bool(v)),
+    "risk_mode": lambda bt, v: setattr(bt.bot, "risk_mode", str(v)),
+    "atr_multiplier": lambda bt, v: setattr(bt.bot.risk_management, "atr_multiplier", float(v)),
+    "risk_ratio": lambda bt, v: setattr(bt.bot.risk_management, "risk_ratio", float(v)),
+    "sr_window": lambda bt, v: setattr(bt.bot.strategy, "support_resistance_window", int(v)),
+    "price_offset": lambda bt, v: setattr(bt.exchange, "price_offset", float(v)),
+    "quantity": lambda bt, v: setattr(bt.bot, "quantity", float(v)),
+}
+
+# A list is a set of choices, a (low, high) tuple a range for random and Bayesian search
+DEFAULT_SPACE = {
+    "take_profit_percentage": [0.05, 0.1, 0.15, 0.2, 0.3],
+    "stop_loss_percentage": [0.1, 0.15, 0.2, 0.3, 0.5],
+    "use_stop_loss": [True],
+    "sr_window": [6, 12, 24, 48],
+    "price_offset": [0.0, 0.0001, 0.0003],
+}
+
+
+# --- shared candle arrays ------------------------------------------------------
+
+class SharedCandles:
+    """Candle arrays for several (symbol, interval) datasets placed in shared memory.
+
+    The parent process creates the blocks once; workers attach to them by name
+    and get read-only NumPy views, so nothing is pickled per task.
+    """
+
+    def __init__(self):
+        self.blocks = []
+        self.descriptor = {}
+
+    def add(self, symbol, interval, timestamps, values):
+        entry = {}
+        for name, array in (("timestamps", np.ascontiguousarray(timestamps, dtype=np.int64)),
+                            ("values", np.ascontiguousarray(values, dtype=np.float64))):
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            self.blocks.append(block)
+            entry[name] = (block.name, array.shape, array.dtype.str)
+        self.descriptor[(symbol, str(interval))] = entry
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+
+def _attach(name):
+    try:
+        # Python 3.13+: workers must not unlink blocks owned by the parent on exit
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+# Per-worker state, filled by _init_worker
+_worker_blocks = []
+_worker_datasets = {}
+_indicator_cache = {}
+
+
+def _init_worker(descriptor):
+    for key, entry in descriptor.items():
+        arrays = {}
+        for name, (block_name, shape, dtype) in entry.items():
+            block = _attach(block_name)
+            _worker_blocks.append(block)
+            array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+            array.flags.writeable = False
+            arrays[name] = array
+        _worker_datasets[key] = (arrays["timestamps"], arrays["values"])
+
+
+# --- indicator cache -----------------------------------------------------------
+
+def cached_indicator(symbol, interval, name, params, compute):
+    """Indicator series over a whole dataset, computed once per worker for each (symbol, interval, params)."""
+    key = (symbol, str(interval), name, params)
+    result = _indicator_cache.get(key)
+    if result is None:
+        result = compute()
+        _indicator_cache[key] = result
+    return result
+
+
+class CachedLevelStrategy(Strategy):
+    """Strategy whose support/resistance come from rolling series cached for the dataset.
+
+    Returns exactly what ``identify_support_resistance`` computes on the bot's
+    DataFrame, which always ends at the exchange's current bar.
+    """
+
+    def __init__(self, exchange, max_bars, support_resistance_window=12):
+        super().__init__(support_resistance_window)
+        self.exchange = exchange
+        self.max_bars = max_bars
+
+    def identify_support_resistance(self, df):
+        window = self.support_resistance_window
+        exchange = self.exchange
+        if window > self.max_bars or exchange.cursor + 1 < window:
+            return np.nan, np.nan
+        support, resistance = cached_indicator(
+            exchange.symbol, exchange.interval, "levels", (window,),
+            lambda: (indicator_engine.rolling_min(exchange.lows, window),
+                     indicator_engine.rolling_max(exchange.highs, window))
+        )
+        return support[exchange.cursor], resistance[exchange.cursor]
+
+
+class CachedRiskManagement(RiskManagement):
+    """RiskManagement whose ATR is read from a series cached for the dataset."""
+
+    def __init__(self, exchange, max_bars, atr_period=14, atr_multiplier=1.5, risk_ratio=2.0):
+        super().__init__(atr_period, atr_multiplier, risk_ratio)
+        self.exchange = exchange
+        self.max_bars = max_bars
+
+    def calculate_atr(self, df):
+        exchange = self.exchange
+        if self.atr_period >= self.max_bars:
+            # The first bar of the frame has no previous close; only the DataFrame path handles that
+            return super().calculate_atr(df)
+        atr = cached_indicator(
+            exchange.symbol, exchange.interval, "atr", (self.atr_period,),
+            lambda: indicator_engine.atr(exchange.highs, exchange.lows, exchange.closes, self.atr_period)
+        )
+        return atr[exchange.cursor]
+
+
+# --- evaluation ----------------------------------------------------------------
+
+def evaluate(params):
+    """Backtest one parameter combination on every shared dataset and total the results."""
+    started = time.perf_counter()
+    row = dict(params)
+    totals = {"trades": 0, "net_pnl": 0.0, "fees": 0.0, "max_drawdown": 0.0, "wins": 0.0}
+    try:
+        for (symbol, interval), (timestamps, values) in _worker_datasets.items():
+            backtester = Backtester(timestamps, values, symbol=symbol, interval=interval)
+            bot = backtester.bot
+            bot.strategy = CachedLevelStrategy(backtester.exchange, bot.limit, bot.strategy.support_resistance_window)
+            risk = bot.risk_management
+            bot.risk_management = CachedRiskManagement(
+                backtester.exchange, bot.limit, risk.atr_period, risk.atr_multiplier, risk.risk_ratio
+            )
+            for name, value in params.items():
+                PARAMETER_SETTERS[name](backtester, value)
+
+            summary = backtester.run()
+            totals["trades"] += summary["trades"]
+            totals["net_pnl"] += summary["net_pnl"]
+            totals["fees"] += summary["fees"]
+            totals["max_drawdown"] = max(totals["max_drawdown"], summary["max_drawdown"])
+            totals["wins"] += summary["win_rate"] * summary["trades"]
+        totals["win_rate"] = totals.pop("wins") / totals["trades"] if totals["trades"] else 0.0
+        row.update(totals)
+        row["error"] = ""
+    except Exception as e:
+        row["error"] = str(e)
+    row["seconds"] = time.perf_counter() - started
+    return row
+
+
+# --- search strategies -----------------------------------------------------------
+
+def grid_candidates(space):
+    for name, values in space.items():
+        if not isinstance(values, list):
+            raise ValueError(f"Grid search needs a list of values for {name}")
+    names = list(space)
+    for combination in itertools.product(*(space[name] for name in names)):
+        yield dict(zip(names, combination))
+
+
+def _sample(values, rng):
+    if isinstance(values, list):
+        return values[rng.integers(len(values))]
+    low, high = values
+    if isinstance(low, int) and isinstance(high, int):
+        return int(rng.integers(low, high + 1))
+    return float(rng.uniform(low, high))
+
+
+def random_candidates(space, trials, seed=None):
+    rng = np.random.default_rng(seed)
+    for _ in range(trials):
+        yield {name: _sample(values, rng) for name, values in space.items()}
+
+
+def _skopt_dimensions(space):
+    dimensions = []
+    for name, values in space.items():
+        if isinstance(values, list):
+            dimensions.append(Categorical(values, name=name))
+        elif isinstance(values[0], int) and isinstance(values[1], int):
+            dimensions.append(Integer(values[0], values[1], name=name))
+        else:
+            dimensions.append(Real(float(values[0]), float(values[1]), name=name))
+    return dimensions
+
+
+class ParameterSweep:
+    """Runs backtests for many parameter combinations across a process pool.
+
+    ``method`` is "grid", "random" or "bayes". Bayesian search needs
+    scikit-optimize and falls back to random search without it.
+    """
+
+    def __init__(self, datasets, space=None, method="grid", trials=100, workers=None,
+                 metric="net_pnl", seed=None):
+        self.datasets = datasets  # {(symbol, interval): (timestamps, values)}
+        self.space = space or DEFAULT_SPACE
+        unknown = set(self.space) - set(PARAMETER_SETTERS)
+        if unknown:
+            raise ValueError(f"Unknown parameters: {', '.join(sorted(unknown))}")
+        self.method = method
+        self.trials = trials
+        self.workers = workers or os.cpu_count()
+        self.metric = metric
+        self.seed = seed
+
+    def run(self):
+        shared = SharedCandles()
+        try:
+            for (symbol, interval), (timestamps, values) in self.datasets.items():
+                shared.add(symbol, interval, timestamps, values)
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                     initargs=(shared.descriptor,)) as executor:
+                if self.method == "bayes" and SKOPT_AVAILABLE:
+                    rows = self._run_bayes(executor)
+                else:
+                    if self.method == "bayes":
+                        print("scikit-optimize is not installed, using random search instead.")
+                    rows = self._run_batch(executor)
+        finally:
+            shared.close()
+        return self.rank(rows)
+
+    def _run_batch(self, executor):
+        if self.method == "grid":
+            candidates = list(grid_candidates(self.space))
+        else:
+            candidates = list(random_candidates(self.space, self.trials, self.seed))
+        # Chunks keep every worker busy without one IPC round-trip per combination
+        chunksize = max(1, len(candidates) // (self.workers * 4))
+        return list(executor.map(evaluate, candidates, chunksize=chunksize))
+
+    def _run_bayes(self, executor):
+        names = list(self.space)
+        optimizer = BayesianOptimizer(_skopt_dimensions(self.space), random_state=self.seed)
+        rows = []
+        while len(rows) < self.trials:
+            # One point per worker per round so all cores stay busy
+            batch = optimizer.ask(n_points=min(self.workers, self.trials - len(rows)))
+            futures = [executor.submit(evaluate, dict(zip(names, point))) for point in batch]
+            results = [future.result() for future in futures]
+            scores = [-row.get(self.metric, float("-inf")) if not row["error"] else 1e18 for row in results]
+            optimizer.tell(batch, scores)
+            rows.extend(results)
+        return rows
+
+    def rank(self, rows):
+        results = pd.DataFrame(rows)
+        if results.empty:
+            return results
+        results = results.sort_values(self.metric, ascending=False, na_position="last").reset_index(drop=True)
+        results.insert(0, "rank", results.index + 1)
+        return results
+
+
+def parse_parameter(text):
+    """'name=a,b,c' gives choices, 'name=low:high' a range."""
+    name, _, spec = text.partition("=")
+
+    def convert(value):
+        for cast in (int, float):
+            try:
+                return cast(value)
+            except ValueError:
+                pass
+        return {"true": True, "false": False}.get(value.lower(), value)
+
+    if ":" in spec:
+        low, high = spec.split(":", 1)
+        return name, (convert(low), convert(high))
+    return name, [convert(value) for value in spec.split(",")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep strategy and risk parameters over stored klines.")
+    parser.add_argument("data", nargs="*", help="CSV files, one per symbol (see backtester.load_klines_csv)")
+    parser.add_argument("--symbols", help="Comma-separated symbols matching the CSV files or to read from --archive")
+    parser.add_argument("--archive", help="Read candles from this CandleArchive directory instead of CSV files")
+    parser.add_argument("--start", help="First candle (ISO date or ms), archive only")
+    parser.add_argument("--end", help="Last candle (ISO date or ms), archive only")
+    parser.add_argument("--interval", default="1")
+    parser.add_argument("--method", choices=("grid", "random", "bayes"), default="grid")
+    parser.add_argument("--trials", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--metric", default="net_pnl")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--param", action="append", default=[],
+                        help="Parameter space entry, e.g. sr_window=6,12,24 or take_profit_percentage=0.05:0.5")
+    parser.add_argument("--output", default="optimizer_results.csv")
+    args = parser.parse_args()
+
+    if args.archive:
+        if not args.symbols:
+            parser.error("--symbols is required with --archive")
+        start, end = parse_time(args.start), parse_time(args.end)
+        datasets = {(symbol, args.interval): load_archive(args.archive, symbol, args.interval, start, end)
+                    for symbol in args.symbols.split(",")}
+    elif args.data:
+        symbols = args.symbols.split(",") if args.symbols else [f"SYMBOL{i}" for i in range(len(args.data))]
+        datasets = {(symbol, args.interval): load_klines_csv(path) for symbol, path in zip(symbols, args.data)}
+    else:
+        parser.error("either CSV files or --archive is required")
+    space = dict(parse_parameter(text) for text in args.param) or None
+
+    started = time.perf_counter()
+    sweep = ParameterSweep(datasets, space, method=args.method, trials=args.trials,
+                           workers=args.workers, metric=args.metric, seed=args.seed)
+    results = sweep.run()
+    results.to_csv(args.output, index=False)
+    print(f"{len(results)} combinations in {time.perf_counter() - started:.1f}s, results written to {args.output}")
+    print(results.head(10).to_string(index=False))
@@ -0,0 +1,236 @@
+# order_book.py
+
+import math
+import threading
+import zlib
+from bisect import bisect_left, bisect_right
+
+
+def tick_decimals(tick_size):
+    """Decimal places of a tick size such as 0.1 or 0.0005."""
+    text = f"{tick_size:.12f}".rstrip("0")
+    return len(text.split(".")[1]) if "." in text else 0
+
+
+def round_to_tick(price, tick_size, direction="down"):
+    """Snap `price` to the tick grid; "down" for bids, "up" for asks, "nearest" otherwise."""
+    steps = price / tick_size
+    if direction == "down":
+        steps = math.floor(steps + 1e-9)
+    elif direction == "up":
+        steps = math.ceil(steps - 1e-9)
+    else:
+        steps = round(steps)
+    return round(steps * tick_size, tick_decimals(tick_size))
+
+
+class BookSide:
+    """One side of an L2 book as parallel price/size lists kept sorted by ascending price.
+
+    Updates are a binary search plus at most one list insert or delete, which
+    is cheap for the few hundred levels Bybit streams.
+    """
+
+    def __init__(self, descending):
+        # Bids are best at the end of the lists, asks at the start
+        self.descending = descending
+        self.prices = []
+        self.sizes = []
+
+    def clear(self):
+        self.prices = []
+        self.sizes = []
+
+    def __len__(self):
+        return len(self.prices)
+
+    def set(self, price, size):
+        prices = self.prices
+        i = bisect_left(prices, price)
+        if i < len(prices) and prices[i] == price:
+            if size == 0:
+                del prices[i]
+                del self.sizes[i]
+            else:
+                self.sizes[i] = size
+        elif size != 0:
+            prices.insert(i, price)
+            self.sizes.insert(i, size)
+
+    def apply(self, levels):
+        for price, size in levels:
+            self.set(float(price), float(size))
+
+    def best(self):
+        if not self.prices:
+            return None
+        return self.prices[-1] if self.descending else self.prices[0]
+
+    def size_at(self, price):
+        """Resting size at exactly `price` (the queue a new order would join)."""
+        i = bisect_left(self.prices, price)
+        if i < len(self.prices) and self.prices[i] == price:
+            return self.sizes[i]
+        return 0.0
+
+    def depth_to(self, price):
+        """Total size from the best level through `price` inclusive."""
+        if self.descending:
+            return sum(self.sizes[bisect_left(self.prices, price):])
+        return sum(self.sizes[:bisect_right(self.prices, price)])
+
+    def top(self, n):
+        """The best `n` (price, size) levels, best first."""
+        if self.descending:
+            return list(zip(self.prices[:-n - 1:-1], self.sizes[:-n - 1:-1]))
+        return list(zip(self.prices[:n], self.sizes[:n]))
+
+
+class OrderBook:
+    """Local L2 book for one symbol, built from Bybit ``orderbook.{depth}`` snapshot and delta messages.
+
+    Every message carries an update id ``u``. A delta must continue from the
+    last applied id. After a gap, or if the book ends up crossed, the book is
+    marked invalid and ignores deltas until the next snapshot. Bybit v5 sends
+    no checksum, so ``checksum`` (CRC32 of the top levels) is used to compare
+    the local book with a REST ``/v5/market/orderbook`` snapshot.
+    """
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.bids = BookSide(descending=True)
+        self.asks = BookSide(descending=False)
+        self.update_id = None
+        self.seq = None
+        self.timestamp = None
+        self.valid = False
+        # Updates arrive on the stream thread while orders are priced from others
+        self._lock = threading.Lock()
+
+    def apply(self, message):
+        """Apply a stream message (``type`` snapshot or delta); returns False when a resync is needed."""
+        data = message['data']
+        with self._lock:
+            if message.get('type') == 'snapshot' or data.get('u') == 1:
+                # u == 1 also means the exchange restarted its book and this is a fresh snapshot
+                self.apply_snapshot(data, message.get('ts'))
+            else:
+                self.apply_delta(data, message.get('ts'))
+        return self.valid
+
+    def apply_snapshot(self, data, timestamp=None):
+        self.bids.clear()
+        self.asks.clear()
+        self.bids.apply(data.get('b', ()))
+        self.asks.apply(data.get('a', ()))
+        self._accept(data, timestamp)
+
+    def apply_delta(self, data, timestamp=None):
+        if not self.valid:
+            return
+        update_id = data.get('u')
+        if update_id is not None and self.update_id is not None:
+            if update_id <= self.update_id:
+                return  # already applied
+            if update_id != self.update_id + 1:
+                print(f"Order book gap for {self.symbol}: {self.update_id} -> {update_id}, waiting for a snapshot.")
+                self.valid = False
+                return
+        self.bids.apply(data.get('b', ()))
+        self.asks.apply(data.get('a', ()))
+        self._accept(data, timestamp)
+
+    def invalidate(self):
+        """Ignore deltas until the next snapshot, e.g. after the book disagreed with a REST snapshot."""
+        with self._lock:
+            self.valid = False
+
+    def _accept(self, data, timestamp):
+        self.update_id = data.get('u', self.update_id)
+        self.seq = data.get('seq', self.seq)
+        self.timestamp = timestamp
+        bid, ask = self.bids.best(), self.asks.best()
+        self.valid = bid is None or ask is None or bid < ask
+        if not self.valid:
+            print(f"Order book for {self.symbol} is crossed ({bid} >= {ask}), waiting for a snapshot.")
+
+    # --- queries ---------------------------------------------------------------------
+
+    def best_bid(self):
+        return self.bids.best()
+
+    def best_ask(self):
+        return self.asks.best()
+
+    def mid(self):
+        bid, ask = self.bids.best(), self.asks.best()
+        if bid is None or ask is None:
+            return None
+        return (bid + ask) / 2
+
+    def spread(self):
+        bid, ask = self.bids.best(), self.asks.best()
+        if bid is None or ask is None:
+            return None
+        return ask - bid
+
+    def side(self, side):
+        return self.bids if side.lower() == 'buy' else self.asks
+
+    def queue_size(self, side, price):
+        """Size already resting at `price` on the side an order of `side` ('Buy'/'Sell') would rest on."""
+        return self.side(side).size_at(price)
+
+    def depth_to_price(self, side, price):
+        """Size resting between the best level and `price` on the bid ('Buy') or ask ('Sell') side."""
+        return self.side(side).depth_to(price)
+
+    def checksum(self, levels=25):
+        """CRC32 over the top `levels` bids and asks, interleaved as bid, ask, bid, ..."""
+        parts = []
+        bids, asks = self.bids.top(levels), self.asks.top(levels)
+        for i in range(max(len(bids), len(asks))):
+            for book_side in (bids, asks):
+                if i < len(book_side):
+                    price, size = book_side[i]
+                    parts.append(f"{price!r}:{size!r}")
+        return zlib.crc32(":".join(parts).encode())
+
+    def matches(self, snapshot, levels=25):
+        """Whether the top levels agree with a REST order book snapshot (the ``result`` dict).
+
+        None when the snapshot carries a ``seq`` other than the book's, as the two
+        then describe different moments and cannot be compared.
+        """
+        reference = OrderBook(self.symbol)
+        reference.apply_snapshot(snapshot)
+        levels = min(levels, len(snapshot.get('b', ())), len(snapshot.get('a', ())))
+        with self._lock:
+            if snapshot.get('seq') is not None and snapshot['seq'] != self.seq:
+                return None
+            return self.checksum(levels) == reference.checksum(levels)
+
+    # --- pricing ---------------------------------------------------------------------
+
+    def entry_price(self, side, target, tick_size, queue_limit=None):
+        """Passive limit price for `side` near `target`, snapped to the tick grid.
+
+        Bids round down and asks round up. A price that would cross the book
+        is pulled back one tick inside the opposite best, so the order rests as
+        a maker. With `queue_limit`, a level whose queue already holds more than
+        that size is improved by one tick, provided it still does not cross.
+        """
+        buy = side.lower() == 'buy'
+        price = round_to_tick(target, tick_size, "down" if buy else "up")
+        step = tick_size if buy else -tick_size
+        decimals = tick_decimals(tick_size)
+
+        with self._lock:
+            opposite = self.asks.best() if buy else self.bids.best()
+            if opposite is not None and (price >= opposite if buy else price <= opposite):
+                price = round(opposite - step, decimals)
+            elif queue_limit is not None and self.queue_size(side, price) > queue_limit:
+                improved = round(price + step, decimals)
+                if opposite is None or (improved < opposite if buy else improved > opposite):
+                    price = improved
+        return price
@@ -0,0 +1,162 @@
+# order_gateway.py
+
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing.connection import Client, Listener
+from exchange_adapter import ExchangeAdapter, exchange_from_env
+
+
+class GatewayClient(ExchangeAdapter):
+    """Transport backend that hands every request to the order-gateway process.
+
+    Each client has its own connection to the gateway, so a process that dies
+    mid-request only takes its own connection down. Replies are matched to
+    requests by id. The client connects on first use and reconnects after the
+    gateway restarts; requests in flight on a lost connection fail. Pricing,
+    order pairs and the other adapter logic still run in the calling process.
+    """
+
+    def __init__(self, address, authkey, timeout=30, **options):
+        super().__init__(**options)
+        self.address = address
+        self.authkey = authkey
+        self.timeout = timeout
+
+        self._conn = None
+        self._pending = {}  # request id -> (connection, future)
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._ids = itertools.count()
+
+    def send_request(self, method, endpoint, params=None, timeout=None, priority=None):
+        wait = (timeout or self.timeout) + 5
+        request_id = next(self._ids)
+        future = Future()
+        try:
+            with self._send_lock:
+                conn = self._conn or self._connect(time.time() + wait)
+                with self._lock:
+                    self._pending[request_id] = (conn, future)
+                try:
+                    conn.send((request_id, method, endpoint, params or {}, timeout, priority))
+                except OSError:
+                    self._conn = None
+                    raise
+            return future.result(timeout=wait)
+        finally:
+            with self._lock:
+                self._pending.pop(request_id, None)
+
+    def _connect(self, deadline):
+        # The gateway may still be starting (or restarting)
+        while True:
+            try:
+                conn = Client(self.address, authkey=self.authkey)
+                break
+            except OSError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.2)
+        self._conn = conn
+        threading.Thread(target=self._read_responses, args=(conn,), name="gateway-replies", daemon=True).start()
+        return conn
+
+    def _read_responses(self, conn):
+        try:
+            while True:
+                request_id, response, error = conn.recv()
+                with self._lock:
+                    entry = self._pending.get(request_id)
+                if entry is None:
+                    continue
+                if error is not None:
+                    entry[1].set_exception(Exception(f"Gateway error: {error}"))
+                else:
+                    entry[1].set_result(response)
+        except (EOFError, OSError):
+            pass
+        with self._send_lock:
+            if self._conn is conn:
+                self._conn = None
+        conn.close()
+        with self._lock:
+            lost = [future for owner, future in self._pending.values() if owner is conn and not future.done()]
+        for future in lost:
+            future.set_exception(Exception("Gateway connection lost"))
+
+
+def _probe(address, authkey, timeout=5):
+    """One no-op round trip through the gateway's accept, read and worker threads."""
+    try:
+        with Client(address, authkey=authkey) as conn:
+            conn.send((0, None, None, {}, None, None))
+            return conn.poll(timeout) and conn.recv()[2] is None
+    except (EOFError, OSError):
+        return False
+
+
+def serve(address, authkey, stop_event, exchange=None, workers=16, heartbeat=None, stall_seconds=30):
+    """Gateway loop: run the clients' requests on the one exchange session until `stop_event` is set.
+
+    Every process of the deployment goes through this session, so its
+    connection pool and rate limiter see all of the traffic. With a
+    `heartbeat` callable, the loop probes itself every second and calls it
+    after a probe went through, unless an exchange request has been running
+    for over `stall_seconds`.
+    """
+    exchange = exchange or exchange_from_env(os.getenv("BYBIT_API_KEY"), os.getenv("BYBIT_API_SECRET"), pool_size=workers)
+    listener = Listener(address, authkey=authkey)
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gateway")
+    print(f"Order gateway listening on {address} ({type(exchange).__name__}, {workers} workers).")
+
+    in_flight = {}  # token -> start time of an exchange request
+
+    def handle(conn, send_lock, request_id, method, endpoint, params, timeout, priority):
+        token = object()
+        in_flight[token] = time.time()
+        try:
+            if endpoint is None:
+                reply = (request_id, {"retCode": 0}, None)  # liveness probe
+            else:
+                reply = (request_id, exchange.send_request(method, endpoint, params, timeout=timeout, priority=priority), None)
+        except Exception as e:
+            reply = (request_id, None, str(e))
+        finally:
+            in_flight.pop(token, None)
+        with send_lock:
+            try:
+                conn.send(reply)
+            except OSError:
+                pass  # the client is gone
+
+    def read(conn):
+        send_lock = threading.Lock()
+        try:
+            while True:
+                executor.submit(handle, conn, send_lock, *conn.recv())
+        except (EOFError, OSError):
+            pass
+        with send_lock:
+            conn.close()
+
+    def accept():
+        while not stop_event.is_set():
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                if not stop_event.is_set():
+                    print(f"Gateway connection refused: {e}")
+                continue
+            threading.Thread(target=read, args=(conn,), name="gateway-client", daemon=True).start()
+
+    threading.Thread(target=accept, name="gateway-accept", daemon=True).start()
+    while not stop_event.wait(1):
+        if heartbeat is not None and _probe(address, authkey):
+            now = time.time()
+            if all(now - started <= stall_seconds for started in list(in_flight.values())):
+                heartbeat()
+    listener.close()
+    executor.shutdown(wait=False)
@@ -0,0 +1,236 @@
+# order_tracker.py
+
+import hashlib
+import hmac
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from ws_client import ReconnectingWebSocket
+from instrumentation import metrics
+
+PRIVATE_DEMO_WS_URL = "wss://stream-demo.bybit.com/v5/private"
+
+# Order states that mean the order will not trade any further
+CLOSED_ORDER_STATUSES = {"Filled", "Cancelled", "Rejected", "Deactivated"}
+
+# Seconds an event for an untracked order is kept, in case its pair is registered right after
+UNMATCHED_EVENT_TTL = 60
+
+
+class OrderPair:
+    """A long/short limit-order pair where the first leg to trade cancels the other."""
+
+    def __init__(self, symbol, long_order, short_order):
+        self.symbol = symbol
+        self.long_order = long_order
+        self.short_order = short_order
+        self.future = Future()
+        self.timer = None
+        self.resolved = False
+        self.created_time = time.time()
+
+    def order_ids(self):
+        return [order['orderId'] for order in (self.long_order, self.short_order) if order]
+
+    def sibling_of(self, order_id):
+        if self.long_order and self.long_order['orderId'] == order_id:
+            return self.short_order
+        return self.long_order
+
+    def order_by_id(self, order_id):
+        if self.long_order and self.long_order['orderId'] == order_id:
+            return self.long_order
+        return self.short_order
+
+
+class OrderFillTracker(ReconnectingWebSocket):
+    """Resolves order pairs from Bybit's private order/execution stream (OCO semantics).
+
+    ``track_pair`` returns a Future immediately; it resolves to the order result of
+    the leg that traded first, or to None when the pair timed out and both legs
+    were cancelled. The sibling is cancelled as soon as the first execution arrives.
+
+    A leg can trade before ``track_pair`` is called for it. Events for order
+    ids that are not tracked are kept for ``UNMATCHED_EVENT_TTL`` seconds and
+    applied when the pair is registered.
+    """
+
+    name = "Order stream"
+
+    def __init__(self, api_key, api_secret, data_fetcher, url=PRIVATE_DEMO_WS_URL, account_state=None,
+                 ping_interval=20, reconnect_delay=1, max_reconnect_delay=30):
+        super().__init__(url, ping_interval, reconnect_delay, max_reconnect_delay)
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.data_fetcher = data_fetcher
+        # Optional AccountState kept current from the same order/position messages
+        self.account_state = account_state
+
+        self.pairs_by_order_id = {}
+        # order id -> ("traded" or "closed", time received) for orders not tracked (yet)
+        self.unmatched_events = {}
+        self._lock = threading.Lock()
+        # Cancels run off the socket thread so one slow REST call does not delay other fills
+        self._cancel_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="oco-cancel")
+
+    # --- connection ----------------------------------------------------------
+
+    def _auth_payload(self):
+        expires = int((time.time() + 10) * 1000)
+        signature = hmac.new(
+            self.api_secret.encode('utf-8'),
+            f"GET/realtime{expires}".encode('utf-8'),
+            hashlib.sha256
+        ).hexdigest()
+        return {"op": "auth", "args": [self.api_key, expires, signature]}
+
+    def _on_open(self, ws):
+        print(f"Order stream connected to {self.url}")
+        self.send(self._auth_payload())
+
+    def handle_message(self, message):
+        op = message.get('op')
+        if op == 'auth':
+            if message.get('success'):
+                self.send({"op": "subscribe", "args": ["order", "execution", "position"]})
+                # Fills that happened while disconnected are only visible over REST
+                if self.account_state is not None:
+                    self.account_state.snapshots.clear()
+                self._cancel_executor.submit(self.reconcile)
+            else:
+                print(f"Order stream authentication failed: {message.get('ret_msg')}")
+            return
+
+        if self.account_state is not None:
+            self.account_state.handle_message(message)
+
+        topic = message.get('topic')
+        if topic == 'execution':
+            for execution in message['data']:
+                self._on_order_traded(execution['orderId'])
+        elif topic == 'order':
+            for order in message['data']:
+                if float(order.get('cumExecQty') or 0) > 0:
+                    self._on_order_traded(order['orderId'])
+                elif order.get('orderStatus') in CLOSED_ORDER_STATUSES:
+                    self._on_order_closed(order['orderId'])
+
+    # --- tracking ----------------------------------------------------------------
+
+    def track_pair(self, symbol, long_order, short_order, timeout=None, on_fill=None):
+        """Start tracking a long/short pair and return a Future for the filled leg."""
+        pair = OrderPair(symbol, long_order, short_order)
+        with self._lock:
+            for order_id in pair.order_ids():
+                self.pairs_by_order_id[order_id] = pair
+            early = {order_id: self.unmatched_events.pop(order_id)[0]
+                     for order_id in pair.order_ids() if order_id in self.unmatched_events}
+
+        if on_fill is not None:
+            pair.future.add_done_callback(lambda future: on_fill(future.result()))
+
+        if timeout:
+            pair.timer = threading.Timer(timeout, self._on_timeout, args=(pair,))
+            pair.timer.daemon = True
+            pair.timer.start()
+
+        # Legs that traded or closed before the pair was registered
+        traded = [order_id for order_id, event in early.items() if event == "traded"]
+        if traded:
+            self._on_order_traded(traded[0])
+        else:
+            for order_id in early:
+                self._on_order_closed(order_id)
+        return pair.future
+
+    def pending_pairs(self):
+        with self._lock:
+            return list({id(pair): pair for pair in self.pairs_by_order_id.values()}.values())
+
+    def _release(self, pair):
+        """Stop tracking a pair; returns False if it was already resolved elsewhere."""
+        with self._lock:
+            if pair.resolved:
+                return False
+            pair.resolved = True
+            for order_id in pair.order_ids():
+                self.pairs_by_order_id.pop(order_id, None)
+        if pair.timer is not None:
+            pair.timer.cancel()
+        return True
+
+    def _remember(self, order_id, event):
+        # Called with the lock held; a trade is never downgraded to a close
+        now = time.time()
+        if self.unmatched_events.get(order_id, (None,))[0] != "traded":
+            self.unmatched_events[order_id] = (event, now)
+        for stale in [oid for oid, (_, received) in self.unmatched_events.items() if now - received > UNMATCHED_EVENT_TTL]:
+            del self.unmatched_events[stale]
+
+    def _on_order_traded(self, order_id):
+        with self._lock:
+            pair = self.pairs_by_order_id.get(order_id)
+            if pair is None:
+                self._remember(order_id, "traded")
+                return
+        if not self._release(pair):
+            return
+
+        sibling = pair.sibling_of(order_id)
+        if sibling:
+            self._cancel_executor.submit(self._cancel_sibling, sibling['orderId'], pair.symbol, time.perf_counter())
+        filled_order = pair.order_by_id(order_id)
+        print(f"Order {order_id} filled for {pair.symbol}.")
+        pair.future.set_result(filled_order)
+
+    def _cancel_sibling(self, order_id, symbol, filled_at):
+        self.data_fetcher.cancel_order(order_id, symbol)
+        metrics.observe("fill_to_cancel", time.perf_counter() - filled_at)
+
+    def _on_order_closed(self, order_id):
+        # A leg was cancelled without trading (manually or by the exchange); keep
+        # tracking the other leg, or give up once nothing is left to fill
+        with self._lock:
+            pair = self.pairs_by_order_id.pop(order_id, None)
+            if pair is None:
+                self._remember(order_id, "closed")
+                return
+            remaining = [oid for oid in pair.order_ids() if oid in self.pairs_by_order_id]
+        if not remaining and self._release(pair):
+            pair.future.set_result(None)
+
+    def _on_timeout(self, pair):
+        if not self._release(pair):
+            return
+        print(f"No order filled for {pair.symbol} before the timeout, cancelling both legs.")
+        for order_id in pair.order_ids():
+            self.data_fetcher.cancel_order(order_id, pair.symbol)
+        pair.future.set_result(None)
+
+    def reconcile(self):
+        """Resolve pairs whose legs disappeared from the open orders (one REST call per symbol).
+
+        A missing leg is looked up in the order history: it counts as traded
+        only if it executed, and as closed if it was cancelled or rejected.
+        """
+        pairs = self.pending_pairs()
+        for symbol in {pair.symbol for pair in pairs}:
+            open_orders = self.data_fetcher.get_open_orders(symbol)
+            if open_orders is None:
+                continue
+            open_order_ids = {order['orderId'] for order in open_orders}
+            for pair in pairs:
+                if pair.symbol != symbol:
+                    continue
+                for order_id in pair.order_ids():
+                    if order_id in open_order_ids:
+                        continue
+                    order = self.data_fetcher.get_order(symbol, order_id)
+                    if order is None:
+                        # Not in the history yet; the stream or the timeout settles it
+                        continue
+                    if float(order.get('cumExecQty') or 0) > 0:
+                        self._on_order_traded(order_id)
+                        break
+                    if order.get('orderStatus') in CLOSED_ORDER_STATUSES:
+                        self._on_order_closed(order_id)
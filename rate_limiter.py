@@ -0,0 +1,248 @@
+# rate_limiter.py
+
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+
+# Request priorities, lower runs first. They order the waiters of a bucket, including the
+# shared IP bucket every request draws from, so a cancel is not stuck behind market-data reads.
+PRIORITY_CANCEL = 0
+PRIORITY_ORDER = 1
+PRIORITY_ACCOUNT = 2
+PRIORITY_MARKET_DATA = 3
+
+# Endpoint groups and their budgets (requests per second, burst size), mirroring
+# Bybit's v5 limits for linear contracts. Order endpoints are limited per symbol.
+ENDPOINT_GROUPS = {
+    "/v5/order/create": ("order", PRIORITY_ORDER),
+    "/v5/order/amend": ("order", PRIORITY_ORDER),
+    "/v5/order/cancel": ("order", PRIORITY_CANCEL),
+    "/v5/order/create-batch": ("order_batch", PRIORITY_ORDER),
+    "/v5/order/cancel-batch": ("order_batch", PRIORITY_CANCEL),
+    "/v5/order/cancel-all": ("order", PRIORITY_CANCEL),
+    "/v5/order/realtime": ("account", PRIORITY_ACCOUNT),
+    "/v5/order/history": ("account", PRIORITY_ACCOUNT),
+    "/v5/position/list": ("account", PRIORITY_ACCOUNT),
+    "/v5/position/set-leverage": ("position", PRIORITY_ORDER),
+}
+
+RATE_LIMITS = {
+    "order": (10, 10),
+    "order_batch": (10, 10),
+    "account": (50, 50),
+    "position": (10, 10),
+    "market": (120, 120),
+    "default": (10, 10),
+    # Bybit allows 600 requests per 5 seconds per IP across all endpoints
+    "ip": (100, 100),
+}
+
+PER_SYMBOL_GROUPS = {"order", "order_batch"}
+SHARED_KEY = ("ip", None)
+
+# retCode returned by Bybit when a request was rejected for exceeding the limit
+RATE_LIMIT_RET_CODE = 10006
+
+
+def endpoint_group(endpoint):
+    """Return (group, default priority) for an endpoint path."""
+    if endpoint in ENDPOINT_GROUPS:
+        return ENDPOINT_GROUPS[endpoint]
+    if endpoint.startswith("/v5/market/"):
+        return "market", PRIORITY_MARKET_DATA
+    return "default", PRIORITY_ACCOUNT
+
+
+def request_symbol(params):
+    """Symbol a request is limited under; batch requests carry it in their legs."""
+    if not params:
+        return None
+    if params.get("symbol"):
+        return params["symbol"]
+    legs = params.get("request")
+    if legs:
+        return legs[0].get("symbol")
+    return None
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self, now):
+        return now >= self.blocked_until and self.tokens >= 1
+
+    def wait_time(self, now):
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class WaitStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rejections = 0
+
+    def record(self, waited):
+        self.count += 1
+        self.total += waited
+        self.max = max(self.max, waited)
+
+    def as_dict(self):
+        return {
+            "requests": self.count,
+            "avg_wait": self.total / self.count if self.count else 0.0,
+            "max_wait": self.max,
+            "rate_limit_rejections": self.rejections,
+        }
+
+
+class RateLimiter:
+    """Token-bucket request scheduler with per-endpoint-group budgets and priority lanes.
+
+    A request first takes a token from its endpoint group's bucket (per
+    symbol for order groups), then one from the shared IP bucket. Each bucket
+    serves its waiters in priority order. Cancels, orders, account reads and
+    market data all meet in the shared bucket, so that is where priority
+    decides who goes first. A request only joins the shared queue once it
+    holds its group token, so a starved group never blocks the others.
+    ``update_from_headers`` narrows a group bucket to what the exchange
+    reports as remaining.
+    """
+
+    def __init__(self, limits=None):
+        self.limits = dict(RATE_LIMITS, **(limits or {}))
+        self.buckets = {}
+        self.waiters = {}
+        self.stats = {}
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+
+    def _key(self, endpoint, symbol):
+        group, priority = endpoint_group(endpoint)
+        key = (group, symbol) if group in PER_SYMBOL_GROUPS and symbol else (group, None)
+        self._bucket(key)
+        return key, priority
+
+    def _bucket(self, key):
+        if key not in self.buckets:
+            group = key[0]
+            rate, burst = self.limits.get(group, self.limits["default"])
+            self.buckets[key] = TokenBucket(rate, burst)
+            self.waiters[key] = []
+            self.stats.setdefault(group, WaitStats())
+        return self.buckets[key]
+
+    def _try_take(self, key, ticket, now):
+        bucket = self.buckets[key]
+        bucket.refill(now)
+        waiters = self.waiters[key]
+        if waiters and waiters[0] != ticket:
+            return False
+        if not bucket.available(now):
+            return False
+        bucket.tokens -= 1
+        if waiters:
+            heapq.heappop(waiters)
+        return True
+
+    def acquire(self, endpoint, symbol=None, priority=None):
+        """Block until the request may be sent; returns the time spent waiting."""
+        started = time.monotonic()
+        with self._condition:
+            key, default_priority = self._key(endpoint, symbol)
+            ticket = (default_priority if priority is None else priority, next(self._counter))
+            self._bucket(SHARED_KEY)
+            for stage in (key, SHARED_KEY):
+                stage_started = time.monotonic()
+                heapq.heappush(self.waiters[stage], ticket)
+                while not self._try_take(stage, ticket, time.monotonic()):
+                    self._condition.wait(timeout=max(0.001, self.buckets[stage].wait_time(time.monotonic())))
+                # Wake the next waiter in line
+                self._condition.notify_all()
+                self.stats[stage[0]].record(time.monotonic() - stage_started)
+        return time.monotonic() - started
+
+    async def acquire_async(self, endpoint, symbol=None, priority=None):
+        """Async counterpart of ``acquire`` that yields to the event loop while waiting."""
+        started = time.monotonic()
+        with self._condition:
+            key, default_priority = self._key(endpoint, symbol)
+            ticket = (default_priority if priority is None else priority, next(self._counter))
+            self._bucket(SHARED_KEY)
+        for stage in (key, SHARED_KEY):
+            await self._take_async(stage, ticket)
+        return time.monotonic() - started
+
+    async def _take_async(self, key, ticket):
+        started = time.monotonic()
+        with self._condition:
+            heapq.heappush(self.waiters[key], ticket)
+        try:
+            while True:
+                with self._condition:
+                    if self._try_take(key, ticket, time.monotonic()):
+                        self._condition.notify_all()
+                        self.stats[key[0]].record(time.monotonic() - started)
+                        return
+                    delay = max(0.001, self.buckets[key].wait_time(time.monotonic()))
+                await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            # Give up our place in line so later requests are not blocked behind us
+            with self._condition:
+                waiters = self.waiters[key]
+                if ticket in waiters:
+                    waiters.remove(ticket)
+                    heapq.heapify(waiters)
+                self._condition.notify_all()
+            raise
+
+    def update_from_headers(self, endpoint, headers, symbol=None):
+        """Adapt the bucket to Bybit's X-Bapi-Limit-* response headers."""
+        remaining = headers.get("X-Bapi-Limit-Status")
+        reset = headers.get("X-Bapi-Limit-Reset-Timestamp")
+        if remaining is None:
+            return
+        with self._condition:
+            key, _ = self._key(endpoint, symbol)
+            bucket = self.buckets[key]
+            now = time.monotonic()
+            bucket.refill(now)
+            bucket.tokens = min(bucket.tokens, float(remaining))
+            if int(remaining) <= 0 and reset:
+                self._block_until_reset(bucket, reset, now)
+
+    def record_rejection(self, endpoint, headers=None, symbol=None):
+        """Called when the exchange rejected a request for exceeding the limit."""
+        with self._condition:
+            key, _ = self._key(endpoint, symbol)
+            bucket = self.buckets[key]
+            now = time.monotonic()
+            bucket.tokens = 0.0
+            self.stats[key[0]].rejections += 1
+            reset = headers.get("X-Bapi-Limit-Reset-Timestamp") if headers else None
+            if reset:
+                self._block_until_reset(bucket, reset, now)
+            else:
+                bucket.blocked_until = max(bucket.blocked_until, now + 1.0)
+
+    def _block_until_reset(self, bucket, reset, now):
+        # The reset header is a wall-clock timestamp in milliseconds
+        delay = min(max(0.0, int(reset) / 1000 - time.time()), 60.0)
+        bucket.blocked_until = max(bucket.blocked_until, now + delay)
+
+    def wait_stats(self):
+        with self._condition:
+            return {group: stats.as_dict() for group, stats in self.stats.items()}
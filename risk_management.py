@@ -1,6 +1,7 @@
 # risk_management.py
 
-import pandas as pd
+import numpy as np
+import indicator_engine
 
 class RiskManagement:
     def __init__(self, atr_period=14, atr_multiplier=1.5, risk_ratio=2.0):
@@ -9,12 +10,11 @@ class RiskManagement:
         self.risk_ratio = risk_ratio
 
     def calculate_atr(self, df):
-        high = df['high'].astype(float)
-        low = df['low'].astype(float)
-        close = df['close'].astype(float)
-        df['previous_close'] = close.shift(1)
-        df['tr'] = pd.concat([high - low, (high - df['previous_close']).abs(), (low - df['previous_close']).abs()], axis=1).max(axis=1)
-        atr = df['tr'].rolling(window=self.atr_period).mean().iloc[-1]
+        # Works on NumPy copies of the columns, so the caller's DataFrame is left untouched
+        high = df['high'].to_numpy(dtype=np.float64)
+        low = df['low'].to_numpy(dtype=np.float64)
+        close = df['close'].to_numpy(dtype=np.float64)
+        atr = indicator_engine.atr(high, low, close, self.atr_period)[-1]
         return atr
 
     def calculate_dynamic_risk_management(self, df, current_price, trend):
@@ -0,0 +1,237 @@
+# screener.py
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import indicator_engine
+from candle_store import interval_to_ms
+from kline_decoder import decode_klines
+
+# Columns of the per-symbol bar array
+HIGH, LOW, CLOSE = range(3)
+
+
+class Screener:
+    """Ranks the whole linear-contract universe by distance to support/resistance.
+
+    Recent candles for every symbol live in one ``(symbols, bars, 3)`` array of
+    high, low and close. It is seeded from klines once; after that a scan costs
+    one bulk ``/v5/market/tickers`` request. The last price updates the forming
+    bar of every row at once, and rows roll forward when a new bar opens.
+    Levels are the rolling low/high of the last `window` bars, as in
+    ``Strategy.identify_support_resistance``. ATR matches ``RiskManagement``.
+    Both are computed for all symbols in one vectorized pass.
+
+    Bars built from ticker polls miss extremes that happen between two scans,
+    so ``resync_per_scan`` symbols are re-read from klines each scan, in turn.
+    """
+
+    def __init__(self, data_fetcher, interval="1", bars=100, window=12, atr_period=14, top=10,
+                 quote="USDT", min_turnover=0.0, max_symbols=None, resync_per_scan=0, workers=8, clock=time.time):
+        self.data_fetcher = data_fetcher
+        self.interval = str(interval)
+        self.interval_ms = interval_to_ms(interval)
+        self.bars = bars
+        self.window = window
+        self.atr_period = atr_period
+        self.top = top
+        self.quote = quote
+        self.min_turnover = min_turnover
+        self.max_symbols = max_symbols
+        self.resync_per_scan = resync_per_scan
+        self.workers = workers
+        self.clock = clock
+
+        self.symbols = []
+        self.index = {}
+        self.data = np.empty((0, bars, 3))
+        self.bar_open = np.empty(0, dtype=np.int64)  # open time of each row's last bar
+        self.shortlist = []
+        self._resync_cursor = 0
+
+    # --- universe ------------------------------------------------------------------
+
+    def select_universe(self, tickers):
+        """Symbols to track, most traded first."""
+        candidates = []
+        for ticker in tickers:
+            symbol = ticker['symbol']
+            if self.quote and not symbol.endswith(self.quote):
+                continue
+            turnover = float(ticker.get('turnover24h') or 0)
+            if turnover < self.min_turnover:
+                continue
+            candidates.append((turnover, symbol))
+        candidates.sort(reverse=True)
+        if self.max_symbols:
+            candidates = candidates[:self.max_symbols]
+        return [symbol for _, symbol in candidates]
+
+    def _load(self, symbol):
+        rows = self.data_fetcher.get_historical_data(symbol, self.interval, self.bars)
+        if not rows:
+            return None
+        timestamps, values = decode_klines(rows)
+        return timestamps, values
+
+    def _fill_row(self, row, timestamps, values):
+        count = min(len(timestamps), self.bars)
+        # Short histories are padded with NaN at the front, so they have no levels until enough bars exist
+        self.data[row, :self.bars - count] = np.nan
+        self.data[row, self.bars - count:, HIGH] = values[-count:, 1]
+        self.data[row, self.bars - count:, LOW] = values[-count:, 2]
+        self.data[row, self.bars - count:, CLOSE] = values[-count:, 3]
+        self.bar_open[row] = timestamps[-1]
+
+    def seed(self, symbols=None):
+        """Load the universe (all matching tickers by default) and its recent klines."""
+        if symbols is None:
+            tickers = self.data_fetcher.get_tickers()
+            if tickers is None:
+                print("Failed to retrieve tickers for the screener.")
+                return False
+            symbols = self.select_universe(tickers)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="screener") as executor:
+            loaded = list(executor.map(self._load, symbols))
+        kept = [(symbol, klines) for symbol, klines in zip(symbols, loaded) if klines is not None and len(klines[0])]
+
+        self.symbols = [symbol for symbol, _ in kept]
+        self.index = {symbol: row for row, symbol in enumerate(self.symbols)}
+        self.data = np.full((len(self.symbols), self.bars, 3), np.nan)
+        self.bar_open = np.zeros(len(self.symbols), dtype=np.int64)
+        for row, (_, (timestamps, values)) in enumerate(kept):
+            self._fill_row(row, timestamps, values)
+        print(f"Screener seeded {len(self.symbols)} symbols in {time.perf_counter() - started:.1f}s.")
+        return True
+
+    def _resync(self):
+        count = min(self.resync_per_scan, len(self.symbols))
+        if not count:
+            return
+        rows = [(self._resync_cursor + i) % len(self.symbols) for i in range(count)]
+        self._resync_cursor = (self._resync_cursor + count) % len(self.symbols)
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="screener") as executor:
+            loaded = list(executor.map(self._load, [self.symbols[row] for row in rows]))
+        for row, klines in zip(rows, loaded):
+            if klines is not None and len(klines[0]):
+                self._fill_row(row, *klines)
+
+    # --- bar maintenance -------------------------------------------------------------
+
+    def _roll(self, now_ms):
+        """Shift rows whose last bar has closed, starting flat bars at the previous close."""
+        current_open = now_ms - now_ms % self.interval_ms
+        behind = (current_open - self.bar_open) // self.interval_ms
+        # Usually every row is behind by the same number of bars, so this loops once
+        for steps in np.unique(behind[behind > 0]):
+            rows = np.flatnonzero(behind == steps)
+            steps = int(min(steps, self.bars))
+            block = self.data[rows]
+            last_close = block[:, -1, CLOSE]
+            block[:, :-steps] = block[:, steps:]
+            block[:, -steps:] = last_close[:, None, None]
+            self.data[rows] = block
+        self.bar_open[behind > 0] = current_open
+
+    def update_prices(self, tickers, now_ms=None):
+        """Fold one bulk ticker response into the forming bars; returns the price per row (NaN if missing)."""
+        now_ms = int(self.clock() * 1000) if now_ms is None else now_ms
+        self._roll(now_ms)
+        prices = np.full(len(self.symbols), np.nan)
+        index = self.index
+        for ticker in tickers:
+            row = index.get(ticker['symbol'])
+            if row is not None:
+                prices[row] = float(ticker['lastPrice'])
+        known = ~np.isnan(prices)
+        forming = self.data[:, -1]
+        forming[known, HIGH] = np.fmax(forming[known, HIGH], prices[known])
+        forming[known, LOW] = np.fmin(forming[known, LOW], prices[known])
+        forming[known, CLOSE] = prices[known]
+        return prices
+
+    # --- ranking ---------------------------------------------------------------------
+
+    def levels(self):
+        """(support, resistance, atr) arrays, one value per symbol."""
+        recent = self.data[:, -self.window:]
+        support = recent[:, :, LOW].min(axis=1)
+        resistance = recent[:, :, HIGH].max(axis=1)
+        atr = indicator_engine.atr(
+            self.data[:, :, HIGH], self.data[:, :, LOW], self.data[:, :, CLOSE], self.atr_period
+        )[:, -1]
+        return support, resistance, atr
+
+    def rank(self, prices):
+        """Symbols nearest a level first, as a DataFrame of the `top` best."""
+        support, resistance, atr = self.levels()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # A price through a level counts as sitting on it
+            to_support = np.maximum(prices - support, 0.0)
+            to_resistance = np.maximum(resistance - prices, 0.0)
+            distance = np.minimum(to_support, to_resistance)
+            distance_atr = distance / atr
+        valid = np.flatnonzero(np.isfinite(distance_atr) & (atr > 0))
+        if len(valid) > self.top:
+            nearest = valid[np.argpartition(distance_atr[valid], self.top - 1)[:self.top]]
+        else:
+            nearest = valid
+        nearest = nearest[np.argsort(distance_atr[nearest], kind="stable")]
+
+        return pd.DataFrame({
+            "symbol": [self.symbols[row] for row in nearest],
+            "price": prices[nearest],
+            "support": support[nearest],
+            "resistance": resistance[nearest],
+            "level": np.where(to_support[nearest] <= to_resistance[nearest], "support", "resistance"),
+            "distance_pct": distance[nearest] / prices[nearest] * 100,
+            "distance_atr": distance_atr[nearest],
+            "atr": atr[nearest],
+        })
+
+    def scan(self):
+        """One screening pass: bulk tickers, bar update, levels, ranking. Returns the ranked DataFrame."""
+        if not self.symbols and not self.seed():
+            return None
+        tickers = self.data_fetcher.get_tickers()
+        if tickers is None:
+            print("Failed to retrieve tickers for the screener.")
+            return None
+        self._resync()
+        ranked = self.rank(self.update_prices(tickers))
+        self.shortlist = list(ranked["symbol"])
+        return ranked
+
+
+if __name__ == "__main__":
+    from bybit_demo_session import BybitDemoSession
+
+    parser = argparse.ArgumentParser(description="Rank linear contracts by distance to support/resistance.")
+    parser.add_argument("--base-url", default=os.getenv("BYBIT_BASE_URL", "https://api-demo.bybit.com"))
+    parser.add_argument("--interval", default="1")
+    parser.add_argument("--bars", type=int, default=100)
+    parser.add_argument("--window", type=int, default=12)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--max-symbols", type=int)
+    parser.add_argument("--min-turnover", type=float, default=0.0)
+    parser.add_argument("--scans", type=int, default=1)
+    parser.add_argument("--every", type=float, default=10.0, help="Seconds between scans")
+    args = parser.parse_args()
+
+    session = BybitDemoSession(os.getenv("BYBIT_API_KEY", ""), os.getenv("BYBIT_API_SECRET", ""), base_url=args.base_url)
+    screener = Screener(session, interval=args.interval, bars=args.bars, window=args.window, top=args.top,
+                        min_turnover=args.min_turnover, max_symbols=args.max_symbols)
+    for scan in range(args.scans):
+        if scan:
+            time.sleep(args.every)
+        started = time.perf_counter()
+        ranked = screener.scan()
+        if ranked is None:
+            break
+        print(f"Scanned {len(screener.symbols)} symbols in {(time.perf_counter() - started) * 1000:.1f} ms")
+        print(ranked.to_string(index=False))
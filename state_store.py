@@ -0,0 +1,255 @@
+# state_store.py
+
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import NamedTuple
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pairs (
+    pair_id TEXT PRIMARY KEY,
+    symbol TEXT NOT NULL,
+    long_order_id TEXT,
+    short_order_id TEXT,
+    created_time REAL NOT NULL,
+    expires_time REAL,
+    status TEXT NOT NULL,
+    filled_order_id TEXT
+);
+CREATE TABLE IF NOT EXISTS orders (
+    order_id TEXT PRIMARY KEY,
+    symbol TEXT NOT NULL,
+    status TEXT,
+    pair_id TEXT,
+    data TEXT
+);
+CREATE TABLE IF NOT EXISTS fills (
+    exec_id TEXT PRIMARY KEY,
+    order_id TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    side TEXT,
+    price REAL,
+    qty REAL,
+    exec_time INTEGER
+);
+CREATE TABLE IF NOT EXISTS positions (
+    symbol TEXT NOT NULL,
+    position_idx INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (symbol, position_idx)
+);
+CREATE TABLE IF NOT EXISTS candles (
+    symbol TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    open REAL, high REAL, low REAL, close REAL, volume REAL, turnover REAL,
+    PRIMARY KEY (symbol, interval, timestamp)
+) WITHOUT ROWID;
+"""
+
+INSERT_PAIR = ("INSERT OR REPLACE INTO pairs (pair_id, symbol, long_order_id, short_order_id, created_time, expires_time, status)"
+               " VALUES (?, ?, ?, ?, ?, ?, 'open')")
+RESOLVE_PAIR = "UPDATE pairs SET status = ?, filled_order_id = ? WHERE pair_id = ?"
+# An order can be reported by the stream before its pair is recorded, so neither write clobbers the other
+INSERT_PAIR_ORDER = ("INSERT INTO orders (order_id, symbol, pair_id) VALUES (?, ?, ?)"
+                     " ON CONFLICT(order_id) DO UPDATE SET pair_id = excluded.pair_id")
+SAVE_ORDER = ("INSERT INTO orders (order_id, symbol, status, data) VALUES (?, ?, ?, ?)"
+              " ON CONFLICT(order_id) DO UPDATE SET status = excluded.status, data = excluded.data")
+SAVE_FILL = ("INSERT OR IGNORE INTO fills (exec_id, order_id, symbol, side, price, qty, exec_time)"
+             " VALUES (?, ?, ?, ?, ?, ?, ?)")
+SAVE_POSITION = "INSERT OR REPLACE INTO positions (symbol, position_idx, data) VALUES (?, ?, ?)"
+SAVE_CANDLE = ("INSERT OR REPLACE INTO candles (symbol, interval, timestamp, open, high, low, close, volume, turnover)"
+               " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)")
+PRUNE_CANDLES = """
+DELETE FROM candles WHERE timestamp < (
+    SELECT c.timestamp FROM candles AS c
+    WHERE c.symbol = candles.symbol AND c.interval = candles.interval
+    ORDER BY c.timestamp DESC LIMIT 1 OFFSET ?
+)
+"""
+# One symbol/interval, through the primary key, so it is cheap enough to run after every write
+PRUNE_SERIES = """
+DELETE FROM candles WHERE symbol = ? AND interval = ? AND timestamp < (
+    SELECT timestamp FROM candles WHERE symbol = ? AND interval = ?
+    ORDER BY timestamp DESC LIMIT 1 OFFSET ?
+)
+"""
+
+
+def pair_id(symbol, long_order, short_order):
+    """Key of an order pair: its symbol and the ids of its placed legs."""
+    return ":".join([symbol] + [order['orderId'] if order else "" for order in (long_order, short_order)])
+
+
+class SavedState(NamedTuple):
+    pairs: list        # unresolved pairs as dicts (pair_id, symbol, long_order_id, short_order_id, expires_time, ...)
+    positions: dict    # symbol -> last known position entries
+    candles: dict      # (symbol, interval) -> (timestamps, values), ascending
+
+
+class StateStore:
+    """Durable bot state in one SQLite file: order pairs, orders, fills, positions and candles.
+
+    The database runs in WAL mode with ``synchronous=NORMAL``, so a commit is
+    one append to the log and survives a crash of the process. Writes never
+    block the caller: they are queued and a writer thread commits everything
+    that arrives within `flush_interval` as one transaction. ``load`` reads
+    it all back for a warm start; ``flush`` waits until the queue is on disk.
+    With `keep_candles`, every transaction that saves candles also trims those
+    series to their newest `keep_candles` bars.
+    """
+
+    def __init__(self, path, flush_interval=0.05, max_batch=5000, keep_candles=None):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.keep_candles = keep_candles
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        connection = self._connect()
+        connection.executescript(SCHEMA)
+        connection.close()
+
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._run, name="state-store", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    # --- writer --------------------------------------------------------------------
+
+    def _run(self):
+        connection = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch and batch[-1] is not None:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._write(connection, [item for item in batch if item is not None])
+            for _ in batch:
+                self._queue.task_done()
+            if batch[-1] is None:
+                connection.close()
+                return
+
+    def _write(self, connection, batch):
+        if not batch:
+            return
+        # Consecutive writes of the same statement go out as one executemany
+        groups = []
+        for sql, rows in batch:
+            if groups and groups[-1][0] == sql:
+                groups[-1][1].extend(rows)
+            else:
+                groups.append((sql, list(rows)))
+        series = set()
+        if self.keep_candles:
+            series = {row[:2] for sql, rows in groups if sql == SAVE_CANDLE for row in rows}
+        try:
+            with connection:
+                for sql, rows in groups:
+                    connection.executemany(sql, rows)
+                connection.executemany(PRUNE_SERIES, [
+                    (symbol, interval, symbol, interval, self.keep_candles - 1) for symbol, interval in series
+                ])
+        except Exception as e:
+            print(f"Ошибка при сохранении состояния: {e}")
+
+    def _put(self, sql, rows):
+        if rows:
+            self._queue.put((sql, rows))
+
+    def flush(self):
+        """Block until everything queued so far is committed."""
+        self._queue.join()
+
+    def close(self):
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+
+    # --- records -------------------------------------------------------------------
+
+    def record_pair(self, symbol, long_order, short_order, expires_time=None):
+        key = pair_id(symbol, long_order, short_order)
+        self._put(INSERT_PAIR, [(
+            key, symbol,
+            long_order['orderId'] if long_order else None,
+            short_order['orderId'] if short_order else None,
+            time.time(), expires_time,
+        )])
+        self._put(INSERT_PAIR_ORDER, [(order['orderId'], symbol, key) for order in (long_order, short_order) if order])
+        return key
+
+    def resolve_pair(self, key, filled_order=None):
+        status = "filled" if filled_order else "cancelled"
+        self._put(RESOLVE_PAIR, [(status, filled_order['orderId'] if filled_order else None, key)])
+
+    def save_orders(self, orders):
+        self._put(SAVE_ORDER, [
+            (order['orderId'], order['symbol'], order.get('orderStatus'), json.dumps(order)) for order in orders
+        ])
+
+    def record_fills(self, executions):
+        self._put(SAVE_FILL, [
+            (e['execId'], e['orderId'], e['symbol'], e.get('side'), float(e.get('execPrice') or 0),
+             float(e.get('execQty') or 0), int(e.get('execTime') or 0))
+            for e in executions if e.get('execId')
+        ])
+
+    def save_positions(self, symbol, positions):
+        self._put(SAVE_POSITION, [(symbol, pos.get('positionIdx', 0), json.dumps(pos)) for pos in positions])
+
+    def save_candles(self, symbol, interval, timestamps, values):
+        interval = str(interval)
+        self._put(SAVE_CANDLE, [
+            (symbol, interval, timestamp) + tuple(row) for timestamp, row in zip(timestamps.tolist(), values.tolist())
+        ])
+
+    def prune_candles(self, keep):
+        """Drop all but the newest `keep` candles of every symbol/interval."""
+        self._put(PRUNE_CANDLES, [(keep - 1,)])
+
+    # --- warm start ----------------------------------------------------------------
+
+    def load(self, bars=None):
+        """Read back unresolved pairs, positions and the newest `bars` candles per symbol/interval."""
+        connection = self._connect()
+        connection.row_factory = sqlite3.Row
+        try:
+            pairs = [dict(row) for row in connection.execute("SELECT * FROM pairs WHERE status = 'open'")]
+
+            positions = {}
+            for row in connection.execute("SELECT symbol, data FROM positions"):
+                positions.setdefault(row['symbol'], []).append(json.loads(row['data']))
+
+            candles = {}
+            keys = connection.execute("SELECT DISTINCT symbol, interval FROM candles").fetchall()
+            for symbol, interval in keys:
+                rows = connection.execute(
+                    "SELECT timestamp, open, high, low, close, volume, turnover FROM candles"
+                    " WHERE symbol = ? AND interval = ? ORDER BY timestamp DESC LIMIT ?",
+                    (symbol, interval, bars if bars else -1)
+                ).fetchall()
+                block = np.array(rows[::-1], dtype=np.float64).reshape(len(rows), 7)
+                candles[(symbol, interval)] = (block[:, 0].astype(np.int64), np.ascontiguousarray(block[:, 1:]))
+        finally:
+            connection.close()
+        return SavedState(pairs, positions, candles)
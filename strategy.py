@@ -1,45 +1,76 @@
 # strategy.py
 
-import pandas as pd  # Add this import statement
+import asyncio
+import numpy as np
 import time
+from kline_decoder import decode_klines, klines_to_dataframe
 
 class Strategy:
-    def __init__(self):
-        pass
+    def __init__(self, support_resistance_window=12):
+        self.support_resistance_window = support_resistance_window
 
     def prepare_dataframe(self, historical_data):
-        df = pd.DataFrame(historical_data)
-        df.columns = ["timestamp", "open", "high", "low", "close", "volume", "turnover"]
-        df['close'] = df['close'].astype(float)
-        df.sort_values('timestamp', inplace=True)
-        return df
+        # Every column is typed in one pass and the newest-first rows are reversed, not sorted
+        return klines_to_dataframe(*decode_klines(historical_data))
 
     def identify_support_resistance(self, df):
-        # Identify the most recent support and resistance levels
-        support = df['low'].rolling(window=12).min().iloc[-1]  # recent lowest low
-        resistance = df['high'].rolling(window=12).max().iloc[-1]  # recent highest high
+        # Identify the most recent support and resistance levels.
+        # Only the last window is read, same result as rolling(window).min/max().iloc[-1]
+        window = self.support_resistance_window
+        if len(df) < window:
+            return np.nan, np.nan
+        support = df['low'].iloc[-window:].astype(float).min()  # recent lowest low
+        resistance = df['high'].iloc[-window:].astype(float).max()  # recent highest high
         return support, resistance
 
-    def wait_for_order_fill(self, symbol, long_order_result, short_order_result, data_fetcher):
-        """Waits for one of the limit orders to be filled, and returns the filled order."""
-        long_order_id = long_order_result['orderId']
-        short_order_id = short_order_result['orderId']
+    def wait_for_order_fill(self, symbol, long_order_result, short_order_result, data_fetcher, timeout=None):
+        """Waits for one of the limit orders to be filled, and returns the filled order.
 
-        while True:
+        Polling fallback for when the private order stream (OrderFillTracker) is not used.
+        Returns None if `timeout` seconds pass without a fill.
+        """
+        deadline = time.time() + timeout if timeout else None
+
+        while deadline is None or time.time() < deadline:
             # Check the status of both orders every 2 seconds
             time.sleep(2)
 
             open_orders = data_fetcher.get_open_orders(symbol)
-            open_order_ids = [order['orderId'] for order in open_orders]
+            filled_order = self.filled_leg(open_orders, long_order_result, short_order_result)
+            if filled_order is not None:
+                return filled_order
+
+        return None
+
+    async def wait_for_order_fill_async(self, symbol, long_order_result, short_order_result, data_fetcher,
+                                        timeout=None):
+        """``wait_for_order_fill`` polling over the transport's async client, without holding a thread."""
+        deadline = time.time() + timeout if timeout else None
+
+        while deadline is None or time.time() < deadline:
+            await asyncio.sleep(2)
+
+            open_orders = await data_fetcher.get_open_orders_async(symbol)
+            filled_order = self.filled_leg(open_orders, long_order_result, short_order_result)
+            if filled_order is not None:
+                return filled_order
+
+        return None
 
-            if long_order_id not in open_order_ids:
-                print(f"Long order {long_order_id} filled.")
-                return long_order_result
+    @staticmethod
+    def filled_leg(open_orders, long_order_result, short_order_result):
+        """The leg missing from `open_orders` (None if both are still open or the list is unknown)."""
+        if open_orders is None:
+            return None
+        open_order_ids = [order['orderId'] for order in open_orders]
 
-            if short_order_id not in open_order_ids:
-                print(f"Short order {short_order_id} filled.")
-                return short_order_result
+        if long_order_result and long_order_result['orderId'] not in open_order_ids:
+            print(f"Long order {long_order_result['orderId']} filled.")
+            return long_order_result
 
-            print("Waiting for one of the orders to be filled...")
+        if short_order_result and short_order_result['orderId'] not in open_order_ids:
+            print(f"Short order {short_order_result['orderId']} filled.")
+            return short_order_result
 
+        print("Waiting for one of the orders to be filled...")
         return None
@@ -0,0 +1,261 @@
+# streaming_indicators.py
+
+import math
+from collections import deque
+import numpy as np
+from indicator_engine import ema_step, ema_weights, sma_rebase_bars
+
+NAN = float('nan')
+
+
+class RollingWindow:
+    """The last `size` values of a series; `replace_last` overwrites the forming bar."""
+
+    def __init__(self, size):
+        self.size = size
+        self.values = deque(maxlen=size)
+
+    def push(self, value, replace_last=False):
+        if replace_last and self.values:
+            self.values.pop()
+        self.values.append(value)
+
+    def pop(self):
+        return self.values.pop()
+
+    def full(self):
+        return len(self.values) == self.size
+
+    def array(self):
+        return np.fromiter(self.values, dtype=np.float64, count=len(self.values))
+
+
+class StreamingSMA:
+    """Rolling mean updated in O(1) per bar from a running sum.
+
+    Keeps the prefix sums of the last ``window + 1`` bars; the window total is
+    the newest minus the oldest. The sums restart from the window's values
+    every ``sma_rebase_bars(window)`` bars, as in the batch engine, so the
+    result is bit-identical to ``indicator_engine.rolling_mean``.
+    """
+
+    def __init__(self, window):
+        self.window = RollingWindow(window)
+        self.rebase_bars = sma_rebase_bars(window)
+        self.prefix = deque([0.0], maxlen=window + 1)
+        # Running count of non-finite values, which are summed as zero
+        self.bad = deque([0], maxlen=window + 1)
+        self.count = 0
+        self.value = NAN
+
+    def update(self, value, replace_last=False):
+        if replace_last and self.count:
+            self.window.pop()
+            self.prefix.pop()
+            self.bad.pop()
+            self.count -= 1
+        self.window.push(value)
+
+        if self.count and self.count % self.rebase_bars == 0:
+            total, bad = 0.0, 0
+            self.prefix.clear()
+            self.bad.clear()
+            self.prefix.append(total)
+            self.bad.append(bad)
+            for item in self.window.values:
+                finite = math.isfinite(item)
+                total += item if finite else 0.0
+                bad += not finite
+                self.prefix.append(total)
+                self.bad.append(bad)
+        else:
+            finite = math.isfinite(value)
+            self.prefix.append(self.prefix[-1] + (value if finite else 0.0))
+            self.bad.append(self.bad[-1] + (not finite))
+        self.count += 1
+
+        size = self.window.size
+        if self.count < size or self.bad[-1] - self.bad[0] > 0:
+            self.value = NAN
+        else:
+            self.value = (self.prefix[-1] - self.prefix[0]) / size
+        return self.value
+
+
+class StreamingEMA:
+    """Per-bar EMA by ``indicator_engine.ema_step``, bit-identical to ``indicator_engine.ema``."""
+
+    def __init__(self, span):
+        self.span = span
+        self.weights = ema_weights(span)
+        self.previous = None  # value before the last bar, needed to revise the forming bar
+        self.value = None
+
+    def update(self, value, replace_last=False):
+        if not replace_last or self.value is None:
+            self.previous = self.value
+        self.value = ema_step(self.previous, float(value), *self.weights)
+        return self.value
+
+
+class StreamingRSI:
+    def __init__(self, period=14):
+        self.period = period
+        self.closes = RollingWindow(2)
+        self.gains = StreamingSMA(period)
+        self.losses = StreamingSMA(period)
+        self.value = NAN
+
+    def update(self, close, replace_last=False):
+        self.closes.push(close, replace_last)
+        closes = self.closes.values
+        delta = closes[-1] - closes[-2] if len(closes) == 2 else 0.0
+        gain = self.gains.update(delta if delta > 0 else 0.0, replace_last)
+        loss = self.losses.update(-delta if delta < 0 else 0.0, replace_last)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rs = np.float64(gain) / np.float64(loss)
+            self.value = float(100.0 - 100.0 / (rs + 1))
+        return self.value
+
+
+class StreamingMACD:
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast = StreamingEMA(fast)
+        self.slow = StreamingEMA(slow)
+        self.signal_ema = StreamingEMA(signal)
+        self.macd = None
+        self.signal = None
+
+    def update(self, close, replace_last=False):
+        self.macd = self.fast.update(close, replace_last) - self.slow.update(close, replace_last)
+        self.signal = self.signal_ema.update(self.macd, replace_last)
+        return self.macd, self.signal
+
+
+class StreamingStochastic:
+    def __init__(self, period=14, smooth=3):
+        self.highs = RollingWindow(period)
+        self.lows = RollingWindow(period)
+        self.d_sma = StreamingSMA(smooth)
+        self.k = NAN
+        self.d = NAN
+
+    def update(self, high, low, close, replace_last=False):
+        self.highs.push(high, replace_last)
+        self.lows.push(low, replace_last)
+        if self.highs.full():
+            highest = max(self.highs.values)
+            lowest = min(self.lows.values)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                self.k = float((np.float64(close) - lowest) / np.float64(highest - lowest) * 100)
+        else:
+            self.k = NAN
+        self.d = self.d_sma.update(self.k, replace_last)
+        return self.k, self.d
+
+
+class StreamingBollinger:
+    def __init__(self, window=20, num_std=2.0):
+        self.window = RollingWindow(window)
+        self.middle_sma = StreamingSMA(window)
+        self.num_std = num_std
+        self.upper = self.middle = self.lower = NAN
+
+    def update(self, close, replace_last=False):
+        self.window.push(close, replace_last)
+        middle = self.middle_sma.update(close, replace_last)
+        if not self.window.full():
+            self.upper = self.middle = self.lower = NAN
+            return self.upper, self.middle, self.lower
+
+        # Same arithmetic as indicator_engine.rolling_mean / rolling_std
+        values = self.window.array()
+        size = self.window.size
+        self.middle = middle
+        std = np.sqrt(np.sum((values - values.mean()) ** 2) / (size - 1))
+        band = float(std * self.num_std)
+        self.upper = self.middle + band
+        self.lower = self.middle - band
+        return self.upper, self.middle, self.lower
+
+
+class StreamingATR:
+    """Streaming counterpart of ``RiskManagement.calculate_atr``."""
+
+    def __init__(self, period=14):
+        self.closes = RollingWindow(2)
+        self.tr_sma = StreamingSMA(period)
+        self.value = NAN
+
+    def update(self, high, low, close, replace_last=False):
+        # The previous close is the one before the bar being added or revised
+        if replace_last and self.closes.values:
+            self.closes.values.pop()
+        previous_close = self.closes.values[-1] if self.closes.values else None
+        self.closes.push(close)
+
+        tr = high - low
+        if previous_close is not None:
+            tr = max(tr, abs(high - previous_close))
+            tr = max(tr, abs(low - previous_close))
+        self.value = self.tr_sma.update(tr, replace_last)
+        return self.value
+
+
+class StreamingIndicators:
+    """All streaming indicators for one symbol, fed with OHLC bars.
+
+    Call ``update`` with ``replace_last=True`` while a candle is still forming and
+    with ``replace_last=False`` for the first update of each new candle.
+    """
+
+    def __init__(self, ema_span=20, rsi_period=14, macd_fast=12, macd_slow=26, macd_signal=9,
+                 stoch_period=14, stoch_smooth=3, bb_window=20, bb_std=2.0, atr_period=14):
+        self.params = dict(
+            ema_span=ema_span, rsi_period=rsi_period, macd_fast=macd_fast, macd_slow=macd_slow,
+            macd_signal=macd_signal, stoch_period=stoch_period, stoch_smooth=stoch_smooth,
+            bb_window=bb_window, bb_std=bb_std, atr_period=atr_period,
+        )
+        self.reset()
+
+    def reset(self):
+        params = self.params
+        self.ema = StreamingEMA(params['ema_span'])
+        self.rsi = StreamingRSI(params['rsi_period'])
+        self.macd = StreamingMACD(params['macd_fast'], params['macd_slow'], params['macd_signal'])
+        self.stochastic = StreamingStochastic(params['stoch_period'], params['stoch_smooth'])
+        self.bollinger = StreamingBollinger(params['bb_window'], params['bb_std'])
+        self.atr = StreamingATR(params['atr_period'])
+
+    def update(self, high, low, close, replace_last=False):
+        high = float(high)
+        low = float(low)
+        close = float(close)
+        self.ema.update(close, replace_last)
+        self.rsi.update(close, replace_last)
+        self.macd.update(close, replace_last)
+        self.stochastic.update(high, low, close, replace_last)
+        self.bollinger.update(close, replace_last)
+        self.atr.update(high, low, close, replace_last)
+        return self.values()
+
+    def seed(self, high, low, close):
+        """Reset and warm the state up from history (arrays in ascending time order)."""
+        self.reset()
+        for h, l, c in zip(high, low, close):
+            self.update(h, l, c)
+        return self.values()
+
+    def values(self):
+        return {
+            "ema": self.ema.value,
+            "rsi": self.rsi.value,
+            "macd": self.macd.macd,
+            "macd_signal": self.macd.signal,
+            "stoch_k": self.stochastic.k,
+            "stoch_d": self.stochastic.d,
+            "bb_upper": self.bollinger.upper,
+            "bb_middle": self.bollinger.middle,
+            "bb_lower": self.bollinger.lower,
+            "atr": self.atr.value,
+        }
@@ -0,0 +1,322 @@
+# supervisor.py
+
+import asyncio
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from candle_scheduler import CandleScheduler, ServerClock
+from exchange_adapter import adapter_options_from_env
+from market_bus import MarketBus, PublishingCandleStore, BusCandleStore
+from market_stream import MarketDataStream, PUBLIC_LINEAR_WS_URL
+from order_gateway import GatewayClient, serve
+from trading_bot import TradingBot
+from trading_engine import AsyncTradingEngine
+
+
+def shard_symbols(symbols, shards):
+    """Deal `symbols` round-robin into `shards` lists (never more lists than symbols)."""
+    shards = max(1, min(shards, len(symbols)))
+    return [list(symbols[i::shards]) for i in range(shards)]
+
+
+def free_port(host="127.0.0.1"):
+    with socket.socket() as s:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+
+
+def _heartbeat(heartbeats, slot, stop_flag):
+    """Returns ``(beat, stopped)``: `beat()` stamps `heartbeats[slot]`, `stopped` is set once `stop_flag` is raised.
+
+    `beat` is called from the process's own work loop, so a loop that hangs
+    stops the heartbeat even though the process is still alive. Shared state
+    is plain values without locks, so a process killed at any point cannot
+    leave anything locked for the others.
+    """
+    stopped = threading.Event()
+
+    def watch():
+        while not stop_flag.value:
+            time.sleep(0.2)
+        stopped.set()
+
+    def beat():
+        heartbeats[slot] = time.time()
+
+    threading.Thread(target=watch, name="stop-flag", daemon=True).start()
+    return beat, stopped
+
+
+class ShardBot(TradingBot):
+    """TradingBot for one shard: candles and prices come from the market bus, orders go through the gateway."""
+
+    def __init__(self, gateway_client, bus, symbols):
+        super().__init__(data_fetcher=gateway_client)
+        self.bus = bus
+        self.symbols = list(symbols)
+        self.symbol = self.symbols[0]
+        self.job_locks = {symbol: threading.Lock() for symbol in self.symbols}
+        self.screener = None
+        self.candle_store = BusCandleStore(bus, max_bars=self.limit, clock=self.server_clock.now,
+                                           wait=float(os.getenv("BUS_CANDLE_WAIT", 2)))
+
+    def get_current_price(self, symbol):
+        price = self.bus.get_price(symbol, max_age=5)
+        if price is not None:
+            return price
+        return super().get_current_price(symbol)
+
+
+# --- process entry points (module level so they can be started with "spawn") -----------
+
+def run_gateway(gateway, stop_flag, heartbeats, stall_seconds, slot):
+    beat, stop_event = _heartbeat(heartbeats, slot, stop_flag)
+    serve(*gateway, stop_event, workers=int(os.getenv("GATEWAY_WORKERS", 16)), heartbeat=beat,
+          stall_seconds=stall_seconds)
+
+
+def run_ingestion(bus_spec, gateway, stop_flag, heartbeats, stall_seconds, slot):
+    """Seed every symbol, then keep candles and prices on the bus current (stream or REST after each close)."""
+    beat, stop_event = _heartbeat(heartbeats, slot, stop_flag)
+    bus = MarketBus.attach(**bus_spec)
+    # A previous ingestion process may have died in the middle of a write
+    bus.recover()
+    client = GatewayClient(*gateway)
+    server_clock = ServerClock()
+    server_clock.sync(client)
+    client.server_clock = server_clock
+    store = PublishingCandleStore(bus, client, max_bars=bus.bars, clock=server_clock.now)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=8, thread_name_prefix="seed") as executor:
+        seeded = 0
+        for ok in executor.map(store.seed, bus.symbols):
+            seeded += ok
+            beat()
+    print(f"Ingestion seeded {seeded}/{len(bus.symbols)} symbols in {time.perf_counter() - started:.1f}s.")
+
+    stream = None
+    if os.getenv("MARKET_STREAM_ENABLED", "False").lower() == "true":
+        stream = MarketDataStream(store, bus.symbols, bus.interval, bus.bars,
+                                  url=os.getenv("MARKET_STREAM_URL", PUBLIC_LINEAR_WS_URL))
+        stream.on_price(bus.publish_price)
+        stream.start()
+
+    def streamed():
+        return stream is not None and stream.is_connected()
+
+    def refresh_candles():
+        if not streamed():
+            with ThreadPoolExecutor(max_workers=8, thread_name_prefix="refresh") as executor:
+                list(executor.map(lambda symbol: store.update(symbol, bus.interval, bus.bars), bus.symbols))
+
+    def refresh_prices():
+        if streamed():
+            return
+        tickers = client.get_tickers()
+        for ticker in tickers or ():
+            bus.publish_price(ticker['symbol'], float(ticker['lastPrice']))
+
+    refreshing = {}  # refresh -> start time of its run in progress
+
+    def tracked(refresh):
+        def run():
+            refreshing[refresh] = time.time()
+            try:
+                refresh()
+            finally:
+                refreshing.pop(refresh, None)
+        return run
+
+    def tick():
+        now = time.time()
+        if all(now - started <= stall_seconds for started in list(refreshing.values())):
+            beat()
+
+    # Half a second after the close, ahead of the workers' CANDLE_CLOSE_DELAY
+    scheduler = CandleScheduler(server_clock)
+    scheduler.every_candle(bus.interval, tracked(refresh_candles), delay=float(os.getenv("INGESTION_CLOSE_DELAY", 0.5)),
+                           name="refresh candles")
+    scheduler.every(float(os.getenv("PRICE_POLL_SECONDS", 2)), tracked(refresh_prices), name="refresh prices")
+    scheduler.every(1, tick, name="heartbeat")
+    scheduler.start()
+    stop_event.wait()
+    scheduler.stop()
+    if stream is not None:
+        stream.stop()
+
+
+def run_worker(index, symbols, bus_spec, gateway, stop_flag, heartbeats, stall_seconds, slot):
+    beat, stop_event = _heartbeat(heartbeats, slot, stop_flag)
+    bus = MarketBus.attach(**bus_spec)
+    client = GatewayClient(*gateway, **adapter_options_from_env())
+    bot = ShardBot(client, bus, symbols)
+    bot.server_clock.sync(client)
+    client.server_clock = bot.server_clock
+    print(f"Worker {index} trading {len(symbols)} symbols: {', '.join(symbols)}")
+
+    # On a fresh start the ingestion process is still seeding the bus
+    deadline = time.time() + 60
+    while time.time() < deadline and not stop_event.is_set():
+        if all(bus.last_timestamp(symbol) is not None for symbol in symbols):
+            break
+        beat()
+        time.sleep(0.2)
+
+    engine = AsyncTradingEngine(bot, symbols, max_concurrency=bot.max_concurrency, cycle_seconds=bot.job_period or 10,
+                                interval=None if bot.job_period else bot.interval, server_clock=bot.server_clock,
+                                close_delay=bot.candle_close_delay, heartbeat=beat, stall_seconds=stall_seconds)
+    threading.Thread(target=lambda: (stop_event.wait(), engine.stop()), daemon=True).start()
+    asyncio.run(engine.run())
+
+
+# --- supervisor -------------------------------------------------------------------------
+
+class ProcessSlot:
+    def __init__(self, name, target, args):
+        self.name = name
+        self.target = target
+        self.args = args
+        self.process = None
+        self.started_time = None
+        self.restart_at = None
+        self.failures = 0
+
+
+class Supervisor:
+    """Runs the bot as one order gateway, one ingestion process and a trading worker per shard.
+
+    The symbols are dealt into `workers` fixed shards (one per core by
+    default), so indicator work runs in parallel without sharing a GIL. The
+    ingestion process publishes candles and prices on a shared-memory
+    MarketBus that every worker maps. All REST traffic, orders included,
+    goes through the gateway process over a local socket (`gateway_port`,
+    free by default); the gateway owns the one exchange session, its
+    connection pool and its rate limiter.
+
+    Each process beats a heartbeat from its work loop (the engine's event
+    loop, the ingestion scheduler, the gateway's request path), held back
+    while a job, refresh or request has been stuck for `heartbeat_timeout`
+    seconds. A process that exits or stops beating for `heartbeat_timeout`
+    seconds is restarted with the same arguments, so a worker comes back with
+    the same shard and reads the bus as it is, without re-downloading candles. Restarts back off exponentially up to
+    `max_restart_delay` while a slot keeps failing.
+    """
+
+    def __init__(self, symbols, workers=None, interval="1", bars=100, heartbeat_timeout=30, max_restart_delay=60,
+                 gateway_port=None):
+        self.symbols = list(symbols)
+        self.shards = shard_symbols(self.symbols, workers or os.cpu_count() or 1)
+        self.interval = str(interval)
+        self.bars = bars
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_restart_delay = max_restart_delay
+        self.gateway_port = gateway_port
+        self.context = multiprocessing.get_context("spawn")
+        self.bus = None
+        self.slots = []
+
+    def start(self):
+        context = self.context
+        self.bus = MarketBus.create(self.symbols, self.bars, self.interval)
+        self.stop_flag = context.Value('b', 0, lock=False)
+        self.heartbeats = context.Array('d', len(self.shards) + 2, lock=False)
+        # Local socket of the gateway; the key keeps other local processes from using its session
+        gateway = (("127.0.0.1", self.gateway_port or free_port()), os.urandom(32))
+
+        common = (self.stop_flag, self.heartbeats, self.heartbeat_timeout)
+        self.slots = [
+            ProcessSlot("gateway", run_gateway, (gateway,) + common + (0,)),
+            ProcessSlot("ingestion", run_ingestion, (self.bus.spec(), gateway) + common + (1,)),
+        ]
+        for i, shard in enumerate(self.shards):
+            self.slots.append(ProcessSlot(f"worker-{i}", run_worker, (i, shard, self.bus.spec(), gateway) + common + (i + 2,)))
+        for slot in self.slots:
+            self._launch(slot)
+        print(f"Supervisor started {len(self.shards)} workers for {len(self.symbols)} symbols.")
+
+    def _launch(self, slot):
+        index = self.slots.index(slot)
+        # A fresh process gets a full heartbeat timeout to start up
+        self.heartbeats[index] = time.time()
+        slot.process = self.context.Process(target=slot.target, args=slot.args, name=slot.name, daemon=True)
+        slot.process.start()
+        slot.started_time = time.time()
+        slot.restart_at = None
+
+    def check(self):
+        """Restart processes that exited or stopped beating; returns the names restarted."""
+        now = time.time()
+        restarted = []
+        for index, slot in enumerate(self.slots):
+            if slot.restart_at is not None:
+                if now >= slot.restart_at:
+                    print(f"Restarting {slot.name} (failure {slot.failures}).")
+                    self._launch(slot)
+                    restarted.append(slot.name)
+                continue
+
+            alive = slot.process.is_alive()
+            stalled = alive and now - self.heartbeats[index] > self.heartbeat_timeout
+            if alive and not stalled:
+                # Healthy for a while: the next failure starts the back-off over
+                if slot.failures and now - slot.started_time > self.max_restart_delay:
+                    slot.failures = 0
+                continue
+
+            if stalled:
+                print(f"{slot.name} stopped sending heartbeats, terminating it.")
+                slot.process.terminate()
+                slot.process.join(5)
+            else:
+                print(f"{slot.name} exited with code {slot.process.exitcode}.")
+            delay = min(2 ** slot.failures, self.max_restart_delay)
+            slot.failures += 1
+            slot.restart_at = now + delay
+        return restarted
+
+    def stop(self, timeout=10):
+        self.stop_flag.value = 1
+        deadline = time.time() + timeout
+        for slot in self.slots:
+            if slot.process is not None:
+                slot.process.join(max(0.0, deadline - time.time()))
+                if slot.process.is_alive():
+                    slot.process.terminate()
+        if self.bus is not None:
+            self.bus.close()
+            self.bus = None
+
+    def run(self):
+        self.start()
+        try:
+            while True:
+                self.check()
+                time.sleep(1)
+        except KeyboardInterrupt:
+            print("Stopping...")
+        finally:
+            self.stop()
+
+
+def main():
+    load_dotenv()
+    symbol = os.getenv("TRADING_SYMBOL", 'BTCUSDT')
+    symbols = [s.strip() for s in os.getenv("TRADING_SYMBOLS", symbol).split(",") if s.strip()]
+    supervisor = Supervisor(
+        symbols,
+        workers=int(os.getenv("SUPERVISOR_WORKERS", 0)) or None,
+        interval=os.getenv("TRADING_INTERVAL", '1'),
+        bars=int(os.getenv("TRADING_LIMIT", 100)),
+        heartbeat_timeout=float(os.getenv("HEARTBEAT_TIMEOUT", 30)),
+        gateway_port=int(os.getenv("GATEWAY_PORT", 0)) or None
+    )
+    supervisor.run()
+
+
+if __name__ == "__main__":
+    main()
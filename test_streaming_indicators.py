@@ -0,0 +1,47 @@
+# test_streaming_indicators.py
+
+import numpy as np
+from indicator_engine import ALL_INDICATORS, SMA_REBASE_BARS, IndicatorEngine
+from streaming_indicators import StreamingIndicators
+
+
+def make_bars(count, seed=0):
+    """Random-walk OHLC bars with some flat stretches (zero range, so %K is NaN there)."""
+    rng = np.random.default_rng(seed)
+    close = 30000 + np.cumsum(rng.normal(0, 25, count))
+    high = close + rng.uniform(0, 30, count)
+    low = close - rng.uniform(0, 30, count)
+    for start in rng.choice(count - 20, 5, replace=False):
+        high[start:start + 16] = low[start:start + 16] = close[start:start + 16] = close[start]
+    ohlcv = np.column_stack([close, high, low, close, np.ones(count)])
+    return ohlcv
+
+
+def assert_identical(streamed, batch, bar):
+    for name in ALL_INDICATORS:
+        expected = batch[name][bar]
+        actual = streamed[name]
+        same = (np.isnan(expected) and np.isnan(actual)) or actual == expected
+        assert same, f"{name} differs at bar {bar}: streaming {actual!r}, batch {expected!r}"
+
+
+def test_streaming_matches_batch_bar_by_bar():
+    # Long enough for the running sums to be rebased a few times
+    ohlcv = make_bars(3 * SMA_REBASE_BARS + 100)
+    batch = IndicatorEngine().compute(ohlcv)
+    streaming = StreamingIndicators()
+    for bar, (_, high, low, close, _) in enumerate(ohlcv):
+        assert_identical(streaming.update(high, low, close), batch, bar)
+
+
+def test_forming_bar_revisions_leave_no_trace():
+    ohlcv = make_bars(SMA_REBASE_BARS + 300, seed=1)
+    batch = IndicatorEngine().compute(ohlcv)
+    streaming = StreamingIndicators()
+    rng = np.random.default_rng(2)
+    for bar, (_, high, low, close, _) in enumerate(ohlcv):
+        # Ticks of the forming bar, then its final values
+        streaming.update(high - 5, low + 5, close + rng.normal(0, 10))
+        for _ in range(2):
+            streaming.update(high, low, close + rng.normal(0, 10), replace_last=True)
+        assert_identical(streaming.update(high, low, close, replace_last=True), batch, bar)
@@ -0,0 +1,58 @@
+# test_trading_engine.py
+
+import asyncio
+import time
+from backtester import SimulatedExchange
+from mock_bybit_server import generate_candles
+from trading_bot import TradingBot
+from trading_engine import AsyncTradingEngine
+
+FETCH_SECONDS = 0.5
+SYMBOLS = [f"SYM{i}USDT" for i in range(8)]
+
+
+class SlowExchange(SimulatedExchange):
+    """Serves the same candles for every symbol, each kline request taking FETCH_SECONDS; places nothing."""
+
+    def get_historical_data(self, symbol, interval, limit, start=None, end=None):
+        time.sleep(FETCH_SECONDS)
+        return super().get_historical_data(symbol, interval, limit, start=start, end=end)
+
+    def place_order_pair(self, symbol, qty, leverage, long_price, short_price, **kwargs):
+        return None, None
+
+
+def make_bot():
+    timestamps, values = generate_candles(300)
+    exchange = SlowExchange(SYMBOLS[0], "1", timestamps, values)
+    exchange.cursor = len(timestamps) - 1
+    bot = TradingBot(data_fetcher=exchange, clock=exchange.clock)
+    bot.interval = "1"
+    bot.limit = 100
+    bot.candle_store.max_bars = 100
+    bot.candle_store.archive = None
+    bot.order_tracker = exchange
+    return bot
+
+
+async def first_round(engine):
+    """Seconds until every symbol has finished one run."""
+    started = time.perf_counter()
+    task = asyncio.create_task(engine.run())
+    while not all(engine.states[symbol].runs for symbol in SYMBOLS):
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    engine.stop()
+    await task
+    return elapsed
+
+
+def test_symbols_fetch_concurrently():
+    bot = make_bot()
+    engine = AsyncTradingEngine(bot, SYMBOLS, max_concurrency=len(SYMBOLS), cycle_seconds=60)
+    elapsed = asyncio.run(first_round(engine))
+
+    assert all(state.consecutive_errors == 0 for state in engine.states.values())
+    assert all(len(bot.candle_store.get_dataframe(symbol, "1", 100)) == 100 for symbol in SYMBOLS)
+    # One at a time would take len(SYMBOLS) fetches
+    assert elapsed < 2 * FETCH_SECONDS, f"{len(SYMBOLS)} symbols took {elapsed:.2f}s"
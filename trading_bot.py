@@ -1,84 +1,240 @@
 # trading_bot.py
 
-import schedule
+import asyncio
+import threading
 import time
 import logging
-from data_fetcher import DataFetcher
+from concurrent.futures import ThreadPoolExecutor
 from indicators import Indicators
 from risk_management import RiskManagement
 from dotenv import load_dotenv
 import os
 import pandas as pd
-from bybit_demo_session import BybitDemoSession
+from exchange_adapter import exchange_from_env
 from strategy import Strategy
+from candle_store import CandleStore
+from candle_archive import CandleArchive
+from market_stream import MarketDataStream, PUBLIC_LINEAR_WS_URL
+from order_tracker import OrderFillTracker, PRIVATE_DEMO_WS_URL
+from trading_engine import AsyncTradingEngine
+from account_state import AccountState
+from screener import Screener
+from state_store import StateStore
+from candle_scheduler import CandleScheduler, ServerClock
+from instrumentation import metrics, configure_from_env
 
 class TradingBot:
-    def __init__(self):
+    def __init__(self, data_fetcher=None, clock=time.time):
         load_dotenv()
 
         self.api_key = os.getenv("BYBIT_API_KEY")
         self.api_secret = os.getenv("BYBIT_API_SECRET") 
+        # Time source for the cool-down checks; the backtester replaces it with simulated time
+        self.clock = clock
 
-        if not self.api_key or not self.api_secret:
+        if data_fetcher is None and (not self.api_key or not self.api_secret):
             raise ValueError("API keys not found. Please set BYBIT_API_KEY and BYBIT_API_SECRET in your .env file.")
 
-        self.data_fetcher = BybitDemoSession(self.api_key, self.api_secret)
+        self.max_concurrency = int(os.getenv("MAX_CONCURRENCY", 10))
+        self.data_fetcher = data_fetcher or self.create_exchange()
+        # False sends the two legs as parallel single orders instead of one batch request
+        self.data_fetcher.batch_orders = os.getenv("BATCH_ORDERS", "True").lower() == "true"
+        # Streams are only available against the real exchange
+        streams_available = data_fetcher is None
 
-        self.strategy = Strategy()
+        self.strategy = Strategy(support_resistance_window=int(os.getenv("SR_WINDOW", 12)))
         self.indicators = Indicators()
         self.risk_management = RiskManagement(
             atr_multiplier=float(os.getenv("ATR_MULTIPLIER", 1.0)),
             risk_ratio=float(os.getenv("RISK_RATIO", 1.0))
         )
         self.symbol = os.getenv("TRADING_SYMBOL", 'BTCUSDT')
+        # Comma-separated list of symbols traded from this process
+        self.symbols = [s.strip() for s in os.getenv("TRADING_SYMBOLS", self.symbol).split(",") if s.strip()]
+        self.symbol = self.symbols[0]
         self.quantity = float(os.getenv("TRADE_QUANTITY", 0.03))
 
         self.take_profit_percentage = float(os.getenv("TAKE_PROFIT_PERCENTAGE", 0.15))
         self.stop_loss_percentage = float(os.getenv("STOP_LOSE_PERCENTAGE", 0.15))
+        # Stop-losses are not sent unless enabled; "atr" takes TP/SL from RiskManagement instead of percentages
+        self.use_stop_loss = os.getenv("USE_STOP_LOSS", "False").lower() == "true"
+        self.risk_mode = os.getenv("RISK_MODE", "percentage").lower()
 
         # Load trading parameters
         self.interval = os.getenv("TRADING_INTERVAL", '1')
         self.limit = int(os.getenv("TRADING_LIMIT", 100))
         self.leverage = int(os.getenv("LEVERAGE", 10))
 
+        # Orders, fills, positions and candles survive a restart; the file belongs to the live account,
+        # so runs against an injected (simulated) exchange never open it
+        state_db = os.getenv("STATE_DB")
+        self.state_store = StateStore(state_db, keep_candles=self.limit) if state_db and streams_available else None
+
+        # Candles are kept between runs and only the newest ones are re-downloaded
+        archive_dir = os.getenv("CANDLE_ARCHIVE_DIR")
+        self.candle_store = CandleStore(
+            self.data_fetcher,
+            max_bars=self.limit,
+            clock=clock,
+            archive=CandleArchive(archive_dir) if archive_dir else None,
+            state_store=self.state_store
+        )
+
+        # Entry prices snapped to the tick grid and kept passive against the local order book
+        book_pricing = os.getenv("ORDER_BOOK_PRICING", "False").lower() == "true"
+        self.data_fetcher.book_pricing = book_pricing
+        queue_limit = os.getenv("ORDER_BOOK_QUEUE_LIMIT")
+        self.data_fetcher.queue_limit = float(queue_limit) if queue_limit else None
+
+        # Optional WebSocket market data; REST polling stays as the fallback
+        self.market_stream = None
+        if streams_available and os.getenv("MARKET_STREAM_ENABLED", "False").lower() == "true":
+            self.market_stream = MarketDataStream(
+                self.candle_store,
+                self.symbols,
+                self.interval,
+                self.limit,
+                url=os.getenv("MARKET_STREAM_URL", PUBLIC_LINEAR_WS_URL),
+                order_book_depth=int(os.getenv("ORDER_BOOK_DEPTH", 50 if book_pricing else 1)),
+                snapshot_source=self.data_fetcher.get_order_book,
+                book_check_interval=float(os.getenv("ORDER_BOOK_CHECK_SECONDS", 60))
+            )
+            self.market_stream.on_candle_close(self.on_candle_close)
+            # Stream callbacks run on the socket reader thread; the jobs they trigger run here instead,
+            # so a long wait for a fill never holds up kline, ticker or ping handling
+            self.stream_job_executor = ThreadPoolExecutor(max_workers=max(2, len(self.symbols)),
+                                                          thread_name_prefix="stream-job")
+            self.data_fetcher.order_books = self.market_stream.order_books
+        # Screener mode: each cycle trades the contracts nearest a level instead of a fixed list
+        self.screener = None
+        if os.getenv("SCREENER_ENABLED", "False").lower() == "true":
+            max_symbols = os.getenv("SCREENER_MAX_SYMBOLS")
+            self.screener = Screener(
+                self.data_fetcher,
+                interval=self.interval,
+                bars=self.limit,
+                window=self.strategy.support_resistance_window,
+                atr_period=self.risk_management.atr_period,
+                top=int(os.getenv("SCREENER_TOP", 10)),
+                min_turnover=float(os.getenv("SCREENER_MIN_TURNOVER", 0)),
+                max_symbols=int(max_symbols) if max_symbols else None,
+                resync_per_scan=int(os.getenv("SCREENER_RESYNC", 0)),
+                clock=clock
+            )
+
+        # Positions and orders are fetched once per cycle and shared by all checks
+        self.account_state = AccountState(self.data_fetcher, state_store=self.state_store)
+
+        # Fills are tracked from the private stream so job() never blocks on them
+        self.order_fill_timeout = float(os.getenv("ORDER_FILL_TIMEOUT", 180))
+        self.order_tracker = None
+        if streams_available and os.getenv("ORDER_STREAM_ENABLED", "False").lower() == "true":
+            self.order_tracker = OrderFillTracker(
+                self.api_key,
+                self.api_secret,
+                self.data_fetcher,
+                url=os.getenv("ORDER_STREAM_URL", PRIVATE_DEMO_WS_URL),
+                account_state=self.account_state
+            )
+            # While the stream is connected the snapshot stays current without polling
+            self.account_state.live_source = self.order_tracker
+
+        # Evaluations run just after each candle close in exchange time, optionally also every JOB_PERIOD seconds
+        self.server_clock = ServerClock()
+        self.candle_close_delay = float(os.getenv("CANDLE_CLOSE_DELAY", 1.0))
+        self.job_period = float(os.getenv("JOB_PERIOD", 0))
+
+        # job() can be triggered by both the scheduler and stream events
+        self.job_locks = {symbol: threading.Lock() for symbol in self.symbols}
+
         # Set up logging
         logging.basicConfig(filename='trading_bot.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-    def job(self):
-        print("-----------------------------")
+    def create_exchange(self):
+        return exchange_from_env(self.api_key, self.api_secret, pool_size=max(10, self.max_concurrency))
+
+    def job(self, symbol=None, wait=True):
+        symbol = symbol or self.symbol
+        job_lock = self.job_locks.setdefault(symbol, threading.Lock())
+        if not job_lock.acquire(blocking=False):
+            return None
+        try:
+            with metrics.timer("job", symbol=symbol):
+                return self.run_symbol(symbol, wait=wait)
+        finally:
+            job_lock.release()
+
+    def _stream_job(self, symbol):
+        try:
+            self.job(symbol)
+        except Exception as e:
+            print(f"Error in stream-triggered job for {symbol}: {e}")
+
+    def on_candle_close(self, symbol, interval):
+        print(f"Candle closed for {symbol} ({interval}).")
+        self.stream_job_executor.submit(self._stream_job, symbol)
 
-        last_closed_position = self.data_fetcher.get_last_closed_position(self.symbol)
+    def on_level_cross(self, symbol, level, price):
+        print(f"Price {price:.2f} crossed {level} for {symbol}.")
+        self.stream_job_executor.submit(self._stream_job, symbol)
+
+    def on_order_filled(self, filled_order):
+        if filled_order:
+            print(f"Order filled: {filled_order}")
+        else:
+            print("No order was filled, both orders cancelled.")
+
+    def get_current_price(self, symbol):
+        if self.market_stream is not None:
+            price = self.market_stream.get_last_price(symbol, max_age=5)
+            if price is not None:
+                return price
+        return self.data_fetcher.get_real_time_price(symbol)
+
+    def run_symbol(self, symbol, wait=True):
+        """Evaluate `symbol` and place a pair; with `wait=False` the placed (long, short) orders are returned unawaited."""
+        print(f"----------------------------- {symbol}")
+        started = time.perf_counter()
+
+        if not self.account_state.refresh(symbol):
+            print("Failed to retrieve account state.")
+            return
+
+        last_closed_position = self.account_state.get_last_closed_position(symbol)
         if last_closed_position:
             last_closed_time = int(last_closed_position['updatedTime']) / 1000
-            current_time = time.time()
+            current_time = self.clock()
             time_since_last_close = current_time - last_closed_time
             print(f"Time since last closed position: {int(time_since_last_close)} seconds")
             if time_since_last_close < 180:  # 3 minutes
                 print("The last closed position was less than 3 minutes ago. A new order will not be placed.")
                 return
             
-        is_open_positions = self.data_fetcher.get_open_positions(self.symbol)
+        is_open_positions = self.account_state.get_open_positions(symbol)
         if is_open_positions:
             print("There is already an open position. A new order will not be placed.")
             return
 
-        is_open_orders = self.data_fetcher.get_open_orders(self.symbol)
+        is_open_orders = self.account_state.get_open_orders(symbol)
         if is_open_orders:
             print("There is an open limit order. A new order will not be placed.")
             return
 
-        get_historical_data = self.data_fetcher.get_historical_data(self.symbol, self.interval, self.limit)
-        if get_historical_data is None:
-            print("Failed to retrieve historical data.")
-            return
+        # With a live stream the buffer is already current; only hit REST when it is not
+        streamed = self.market_stream is not None and symbol in self.market_stream.symbols
+        if not streamed or not self.market_stream.is_connected():
+            if not self.candle_store.update(symbol, self.interval, self.limit):
+                print("Failed to retrieve historical data.")
+                return
 
-        df = self.strategy.prepare_dataframe(get_historical_data)
+        df = self.candle_store.get_dataframe(symbol, self.interval, self.limit)
 
         # Identify support and resistance levels
-        support, resistance = self.strategy.identify_support_resistance(df)
+        with metrics.timer("indicators", symbol=symbol):
+            support, resistance = self.strategy.identify_support_resistance(df)
 
         # Get the latest price
-        current_price = self.data_fetcher.get_real_time_price(self.symbol)
+        current_price = self.get_current_price(symbol)
         if current_price is None:
             print("Failed to retrieve real-time price.")
             return
@@ -86,6 +242,9 @@ class TradingBot:
         print(f"Support Level: {support:.2f}, Resistance Level: {resistance:.2f}")
         print(f"Current Price: {current_price:.2f}")
 
+        if self.market_stream is not None:
+            self.market_stream.watch_levels(symbol, support, resistance, self.on_level_cross)
+
         # Place limit orders for support (long) and resistance (short)
         long_order_price = support
         short_order_price = resistance
@@ -106,50 +265,189 @@ class TradingBot:
         short_tp = short_order_price * short_tp_multiplier
         short_sl = short_order_price * short_sl_multiplier
 
+        if self.risk_mode == "atr":
+            long_sl, long_tp = self.risk_management.calculate_dynamic_risk_management(df, long_order_price, 'long')
+            short_sl, short_tp = self.risk_management.calculate_dynamic_risk_management(df, short_order_price, 'short')
 
-        # Place two limit orders (long at support, short at resistance)
-        long_order_result = self.data_fetcher.place_order(
-            symbol=self.symbol,
-            side='Buy',
-            qty=self.quantity,
-            current_price=long_order_price,
-            leverage=self.leverage,
-            # stop_loss=long_sl,
-            take_profit=long_tp
-        )
-        
-        short_order_result = self.data_fetcher.place_order(
-            symbol=self.symbol,
-            side='Sell',
-            qty=self.quantity,
-            current_price=short_order_price,
-            leverage=self.leverage,
-            # stop_loss=short_sl,
-            take_profit=short_tp
-        )
+        # Everything from the start of the run up to here is the decision
+        metrics.observe("decision", time.perf_counter() - started, symbol=symbol)
+
+        # Place two limit orders (long at support, short at resistance), submitted together
+        with metrics.timer("order_submit", symbol=symbol):
+            long_order_result, short_order_result = self.data_fetcher.place_order_pair(
+                symbol=symbol,
+                qty=self.quantity,
+                leverage=self.leverage,
+                long_price=long_order_price,
+                short_price=short_order_price,
+                long_stop_loss=long_sl if self.use_stop_loss else None,
+                long_take_profit=long_tp,
+                short_stop_loss=short_sl if self.use_stop_loss else None,
+                short_take_profit=short_tp
+            )
+
+        if not long_order_result and not short_order_result:
+            print("Failed to place orders.")
+        elif not wait:
+            return long_order_result, short_order_result
+        else:
+            self.await_pair(symbol, long_order_result, short_order_result, self.order_fill_timeout)
 
-        if long_order_result or short_order_result:
-            print("Waiting for one of the orders to be filled...")
-            # Wait for one of the limit orders to be filled
-            filled_order = self.strategy.wait_for_order_fill(self.symbol, long_order_result, short_order_result, self.data_fetcher)
+    def await_pair(self, symbol, long_order_result, short_order_result, timeout, key=None):
+        """Wait for one leg of a placed pair to fill and cancel the other (or both after `timeout`)."""
+        if key is None:
+            key = self.record_pair(symbol, long_order_result, short_order_result, timeout)
 
+        if self.order_tracker is not None:
+            # The tracker cancels the other leg as soon as one fills
+            future = self.order_tracker.track_pair(
+                symbol,
+                long_order_result,
+                short_order_result,
+                timeout=timeout,
+                on_fill=self.on_order_filled
+            )
+            if key is not None:
+                future.add_done_callback(lambda f: self.state_store.resolve_pair(key, f.result()))
+            return
 
-            if filled_order:
-                print(f"Order filled: {filled_order}")
-                # Cancel the other order
-                unfilled_order = long_order_result if filled_order == short_order_result else short_order_result
-                self.data_fetcher.cancel_order(unfilled_order['orderId'], self.symbol)
+        print("Waiting for one of the orders to be filled...")
+        # Wait for one of the limit orders to be filled
+        filled_order = self.strategy.wait_for_order_fill(
+            symbol, long_order_result, short_order_result, self.data_fetcher, timeout=timeout
+        )
+        self.settle_pair(symbol, long_order_result, short_order_result, filled_order, key)
+
+    def record_pair(self, symbol, long_order_result, short_order_result, timeout):
+        """State-store key of a newly placed pair (None without a store)."""
+        if self.state_store is None:
+            return None
+        expires_time = time.time() + timeout if timeout else None
+        return self.state_store.record_pair(symbol, long_order_result, short_order_result, expires_time)
+
+    def settle_pair(self, symbol, long_order_result, short_order_result, filled_order, key=None):
+        """Cancel what is left of a polled pair: the other leg after a fill, or both legs after the timeout."""
+        if filled_order:
+            print(f"Order filled: {filled_order}")
+            # Cancel the other order
+            unfilled_order = long_order_result if filled_order == short_order_result else short_order_result
+            if unfilled_order:
+                # Measured from the poll that saw the fill
+                with metrics.timer("fill_to_cancel", symbol=symbol):
+                    self.data_fetcher.cancel_order(unfilled_order['orderId'], symbol)
         else:
-            print("Failed to place orders.")
+            for order in (long_order_result, short_order_result):
+                if order:
+                    self.data_fetcher.cancel_order(order['orderId'], symbol)
+        if key is not None:
+            self.state_store.resolve_pair(key, filled_order)
+
+    def restore_state(self):
+        """Warm start: reload the saved state and reconcile it with the exchange in one round of requests.
+
+        Candles come back from disk, so the first cycle only fetches the bars
+        that closed while the bot was down. Positions and open orders of all
+        symbols are read with two settle-coin requests and stand in for the
+        first account refresh. Saved pairs are resumed, or settled if a leg
+        traded or the pair expired in the meantime.
+        """
+        started = time.perf_counter()
+        saved = self.state_store.load(self.limit)
+        for (symbol, interval), (timestamps, values) in saved.candles.items():
+            self.candle_store.restore(symbol, interval, timestamps, values)
+        self.state_store.prune_candles(self.limit)
+
+        open_orders = self.data_fetcher.get_all_open_orders()
+        positions = self.data_fetcher.get_all_positions()
+        if open_orders is None or positions is None:
+            print("Failed to reconcile the saved state with the exchange, starting with a cold account state.")
+            return False
+
+        now_ms = int(time.time() * 1000)
+        for symbol in set(self.symbols) | set(saved.positions):
+            current = {pos.get('positionIdx', 0): pos for pos in positions if pos['symbol'] == symbol}
+            for pos in saved.positions.get(symbol, []):
+                idx = pos.get('positionIdx', 0)
+                if idx in current:
+                    continue
+                # Only non-empty positions are listed by settle coin. A saved open one that is missing
+                # closed while we were down, at an unknown time, so the cool-down starts now.
+                current[idx] = pos if float(pos['size']) == 0 else dict(pos, size="0", updatedTime=str(now_ms))
+            symbol_orders = [order for order in open_orders if order['symbol'] == symbol]
+            self.account_state.restore(symbol, list(current.values()), symbol_orders)
+            self.state_store.save_positions(symbol, list(current.values()))
+        self.state_store.save_orders(open_orders)
+
+        open_order_ids = {order['orderId'] for order in open_orders}
+        resumed = 0
+        for pair in saved.pairs:
+            symbol = pair['symbol']
+            legs = [{"orderId": order_id} if order_id else None
+                    for order_id in (pair['long_order_id'], pair['short_order_id'])]
+            gone = [leg for leg in legs if leg and leg['orderId'] not in open_order_ids]
+            resting = [leg for leg in legs if leg and leg['orderId'] in open_order_ids]
+            remaining = pair['expires_time'] - time.time() if pair['expires_time'] else None
+            if gone or (remaining is not None and remaining <= 0):
+                # A leg that left the book traded; whatever still rests must not outlive the pair
+                for leg in resting:
+                    self.data_fetcher.cancel_order(leg['orderId'], symbol)
+                self.state_store.resolve_pair(pair['pair_id'], gone[0] if gone else None)
+                continue
+            resumed += 1
+            if self.order_tracker is not None:
+                self.await_pair(symbol, legs[0], legs[1], remaining, key=pair['pair_id'])
+            else:
+                threading.Thread(target=self.await_pair, args=(symbol, legs[0], legs[1], remaining, pair['pair_id']),
+                                 daemon=True).start()
+
+        print(f"Warm start: {len(saved.candles)} candle buffers, {len(saved.pairs)} saved pairs "
+              f"({resumed} resumed) in {(time.perf_counter() - started) * 1000:.0f} ms.")
+        return True
 
     def run(self):
+        # Latency histograms, /metrics endpoint and JSON log when METRICS_ENABLED=true
+        configure_from_env()
+
+        if self.state_store is not None:
+            self.restore_state()
+
+        if self.market_stream is not None:
+            self.market_stream.start()
+        if self.order_tracker is not None:
+            self.order_tracker.start()
+
+        # Candle closes are computed in exchange time; every later response keeps the offset estimate fresh
+        if not self.server_clock.sync(self.data_fetcher):
+            print("Failed to read the server time, scheduling on the local clock.")
+        self.data_fetcher.server_clock = self.server_clock
+        print(f"Server clock offset {self.server_clock.offset * 1000:+.1f} ms "
+              f"(round trip {(self.server_clock.rtt or 0) * 1000:.1f} ms).")
+
+        if len(self.symbols) > 1 or self.screener is not None:
+            # Several symbols share one process through the asyncio engine
+            # With JOB_PERIOD the cycles run on that period, otherwise after every candle close
+            engine = AsyncTradingEngine(self, self.symbols, max_concurrency=self.max_concurrency,
+                                        cycle_seconds=self.job_period or 10, screener=self.screener,
+                                        interval=None if self.job_period else self.interval,
+                                        server_clock=self.server_clock, close_delay=self.candle_close_delay)
+            asyncio.run(engine.run())
+            return
+
+        scheduler = CandleScheduler(self.server_clock, workers=max(2, len(self.symbols)))
+        for symbol in self.symbols:
+            scheduler.every_candle(self.interval, self.job, symbol, delay=self.candle_close_delay, name=f"job {symbol}")
+            if self.job_period:
+                scheduler.every(self.job_period, self.job, symbol, name=f"job {symbol} every {self.job_period:g}s")
         self.job()
-        schedule.every(10).seconds.do(self.job)
-        while True:
-            schedule.run_pending()
-            time.sleep(1)
+        scheduler.run()
 
 if __name__ == "__main__":
-    bot = TradingBot()
-    bot.run()
+    load_dotenv()
+    # SUPERVISOR_WORKERS > 0 shards the symbols over that many processes (see supervisor.py)
+    if int(os.getenv("SUPERVISOR_WORKERS", 0)) > 0:
+        import supervisor
+        supervisor.main()
+    else:
+        bot = TradingBot()
+        bot.run()
 
@@ -0,0 +1,187 @@
+# trading_engine.py
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from candle_scheduler import next_candle_close
+
+
+class SymbolState:
+    """Per-symbol bookkeeping for the engine."""
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.runs = 0
+        self.last_run_time = None
+        self.last_duration = None
+        self.consecutive_errors = 0
+        self.last_error = None
+        self.skip_until = 0.0
+        # Start of the evaluate-and-place call in progress, if any
+        self.job_started = None
+
+
+class AsyncTradingEngine:
+    """Runs TradingBot jobs for many symbols concurrently from one process.
+
+    Every symbol is its own long-lived task on its own schedule, so a slow
+    symbol only delays itself. A run has two parts. Evaluating and placing
+    the pair calls the blocking bot code on the default thread pool, bounded
+    by a semaphore so at most ``max_concurrency`` symbols do it at once.
+    Waiting for a fill happens outside the semaphore: the order stream
+    resolves pairs on its own, and otherwise the legs are polled with
+    ``get_open_orders_async`` on the transport's async client. A pending pair
+    therefore holds neither a slot nor a thread. All symbols share the bot's
+    session, candle store and streams. A failing symbol is backed off on its
+    own and never stops the others.
+
+    Each symbol runs every ``cycle_seconds``, or with `interval` `close_delay`
+    seconds after each candle close in exchange time (``server_clock``). A
+    run that overruns a close skips it. With a screener, the shortlist is
+    rescanned on that schedule. Symbols that join it get a task, and symbols
+    that drop out finish their current run and stop.
+
+    With a `heartbeat` callable, the event loop calls it every second unless
+    an evaluate-and-place call has been running for over `stall_seconds`,
+    so a hung loop or a stuck job stops the heartbeat.
+    """
+
+    def __init__(self, bot, symbols, max_concurrency=10, cycle_seconds=10, max_backoff=300, screener=None,
+                 interval=None, server_clock=None, close_delay=0.0, heartbeat=None, stall_seconds=30):
+        self.bot = bot
+        self.symbols = list(symbols)
+        # With a screener the symbols of each cycle are its shortlist
+        self.screener = screener
+        self.interval = interval
+        self.server_clock = server_clock
+        self.close_delay = close_delay
+        self.max_concurrency = max_concurrency
+        self.cycle_seconds = cycle_seconds
+        self.max_backoff = max_backoff
+        self.heartbeat = heartbeat
+        self.stall_seconds = stall_seconds
+        self.states = {symbol: SymbolState(symbol) for symbol in self.symbols}
+        self.tasks = {}
+        self.running = False
+        self._semaphore = None
+        self._loop = None
+        self._stopped = None
+
+    async def run_symbol(self, symbol):
+        state = self.states.get(symbol)
+        if state is None:
+            state = self.states[symbol] = SymbolState(symbol)
+        if time.time() < state.skip_until:
+            return
+
+        started = time.time()
+        try:
+            async with self._semaphore:
+                state.job_started = time.time()
+                try:
+                    placed = await asyncio.to_thread(self.bot.job, symbol, False)
+                finally:
+                    state.job_started = None
+            if placed:
+                await self.await_pair(symbol, *placed)
+            state.consecutive_errors = 0
+            state.last_error = None
+        except Exception as e:
+            state.consecutive_errors += 1
+            state.last_error = str(e)
+            # Exponential back-off for this symbol only
+            backoff = min(self.cycle_seconds * 2 ** state.consecutive_errors, self.max_backoff)
+            state.skip_until = time.time() + backoff
+            print(f"Error while processing {symbol}: {e}. Skipping it for {backoff:.0f} seconds.")
+        finally:
+            state.runs += 1
+            state.last_run_time = started
+            state.last_duration = time.time() - started
+
+    async def await_pair(self, symbol, long_order_result, short_order_result):
+        bot = self.bot
+        timeout = bot.order_fill_timeout
+        if bot.order_tracker is not None:
+            # Returns at once; the tracker cancels the other leg when one fills
+            bot.await_pair(symbol, long_order_result, short_order_result, timeout)
+            return
+        key = bot.record_pair(symbol, long_order_result, short_order_result, timeout)
+        print("Waiting for one of the orders to be filled...")
+        filled_order = await bot.strategy.wait_for_order_fill_async(
+            symbol, long_order_result, short_order_result, bot.data_fetcher, timeout=timeout
+        )
+        await asyncio.to_thread(bot.settle_pair, symbol, long_order_result, short_order_result, filled_order, key)
+
+    async def symbol_loop(self, symbol):
+        """Run `symbol` on its own schedule while the engine runs and the symbol stays selected."""
+        try:
+            while self.running and symbol in self.symbols:
+                started = time.time()
+                await self.run_symbol(symbol)
+                await self._sleep(self.next_cycle_in(time.time() - started))
+        finally:
+            self.tasks.pop(symbol, None)
+
+    def _start_symbols(self):
+        for symbol in self.symbols:
+            if symbol not in self.tasks:
+                self.tasks[symbol] = asyncio.create_task(self.symbol_loop(symbol), name=f"symbol {symbol}")
+
+    async def run(self):
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        # The default executor must be able to run every permitted task at once
+        self._loop.set_default_executor(ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="symbol"))
+
+        self.running = True
+        beats = asyncio.create_task(self._beat()) if self.heartbeat is not None else None
+        if self.screener is not None:
+            print(f"Trading engine started in screener mode (max concurrency {self.max_concurrency}).")
+            while self.running:
+                started = time.time()
+                ranked = await asyncio.to_thread(self.screener.scan)
+                if ranked is not None:
+                    self.symbols = self.screener.shortlist
+                    print(f"Screener shortlist: {', '.join(self.symbols) or 'none'}")
+                    self._start_symbols()
+                await self._sleep(self.next_cycle_in(time.time() - started))
+        else:
+            print(f"Trading engine started for {len(self.symbols)} symbols (max concurrency {self.max_concurrency}).")
+            self._start_symbols()
+            await self._stopped.wait()
+        if self.tasks:
+            await asyncio.gather(*list(self.tasks.values()))
+        if beats is not None:
+            await beats
+
+    def stalled(self):
+        now = time.time()
+        return any(state.job_started is not None and now - state.job_started > self.stall_seconds
+                   for state in self.states.values())
+
+    async def _beat(self):
+        while self.running:
+            if not self.stalled():
+                self.heartbeat()
+            await self._sleep(1)
+
+    async def _sleep(self, seconds):
+        # Returns early once the engine is stopped
+        try:
+            await asyncio.wait_for(self._stopped.wait(), max(0.0, seconds))
+        except asyncio.TimeoutError:
+            pass
+
+    def next_cycle_in(self, elapsed):
+        """Seconds to wait before the next run."""
+        if self.interval is None:
+            return max(0.0, self.cycle_seconds - elapsed)
+        now = self.server_clock.now() if self.server_clock is not None else time.time()
+        return next_candle_close(now - self.close_delay, self.interval) + self.close_delay - now
+
+    def stop(self):
+        """Stop scheduling runs; safe to call from any thread. Runs in progress finish first."""
+        self.running = False
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._stopped.set)
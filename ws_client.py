@@ -0,0 +1,84 @@
+# ws_client.py
+
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+import websocket
+from kline_decoder import loads
+
+
+class ReconnectingWebSocket(ABC):
+    """Runs a WebSocketApp on a background thread and reconnects with exponential back-off.
+
+    Subclasses implement ``_on_open`` and ``handle_message``.
+    """
+
+    name = "websocket"
+
+    def __init__(self, url, ping_interval=20, reconnect_delay=1, max_reconnect_delay=30):
+        self.url = url
+        self.ping_interval = ping_interval
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self._ws = None
+        self._thread = None
+        self._running = False
+
+    def is_connected(self):
+        return self._ws is not None and self._ws.sock is not None and self._ws.sock.connected
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run_forever, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._ws is not None:
+            self._ws.close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def send(self, payload):
+        self._ws.send(json.dumps(payload))
+
+    def _run_forever(self):
+        delay = self.reconnect_delay
+        while self._running:
+            connected_at = time.time()
+            try:
+                self._ws = websocket.WebSocketApp(
+                    self.url,
+                    on_open=self._on_open,
+                    on_message=self._on_message,
+                    on_error=self._on_error,
+                )
+                self._ws.run_forever(ping_interval=self.ping_interval, ping_payload='{"op":"ping"}')
+            except Exception as e:
+                print(f"{self.name} error: {e}")
+
+            if not self._running:
+                break
+            # Reset the back-off once a connection has stayed up for a while
+            if time.time() - connected_at > self.max_reconnect_delay:
+                delay = self.reconnect_delay
+            print(f"{self.name} disconnected, reconnecting in {delay} seconds...")
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _on_open(self, ws):
+        pass
+
+    def _on_error(self, ws, error):
+        print(f"{self.name} error: {error}")
+
+    def _on_message(self, ws, raw):
+        try:
+            self.handle_message(loads(raw))
+        except Exception as e:
+            print(f"Failed to process {self.name} message: {e}")
+
+    @abstractmethod
+    def handle_message(self, message):
+        pass